@@ -0,0 +1,203 @@
+'''
+Function:
+    Bandwidth Limiting and Per-host Connection Caps for MusicdlGUI Downloads
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import time
+import threading
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a constant byte rate, reads borrow from it and wait
+    until the debt is paid back, so throughput converges to the rate without bursts
+    """
+    # Seconds of traffic the bucket may store while downloads are idle
+    BURST_SECONDS = 0.1
+
+    def __init__(self, rate=0, clock=time.monotonic):
+        """
+        Initialize token bucket
+
+        Args:
+            rate (int): Bytes per second, 0 disables the limit
+            clock (callable): Monotonic time source in seconds, replaceable for tests
+        """
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.tokens = 0.0
+        self.updated = clock()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """
+        Change the rate, the tokens collected so far are kept up to the new burst size
+
+        Args:
+            rate (int): Bytes per second, 0 disables the limit
+        """
+        with self.lock:
+            self.rate = max(0, int(rate))
+            self.tokens = min(self.tokens, self.rate * self.BURST_SECONDS)
+            self.updated = self.clock()
+
+    def reserve(self, nbytes):
+        """
+        Take nbytes from the bucket
+
+        Args:
+            nbytes (int): Bytes just transferred
+
+        Returns:
+            float: Seconds the caller has to wait before transferring more
+        """
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            now = self.clock()
+            self.tokens = min(self.rate * self.BURST_SECONDS, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class BandwidthLimiter:
+    """
+    Shared by every download: a global token bucket, one token bucket per music source
+    and a cap on the concurrent connections to each host
+    """
+    # Pacing granularity, a read never asks for more than this many seconds of traffic
+    READ_INTERVAL = 0.05
+    MIN_READ_SIZE = 4 * 1024
+
+    def __init__(self, total_rate=0, source_rate=0, host_connections=0, clock=time.monotonic, sleep=time.sleep):
+        """
+        Initialize bandwidth limiter
+
+        Args:
+            total_rate (int): Bytes per second shared by all downloads, 0 disables the limit
+            source_rate (int): Bytes per second of each music source, 0 disables the limit
+            host_connections (int): Maximum concurrent connections to one host, 0 disables the cap
+            clock (callable): Monotonic time source in seconds, replaceable for tests
+            sleep (callable): Sleeps for the given seconds, replaced together with clock in tests
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.total_bucket = TokenBucket(clock=clock)
+        self.source_buckets = {}
+        self.source_rate = 0
+        self.host_connections = 0
+        self.host_active = {}  # host -> open connections
+        self.condition = threading.Condition()
+        self.configure(total_rate, source_rate, host_connections)
+
+    def configure(self, total_rate, source_rate, host_connections):
+        """
+        Update the limits, running downloads follow them from their next read
+
+        Args:
+            total_rate (int): Bytes per second shared by all downloads, 0 disables the limit
+            source_rate (int): Bytes per second of each music source, 0 disables the limit
+            host_connections (int): Maximum concurrent connections to one host, 0 disables the cap
+        """
+        self.total_bucket.set_rate(total_rate)
+        with self.condition:
+            self.source_rate = max(0, int(source_rate))
+            for bucket in self.source_buckets.values():
+                bucket.set_rate(self.source_rate)
+            self.host_connections = max(0, int(host_connections))
+            self.condition.notify_all()
+
+    def _source_bucket(self, source):
+        with self.condition:
+            bucket = self.source_buckets.get(source)
+            if bucket is None:
+                bucket = self.source_buckets[source] = TokenBucket(self.source_rate, clock=self.clock)
+            return bucket
+
+    def reserve(self, source, nbytes):
+        """
+        Account for bytes received from a source
+
+        Args:
+            source (str): Music source name
+            nbytes (int): Bytes just received
+
+        Returns:
+            float: Seconds to wait before reading more, the longer delay of the global and source limits
+        """
+        return max(self.total_bucket.reserve(nbytes), self._source_bucket(source).reserve(nbytes))
+
+    def pause(self, delay, is_cancelled=None):
+        """
+        Wait for the delay returned by reserve, on the limiter's clock
+
+        Args:
+            delay (float): Seconds to wait
+            is_cancelled (callable): Returns True when waiting should be abandoned
+
+        Returns:
+            bool: True if the whole delay passed, False if cancelled while waiting
+        """
+        deadline = self.clock() + delay
+        while delay > 0:
+            if is_cancelled is not None and is_cancelled():
+                return False
+            self.sleep(min(delay, 0.1))
+            delay = deadline - self.clock()
+        return True
+
+    def read_size(self, source, size):
+        """
+        Shrink a read so a single chunk never exceeds READ_INTERVAL seconds of the tightest limit
+
+        Args:
+            source (str): Music source name
+            size (int): Read size the downloader would like to use
+
+        Returns:
+            int: Read size to use
+        """
+        rates = [rate for rate in (self.total_bucket.rate, self.source_rate) if rate]
+        if not rates:
+            return size
+        return min(size, max(self.MIN_READ_SIZE, int(min(rates) * self.READ_INTERVAL)))
+
+    def acquire_connection(self, url, is_cancelled=None):
+        """
+        Wait for a free connection slot of the host of url
+
+        Args:
+            url (str): URL about to be requested
+            is_cancelled (callable): Returns True when waiting should be abandoned
+
+        Returns:
+            bool: True if a slot was taken, False if cancelled while waiting
+        """
+        host = urlsplit(url).netloc
+        with self.condition:
+            while self.host_connections and self.host_active.get(host, 0) >= self.host_connections:
+                if is_cancelled is not None and is_cancelled():
+                    return False
+                self.condition.wait(0.1)
+            self.host_active[host] = self.host_active.get(host, 0) + 1
+            return True
+
+    def release_connection(self, url):
+        """
+        Give back the slot taken by acquire_connection
+
+        Args:
+            url (str): URL passed to acquire_connection
+        """
+        host = urlsplit(url).netloc
+        with self.condition:
+            self.host_active[host] -= 1
+            if not self.host_active[host]:
+                del self.host_active[host]
+            self.condition.notify_all()
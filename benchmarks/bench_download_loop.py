@@ -0,0 +1,125 @@
+'''
+Function:
+    Micro-benchmark of the download write loop against a local HTTP server
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+Usage:
+    python benchmarks/bench_download_loop.py --size-mb 50 --repeat 3
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import requests
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downloader import FileDownloader
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_server(payload):
+    """Serve payload for every GET request on a random local port"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            view = memoryview(payload)
+            for start in range(0, len(payload), 1024 * 1024):
+                self.wfile.write(view[start:start + 1024 * 1024])
+
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/song.flac'
+
+
+def legacy_loop(url, file_path):
+    """The original DownloadWorker loop: fixed 16KB chunks and one fp.write per chunk"""
+    with requests.get(url, stream=True, timeout=60) as resp:
+        total_size = int(resp.headers.get('content-length', 0))
+        download_size = 0
+        with open(file_path, 'wb') as fp:
+            for chunk in resp.iter_content(chunk_size=1024 * 16):
+                if not chunk:
+                    continue
+                fp.write(chunk)
+                download_size += len(chunk)
+                if total_size > 0:
+                    percent = int(download_size / total_size * 100)
+                    detail = f"{download_size/1024/1024:.1f}MB / {total_size/1024/1024:.1f}MB"
+
+
+def adaptive_loop(url, file_path):
+    """
+    The current loop: adaptive read size, reused buffer and buffered writes. Only the chunk loop
+    is timed, the .part state, fsync and atomic rename of FileDownloader.run are left out so
+    both variants do the same work
+    """
+    downloader = FileDownloader(url, {}, file_path, progress_callback=lambda downloaded, total: None)
+    with requests.get(url, stream=True, timeout=60) as resp:
+        total_size = int(resp.headers.get('content-length', 0))
+        download_size = [0]
+
+        def on_chunk(nbytes, fp):
+            download_size[0] += nbytes
+            downloader.progress_callback(download_size[0], total_size)
+
+        with open(file_path, 'wb', buffering=FileDownloader.WRITE_BUFFER_SIZE) as fp:
+            downloader._stream_body(resp, fp, on_chunk)
+
+
+def measure(func, url, file_path, trace_memory):
+    """Run one download and return (seconds, peak traced bytes)"""
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    func(url, file_path)
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    os.remove(file_path)
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the legacy and the adaptive download loop')
+    parser.add_argument('--size-mb', type=int, default=50, help='size of the served file in MB')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per loop, the best one is reported')
+    parser.add_argument('--trace-memory', action='store_true', help='also report the tracemalloc peak (slows both loops)')
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    server, url = start_server(payload)
+    work_dir = tempfile.mkdtemp(prefix='musicdlgui_bench_')
+    try:
+        for name, func in (('legacy 16KB iter_content', legacy_loop), ('adaptive readinto', adaptive_loop)):
+            runs = [measure(func, url, os.path.join(work_dir, 'song.flac'), args.trace_memory) for _ in range(args.repeat)]
+            best_time = min(run[0] for run in runs)
+            line = f'{name:<28} best {best_time:.3f}s  {args.size_mb / best_time:8.1f} MB/s'
+            if args.trace_memory:
+                line += f'  peak {max(run[1] for run in runs) / 1024:.0f} KB'
+            print(line)
+    finally:
+        server.shutdown()
+        os.rmdir(work_dir)
+
+
+if __name__ == '__main__':
+    main()
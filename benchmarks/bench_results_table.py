@@ -0,0 +1,99 @@
+'''
+Function:
+    Micro-benchmark of rendering search results into the results table
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+Usage:
+    python benchmarks/bench_results_table.py --rows 10000
+'''
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QTreeView
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from components import SearchResultsModel
+from core import normalize_results, parse_file_size, parse_duration
+
+
+def make_songs(count):
+    """Build fake search results shaped like the ones returned by musicdl"""
+    return normalize_results([{
+        'source': f'Source{i % 7}MusicClient', 'song_name': f'Song {i}', 'singers': f'Singer {i % 97}',
+        'album': f'Album {i % 31}', 'file_size': f'{(i % 50) / 7 + 1:.2f} MB', 'duration': f'{i % 6:02d}:{i % 60:02d}',
+        'ext': 'mp3', 'download_url': f'http://127.0.0.1/{i}.mp3',
+    } for i in range(count)])
+
+
+def legacy_table(songs):
+    """The original display_search_results: one QTableWidgetItem per cell"""
+    table = QTableWidget()
+    table.setColumnCount(7)
+    table.setSortingEnabled(False)
+    table.setRowCount(len(songs))
+    for row, song in enumerate(songs):
+        checkbox_item = QTableWidgetItem()
+        checkbox_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
+        checkbox_item.setCheckState(Qt.Unchecked)
+        table.setItem(row, 0, checkbox_item)
+        parse_file_size(song['file_size'])
+        parse_duration(song['duration'])
+        for column, field in enumerate(('singers', 'song_name', 'file_size', 'duration', 'album', 'source'), start=1):
+            table_item = QTableWidgetItem(song[field])
+            table_item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+            table.setItem(row, column, table_item)
+    table.setSortingEnabled(True)
+    return table
+
+
+def model_table(songs):
+    """The current results table: SearchResultsModel sorting itself, duplicates merged"""
+    model = SearchResultsModel()
+    table = QTreeView()
+    table.setModel(model)
+    table.setUniformRowHeights(True)
+    table.header().setSortIndicator(-1, Qt.AscendingOrder)
+    table.setSortingEnabled(True)
+    model.append_songs(songs)
+    table.keep_alive = model
+    return table
+
+
+def measure(func, songs):
+    """Fill one table, sort it by file size and return (fill seconds, sort seconds, traced bytes still held by the table)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    table = func(songs)
+    elapsed = time.perf_counter() - started
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    started = time.perf_counter()
+    table.sortByColumn(3, Qt.DescendingOrder)
+    sort_elapsed = time.perf_counter() - started
+    table.deleteLater()
+    return elapsed, sort_elapsed, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the QTableWidget and the model/view results table')
+    parser.add_argument('--rows', type=int, default=10000, help='number of search results to render')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per table, the best one is reported')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    songs = make_songs(args.rows)
+    for name, func in (('QTableWidget items', legacy_table), ('model/view', model_table)):
+        runs = [measure(func, songs) for _ in range(args.repeat)]
+        best_time = min(run[0] for run in runs)
+        best_sort = min(run[1] for run in runs)
+        print(f'{name:<20} best {best_time * 1000:8.1f}ms  sort {best_sort * 1000:8.1f}ms  python heap {max(run[2] for run in runs) / 1024:8.0f} KB')
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+'''
+Function:
+    Local Stand-in Music Source for Benchmarks: an HTTP server serving synthetic search results and audio
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+Usage:
+    python benchmarks/fake_source.py --port 8765 --latency-ms 150 --bandwidth-kbps 2048 --failure-rate 0.05
+'''
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs, quote
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from client_registry import ClientRegistry
+
+
+class FakeSourceConfig:
+    """
+    Behaviour of the stand-in source, every random decision is derived from seed so two runs
+    with the same config see the same results, the same failures and the same bytes
+    """
+    def __init__(self, latency_ms=100, bandwidth_kbps=0, failure_rate=0.0, drop_rate=0.0, results=10, song_size_kb=4096, seed=0):
+        """
+        Args:
+            latency_ms (float): Delay before every response starts
+            bandwidth_kbps (float): Per-connection send rate of audio in KB/s, 0 sends as fast as possible
+            failure_rate (float): Fraction of searches and songs answered with HTTP 503
+            drop_rate (float): Fraction of songs whose first transfer is cut off halfway, the client has to resume
+            results (int): Search results returned per source and keyword
+            song_size_kb (int): Mean audio size, each song varies by up to +-25%
+            seed (int): Seed of the synthetic data and of the failure injection
+        """
+        self.latency_ms = latency_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.results = results
+        self.song_size_kb = song_size_kb
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def chance(self, *parts):
+        """
+        Returns:
+            float: Stable pseudo-random number in [0, 1) for the given identity
+        """
+        digest = hashlib.sha1('|'.join(map(str, (self.seed,) + parts)).encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class FakeSourceServer:
+    """
+    Serves GET /search?source=&keyword= as a JSON list of songs shaped like musicdl results and
+    GET /audio/<source>/<id>.mp3 as a synthetic blob with Range support, both after the configured latency
+    """
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or FakeSourceConfig()
+        self.block = random.Random(self.config.seed).getrandbits(8 * 64 * 1024).to_bytes(64 * 1024, 'big')
+        self.attempts = {}  # audio path -> requests served, so a dropped song succeeds on its retry
+        self.lock = threading.Lock()
+        self.server = _ThreadingHTTPServer((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='FakeSourceServer', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def search_results(self, source, keyword):
+        """
+        Returns:
+            list: Synthetic songs of a source, the same keyword always yields the same songs
+        """
+        songs = []
+        for index in range(self.config.results):
+            song_id = hashlib.sha1(f'{source}|{keyword}|{index}'.encode('utf-8')).hexdigest()[:12]
+            size = self.song_size(song_id)
+            seconds = 120 + int(self.config.chance('duration', song_id) * 240)
+            songs.append({
+                'source': source, 'song_name': f'{keyword} {index}', 'singers': f'Singer {index % 5}', 'album': f'Album {index % 3}',
+                'file_size': f'{size / 1024 / 1024:.2f} MB', 'duration': f'{seconds // 60:02d}:{seconds % 60:02d}', 'ext': 'mp3',
+                'download_url': f'{self.base_url}/audio/{quote(source)}/{song_id}.mp3',
+            })
+        return songs
+
+    def song_size(self, song_id):
+        return int(self.config.song_size_kb * 1024 * (0.75 + self.config.chance('size', song_id) * 0.5))
+
+    def song_bytes(self, song_id, start, end):
+        """Bytes start..end inclusive of a song, a repeated seeded block"""
+        offset = start % len(self.block)
+        length = end - start + 1
+        repeated = self.block[offset:] + self.block * ((length - (len(self.block) - offset)) // len(self.block) + 1)
+        return repeated[:length]
+
+    def _handler_class(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(owner.config.latency_ms / 1000)
+                url = urlsplit(self.path)
+                if url.path == '/search':
+                    query = parse_qs(url.query)
+                    self.send_search(query.get('source', [''])[0], query.get('keyword', [''])[0])
+                elif url.path.startswith('/audio/'):
+                    self.send_audio(url.path)
+                else:
+                    self.send_error(404)
+
+            def send_search(self, source, keyword):
+                if owner.config.chance('search', source, keyword) < owner.config.failure_rate:
+                    self.send_error(503)
+                    return
+                body = json.dumps(owner.search_results(source, keyword), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_audio(self, path):
+                song_id = os.path.splitext(os.path.basename(path))[0]
+                with owner.lock:
+                    attempt = owner.attempts[path] = owner.attempts.get(path, 0) + 1
+                if owner.config.chance('fail', song_id) < owner.config.failure_rate:
+                    self.send_error(503)
+                    return
+                size = owner.song_size(song_id)
+                start, end = 0, size - 1
+                range_header = self.headers.get('Range', '')
+                if range_header.startswith('bytes='):
+                    first, _, last = range_header[6:].partition('-')
+                    start = int(first or 0)
+                    end = min(int(last), size - 1) if last else size - 1
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                else:
+                    self.send_response(200)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', f'"{song_id}"')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+                # The first transfer of a dropped song stops halfway through the file
+                stop = end
+                if attempt == 1 and owner.config.chance('drop', song_id) < owner.config.drop_rate:
+                    stop = min(end, start + (end - start) // 2)
+                self.send_paced(song_id, start, stop)
+                if stop != end:
+                    self.close_connection = True
+
+            def send_paced(self, song_id, start, end):
+                rate = owner.config.bandwidth_kbps * 1024
+                chunk = max(4096, int(rate / 20)) if rate else 256 * 1024
+                started = time.monotonic()
+                sent = 0
+                for position in range(start, end + 1, chunk):
+                    data = owner.song_bytes(song_id, position, min(end, position + chunk - 1))
+                    self.wfile.write(data)
+                    sent += len(data)
+                    if rate:
+                        delay = sent / rate - (time.monotonic() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+
+        return Handler
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-transfer, e.g. cancelled segments, are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _FakeSourceClient:
+    """Per-source part of FakeMusicClient, only what the download core reads"""
+    def __init__(self):
+        self.default_download_headers = {'User-Agent': 'MusicdlGUI-Benchmark'}
+
+
+class FakeMusicClient:
+    """Drop-in for musicdl.MusicClient that searches the stand-in server over HTTP"""
+    def __init__(self, base_url, music_sources, timeout=10):
+        import requests
+        self.base_url = base_url
+        self.music_sources = music_sources
+        self.music_clients = {source: _FakeSourceClient() for source in music_sources}
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def search(self, keyword):
+        results = {}
+        for source in self.music_sources:
+            resp = self.session.get(f'{self.base_url}/search', params={'source': source, 'keyword': keyword}, timeout=self.timeout)
+            # Like musicdl, a failed source is simply missing from the results
+            if resp.status_code == 200:
+                results[source] = resp.json()
+        return results
+
+
+class FakeClientRegistry(ClientRegistry):
+    """ClientRegistry whose clients talk to a FakeSourceServer instead of the real music services"""
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def get(self, source, settings):
+        with self.lock:
+            entry = self.clients.get(source)
+            if entry is None:
+                entry = self.clients[source] = (None, FakeMusicClient(self.base_url, [source]))
+            return entry[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the stand-in music source until interrupted')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--latency-ms', type=float, default=100, help='delay before every response')
+    parser.add_argument('--bandwidth-kbps', type=float, default=0, help='per-connection audio rate in KB/s, 0 is unlimited')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of searches and songs answered with HTTP 503')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='fraction of songs whose first transfer is cut off')
+    parser.add_argument('--results', type=int, default=10, help='results per source and keyword')
+    parser.add_argument('--song-size-kb', type=int, default=4096, help='mean audio size in KB')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data and failures')
+    args = parser.parse_args()
+
+    config = FakeSourceConfig(args.latency_ms, args.bandwidth_kbps, args.failure_rate, args.drop_rate, args.results, args.song_size_kb, args.seed)
+    server = FakeSourceServer(config, port=args.port).start()
+    print(f'Serving on {server.base_url}, e.g. {server.base_url}/search?source=QQMusicClient&keyword=test')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+'''
+Function:
+    Reproducible Benchmark Suite against the Local Stand-in Music Source, emits JSON comparable across commits
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+Usage:
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --output after.json --compare before.json
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_source import FakeSourceConfig, FakeSourceServer, FakeClientRegistry
+from core import MUSIC_SOURCES, DEFAULT_SETTINGS, search_sources, build_download_task, download_song
+from bandwidth import BandwidthLimiter
+from sessions import SessionPool
+from metrics import metrics
+
+
+SUITE_VERSION = 1
+SCENARIOS = ('search_fanout', 'table_render', 'batch_download')
+
+
+def percentile(values, fraction):
+    """Same nearest-rank percentile as Metrics.summary"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def peak_rss_kb():
+    """
+    Returns:
+        int: High-water mark of the process resident set in KB, None where the resource module is missing
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_search_fanout(server, keywords, sources):
+    """Search every keyword on all sources in parallel, the way the window and the command line do"""
+    registry = FakeClientRegistry(server.base_url)
+    settings = dict(DEFAULT_SETTINGS)
+    walls, first_results, errors, results = [], [], 0, 0
+    for index in range(keywords):
+        started = time.perf_counter()
+        first = []
+
+        def on_results(source, songs):
+            nonlocal results
+            results += len(songs)
+            if not first:
+                first.append(time.perf_counter() - started)
+
+        def on_error(source, error):
+            nonlocal errors
+            errors += 1
+
+        search_sources(sources, f'benchmark {index}', settings, registry, None, on_results=on_results, on_error=on_error)
+        walls.append((time.perf_counter() - started) * 1000)
+        if first:
+            first_results.append(first[0] * 1000)
+    return {
+        'keywords': keywords, 'sources': len(sources), 'results': results, 'errors': errors,
+        'wall_ms_p50': percentile(walls, 0.5), 'wall_ms_p95': percentile(walls, 0.95),
+        'first_result_ms_p50': percentile(first_results, 0.5),
+    }
+
+
+def bench_table_render(rows, batches):
+    """Append rows into the results model and tree view in per-source batches, then sort by size"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QApplication
+    from bench_results_table import make_songs, model_table
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    songs = make_songs(rows)
+    table = model_table([])
+    model = table.keep_alive
+    size = -(-rows // batches)
+    batch_ms = []
+    started = time.perf_counter()
+    for start in range(0, rows, size):
+        batch_started = time.perf_counter()
+        model.append_songs(songs[start:start + size])
+        app.processEvents()
+        batch_ms.append((time.perf_counter() - batch_started) * 1000)
+    append_ms = (time.perf_counter() - started) * 1000
+    sort_started = time.perf_counter()
+    table.sortByColumn(3, Qt.DescendingOrder)
+    app.processEvents()
+    sort_ms = (time.perf_counter() - sort_started) * 1000
+    result = {
+        'rows': rows, 'unique_rows': model.unique_count(), 'append_ms': append_ms,
+        'batch_ms_max': max(batch_ms), 'sort_ms': sort_ms,
+    }
+    table.deleteLater()
+    app.processEvents()
+    return result
+
+
+def bench_batch_download(server, songs, concurrency, segments, sources):
+    """Download songs from the stand-in source through the download core, several at a time"""
+    work_dir = tempfile.mkdtemp(prefix='musicdlgui_suite_')
+    registry = FakeClientRegistry(server.base_url)
+    session_pool = SessionPool(pool_maxsize=max(16, concurrency * segments))
+    bandwidth = BandwidthLimiter()
+    settings = dict(DEFAULT_SETTINGS, work_dir=work_dir, segmented_download_sources=list(sources) if segments > 1 else [], download_segments=segments)
+    candidates = []
+    for index in range(-(-songs // (server.config.results * len(sources)))):
+        for source in sources:
+            candidates.extend(server.search_results(source, f'download {index}'))
+    candidates = candidates[:songs]
+
+    def download(song_info):
+        client = registry.get(song_info['source'], settings)
+        session = session_pool.get_session(song_info['source'], client.music_clients[song_info['source']].default_download_headers)
+        task = build_download_task(song_info, settings, client, session)
+        success, _, file_path = download_song(task, bandwidth=bandwidth, name='Benchmark')
+        return os.path.getsize(file_path) if success else None
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sizes = list(executor.map(download, candidates))
+        elapsed = time.perf_counter() - started
+    finally:
+        session_pool.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    downloaded = sum(size for size in sizes if size is not None)
+    return {
+        'songs': len(candidates), 'concurrency': concurrency, 'segments': segments,
+        'succeeded': sum(size is not None for size in sizes), 'bytes': downloaded,
+        'wall_s': elapsed, 'throughput_mb_s': downloaded / 1024 / 1024 / elapsed if elapsed else None,
+    }
+
+
+def run(args):
+    config = FakeSourceConfig(args.latency_ms, args.bandwidth_kbps, args.failure_rate, args.drop_rate, args.results, args.song_size_kb, args.seed)
+    sources = MUSIC_SOURCES[:args.sources]
+    server = FakeSourceServer(config).start()
+    report = {
+        'suite_version': SUITE_VERSION, 'commit': git_commit(), 'created_at': time.time(),
+        'python': platform.python_version(), 'platform': platform.platform(),
+        'config': dict(config.to_dict(), sources=len(sources), keywords=args.keywords, rows=args.rows,
+                       songs=args.songs, concurrency=args.concurrency, segments=args.segments),
+        'scenarios': {},
+    }
+    scenarios = {
+        'search_fanout': lambda: bench_search_fanout(server, args.keywords, sources),
+        'table_render': lambda: bench_table_render(args.rows, len(sources)),
+        'batch_download': lambda: bench_batch_download(server, args.songs, args.concurrency, args.segments, sources),
+    }
+    try:
+        for name in args.only or SCENARIOS:
+            metrics.clear()
+            if args.trace_memory:
+                tracemalloc.start()
+            try:
+                result = scenarios[name]()
+            except ImportError as e:
+                result = {'skipped': str(e)}
+            if args.trace_memory:
+                result['python_heap_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+            result['peak_rss_kb'] = peak_rss_kb()
+            # Metrics recorded by the application code itself, e.g. search.source and download.ttfb
+            result['metrics'] = metrics.summary()
+            report['scenarios'][name] = result
+            print(f'{name}: ' + ', '.join(f'{key}={value:.1f}' if isinstance(value, float) else f'{key}={value}'
+                                          for key, value in result.items() if key != 'metrics'), file=sys.stderr)
+    finally:
+        server.stop()
+    return report
+
+
+def compare(report, baseline):
+    """
+    Returns:
+        str: Every numeric result next to its baseline value and the relative change
+    """
+    lines = []
+    if report['config'] != baseline.get('config'):
+        lines.append('warning: the baseline was recorded with a different config')
+    for name, result in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name, {})
+        for key, value in result.items():
+            old = base.get(key)
+            if key == 'metrics' or not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            change = f'{(value - old) / old * 100:+.1f}%' if old else '-'
+            lines.append(f'{name}.{key:<22} {old:>12.1f} -> {value:>12.1f}  {change}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark search fan-out, table rendering and batch downloads against a local stand-in source')
+    parser.add_argument('--only', nargs='+', choices=SCENARIOS, help='scenarios to run, all by default')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    parser.add_argument('--trace-memory', action='store_true', help='also report the tracemalloc peak of each scenario (slows them down)')
+    parser.add_argument('--sources', type=int, default=len(MUSIC_SOURCES), help='number of music sources searched and downloaded from')
+    parser.add_argument('--keywords', type=int, default=20, help='keywords searched in search_fanout')
+    parser.add_argument('--rows', type=int, default=10000, help='results rendered in table_render')
+    parser.add_argument('--songs', type=int, default=30, help='songs downloaded in batch_download')
+    parser.add_argument('--concurrency', type=int, default=3, help='parallel downloads in batch_download')
+    parser.add_argument('--segments', type=int, default=1, help='segments per download in batch_download')
+    parser.add_argument('--latency-ms', type=float, default=100, help='stand-in source delay before every response')
+    parser.add_argument('--bandwidth-kbps', type=float, default=4096, help='stand-in source per-connection rate in KB/s, 0 is unlimited')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='fraction of searches and songs answered with HTTP 503')
+    parser.add_argument('--drop-rate', type=float, default=0.1, help='fraction of songs whose first transfer is cut off')
+    parser.add_argument('--results', type=int, default=10, help='results per source and keyword')
+    parser.add_argument('--song-size-kb', type=int, default=2048, help='mean song size in KB')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data and failures')
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
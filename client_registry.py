@@ -0,0 +1,119 @@
+'''
+Function:
+    Long-lived Music Client Registry for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import json
+import threading
+from search_cache import QUARK_SITES
+from metrics import metrics
+from logger import log_info, log_exception
+
+
+class ClientRegistry:
+    """
+    Keeps one initialized musicdl.MusicClient per source across searches,
+    a client is only rebuilt when the settings it was built from change
+    """
+    def __init__(self):
+        self.clients = {}  # source -> (config_fingerprint, music_client)
+        self.lock = threading.Lock()
+        self.build_locks = {}  # source -> lock, so different sources can be built in parallel
+
+    @staticmethod
+    def client_config(source, settings):
+        """
+        Build the musicdl client config of a source from the application settings
+
+        Args:
+            source (str): Music source name
+            settings (dict): Application settings including cookies and work directory
+
+        Returns:
+            dict: Config passed to musicdl through init_music_clients_cfg
+        """
+        cookie_data = settings.get('cookies', {}).get(source, {})
+        config = {
+            'work_dir': settings.get('work_dir', 'musicdl_outputs'),
+            'default_search_cookies': cookie_data.get('search', '').strip(),
+            'default_download_cookies': cookie_data.get('download', '').strip() or cookie_data.get('search', '').strip(),
+            'max_retries': 1,
+            'search_size_per_source': 5,
+            'search_size_per_page': 5,
+        }
+        # Handle Quark sites
+        quark_cookie = settings.get('quark_cookies', '').strip()
+        if quark_cookie and source in QUARK_SITES:
+            config['quark_parser_config'] = {'cookies': quark_cookie}
+        return config
+
+    def get(self, source, settings):
+        """
+        Get the client of a source, building it if missing or if its cookies or work_dir changed
+
+        Args:
+            source (str): Music source name
+            settings (dict): Application settings including cookies and work directory
+
+        Returns:
+            musicdl.MusicClient: Client holding only this source
+        """
+        config = self.client_config(source, settings)
+        fingerprint = json.dumps(config, sort_keys=True)
+        with self.lock:
+            entry = self.clients.get(source)
+            if entry is not None and entry[0] == fingerprint:
+                return entry[1]
+            build_lock = self.build_locks.setdefault(source, threading.Lock())
+        with build_lock:
+            with self.lock:
+                entry = self.clients.get(source)
+                if entry is not None and entry[0] == fingerprint:
+                    return entry[1]
+            with metrics.span('client.build', source=source):
+                # Imported on first use, loading musicdl and all of its source clients takes most of the startup time
+                from musicdl import musicdl
+                client = musicdl.MusicClient(
+                    music_sources=[source],
+                    init_music_clients_cfg={source: config},
+                    requests_overrides={source: {'timeout': (4, 8)}},
+                    clients_threadings={source: 3}
+                )
+            with self.lock:
+                rebuilt = source in self.clients
+                self.clients[source] = (fingerprint, client)
+            log_info(f'{"重建" if rebuilt else "创建"}音乐客户端 - {source}')
+            return client
+
+    def peek(self, source):
+        """
+        Get the current client of a source without building one
+
+        Args:
+            source (str): Music source name
+
+        Returns:
+            musicdl.MusicClient: Client of this source, or None if it was never built
+        """
+        with self.lock:
+            entry = self.clients.get(source)
+        return entry[1] if entry is not None else None
+
+    def warm_up(self, sources, settings):
+        """
+        Build the clients of the given sources in a background thread
+
+        Args:
+            sources (list): Music source names
+            settings (dict): Application settings including cookies and work directory
+        """
+        def build_all():
+            for source in sources:
+                try:
+                    self.get(source, settings)
+                except Exception as e:
+                    log_exception(f'预创建音乐客户端失败 - {source}: {str(e)}')
+        threading.Thread(target=build_all, name='ClientWarmUp', daemon=True).start()
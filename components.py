@@ -6,38 +6,329 @@ Author:
 WeChat Official Account (微信公众号):
     Charles的皮卡丘
 '''
-from PyQt5.QtWidgets import QTableWidgetItem
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+from ranking import DuplicateIndex, same_duration
 
 
-class SortableTableWidgetItem(QTableWidgetItem):
+class SearchResultsModel(QAbstractItemModel):
     """
-    Custom table widget item that supports proper sorting
-    by maintaining both display text and sort value
+    Two-level model of search results: every top-level row is the best candidate of a
+    cluster of cross-source duplicates, the other candidates are its child rows
+
+    Results are stored once as plain rows, the check state of every result is kept
+    in a bitset instead of per-cell items
+
+    Clusters keep their arrival position as a stable id, sorting only permutes the display
+    order, so a sort extracts one Python key per row instead of calling data() per comparison
     """
-    def __init__(self, text, sort_value=None):
+    HEADERS = ['', 'Singers', 'Songname', 'Filesize', 'Duration', 'Album', 'Source']
+    TEXT_FIELDS = [None, 'singers', 'song_name', 'file_size', 'duration', 'album', 'source']
+    # Filesize and Duration sort on the numeric fields attached by the search worker
+    SORT_FIELDS = [None, 'singers', 'song_name', 'size_bytes', 'duration_s', 'album', 'source']
+    # Role returning the value a column is sorted on
+    SORT_ROLE = Qt.UserRole
+
+    def __init__(self, speed_stats=None, parent=None):
+        """
+        Initialize search results model
+
+        Args:
+            speed_stats (SourceSpeedStats): Download speed history used to rank duplicates, None ranks by file size only
+            parent: Parent QObject
+        """
+        super().__init__(parent)
+        self.speed_stats = speed_stats
+        self.merge_duplicates = True
+        self.songs = []
+        self.checked_bits = bytearray()
+        self.clusters = []  # cluster id -> song rows, best candidate first
+        self.duplicate_index = DuplicateIndex()  # Finds the cluster a new result joins
+        self.key_rows = {}  # duplicate key -> song rows, kept even when duplicates are not merged
+        self.order = []  # display row -> cluster id
+        self.position = []  # cluster id -> display row
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        # Internal id 0 marks a cluster row, otherwise it is the id of the parent cluster plus one
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column, self.order[parent.row()] + 1)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(self.position[index.internalId() - 1], 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.clusters)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.clusters[self.order[parent.row()]]) - 1
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() == 0:
+            return Qt.ItemIsUserCheckable | Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        song_row, column = self.song_row(index), index.column()
+        if column == 0:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self.is_checked(song_row) else Qt.Unchecked
+            if role == self.SORT_ROLE:
+                return int(self.is_checked(song_row))
+            return None
+        if role == Qt.DisplayRole:
+            return self.songs[song_row][self.TEXT_FIELDS[column]]
+        if role == self.SORT_ROLE:
+            return self.songs[song_row][self.SORT_FIELDS[column]]
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignLeft | Qt.AlignVCenter)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 0 or role != Qt.CheckStateRole:
+            return False
+        self.set_checked(self.song_row(index), value == Qt.Checked)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole, self.SORT_ROLE])
+        if self.sort_column == 0:
+            self.sort(self.sort_column, self.sort_order)
+        return True
+
+    def song_row(self, index):
+        """
+        Args:
+            index (QModelIndex): Index of this model
+
+        Returns:
+            int: Row of the result in the flat result store
+        """
+        if index.internalId() == 0:
+            return self.clusters[self.order[index.row()]][0]
+        return self.clusters[index.internalId() - 1][index.row() + 1]
+
+    def song_at(self, index):
+        """
+        Args:
+            index (QModelIndex): Index of this model
+
+        Returns:
+            dict: Song info of the row
+        """
+        return self.songs[self.song_row(index)]
+
+    def is_checked(self, song_row):
+        """
+        Args:
+            song_row (int): Row in the flat result store
+
+        Returns:
+            bool: True if the result is checked
+        """
+        return bool(self.checked_bits[song_row >> 3] & (1 << (song_row & 7)))
+
+    def set_checked(self, song_row, checked):
         """
-        Initialize sortable table item
-        
+        Set the check state of a result without notifying views
+
+        Args:
+            song_row (int): Row in the flat result store
+            checked (bool): New check state
+        """
+        if checked:
+            self.checked_bits[song_row >> 3] |= 1 << (song_row & 7)
+        else:
+            self.checked_bits[song_row >> 3] &= ~(1 << (song_row & 7)) & 0xFF
+
+    def set_all_checked(self, checked):
+        """
+        Check the best candidate of every cluster, or uncheck every result
+
+        Args:
+            checked (bool): New check state
+        """
+        if not self.clusters:
+            return
+        self.checked_bits = bytearray(len(self.checked_bits))
+        if checked:
+            for cluster in self.clusters:
+                self.set_checked(cluster[0], True)
+        roles = [Qt.CheckStateRole, self.SORT_ROLE]
+        self.dataChanged.emit(self.index(0, 0), self.index(len(self.clusters) - 1, 0), roles)
+        for display_row, cluster_id in enumerate(self.order):
+            cluster = self.clusters[cluster_id]
+            if len(cluster) > 1:
+                parent = self.index(display_row, 0)
+                self.dataChanged.emit(self.index(0, 0, parent), self.index(len(cluster) - 2, 0, parent), roles)
+        if self.sort_column == 0:
+            self.sort(self.sort_column, self.sort_order)
+
+    def checked_songs(self):
+        """
+        Returns:
+            list: Song info dicts of the checked results, in arrival order
+        """
+        return [song for song_row, song in enumerate(self.songs) if self.is_checked(song_row)]
+
+    def unique_count(self):
+        """
+        Returns:
+            int: Number of distinct songs after merging duplicates
+        """
+        return len(self.clusters)
+
+    def append_songs(self, songs):
+        """
+        Add search results, each one joins the cluster of its duplicates or starts a new one
+
+        Duplicates are found through the dedup_key attached by the search worker, so only
+        results sharing a key are compared and the cost stays linear in the number of results
+
         Args:
-            text (str): Display text
-            sort_value: Value used for sorting (defaults to text if not provided)
+            songs (list): Song info dicts
         """
-        super().__init__(text)
-        self.sort_value = sort_value if sort_value is not None else text
+        if not songs:
+            return
+        first_song_row = len(self.songs)
+        self.songs.extend(songs)
+        self.checked_bits.extend(bytearray((len(self.songs) + 7) // 8 - len(self.checked_bits)))
+        new_clusters, joined = [], {}
+        for song_row in range(first_song_row, len(self.songs)):
+            if self.songs[song_row].get('dedup_key'):
+                self.key_rows.setdefault(self.songs[song_row]['dedup_key'], []).append(song_row)
+            cluster_id = self._find_cluster(self.songs[song_row], new_clusters)
+            if cluster_id is None:
+                cluster_id = len(self.clusters) + len(new_clusters)
+                new_clusters.append([song_row])
+                if self.merge_duplicates:
+                    self.duplicate_index.add(self.songs[song_row], cluster_id)
+            elif cluster_id >= len(self.clusters):
+                new_clusters[cluster_id - len(self.clusters)].append(song_row)
+            else:
+                joined.setdefault(cluster_id, []).append(song_row)
+        # Duplicates of clusters already shown become child rows, the best candidate moves to the top
+        leaders_changed = False
+        for cluster_id, song_rows in joined.items():
+            cluster = self.clusters[cluster_id]
+            display_row = self.position[cluster_id]
+            parent = self.index(display_row, 0)
+            self.beginInsertRows(parent, len(cluster) - 1, len(cluster) + len(song_rows) - 2)
+            cluster.extend(song_rows)
+            self.endInsertRows()
+            leader = cluster[0]
+            cluster.sort(key=self._rank_key, reverse=True)
+            if cluster[0] != leader:
+                leaders_changed = True
+                self.dataChanged.emit(parent, self.index(display_row, len(self.HEADERS) - 1))
+                self.dataChanged.emit(self.index(0, 0, parent), self.index(len(cluster) - 2, len(self.HEADERS) - 1, parent))
+        if new_clusters:
+            for cluster in new_clusters:
+                cluster.sort(key=self._rank_key, reverse=True)
+            first_id = len(self.clusters)
+            self.beginInsertRows(QModelIndex(), first_id, first_id + len(new_clusters) - 1)
+            self.clusters.extend(new_clusters)
+            self.order.extend(range(first_id, len(self.clusters)))
+            self.position.extend(range(first_id, len(self.clusters)))
+            self.endInsertRows()
+        # New rows arrive at the bottom, keep the table in the order the user picked
+        if self.sort_column >= 0 and (new_clusters or leaders_changed):
+            self.sort(self.sort_column, self.sort_order)
 
-    def __lt__(self, other):
+    def sort(self, column, order=Qt.AscendingOrder):
         """
-        Compare items for sorting
-        
+        Sort the clusters by the value of their best candidate, candidates inside a cluster keep their ranking
+
+        Args:
+            column (int): Column to sort on, -1 restores the arrival order
+            order (Qt.SortOrder): Sort direction
+        """
+        self.sort_column, self.sort_order = column, order
+        if column < 0:
+            new_order = list(range(len(self.clusters)))
+        else:
+            if column == 0:
+                keys = [self.is_checked(cluster[0]) for cluster in self.clusters]
+            else:
+                field = self.SORT_FIELDS[column]
+                keys = [self.songs[cluster[0]][field] for cluster in self.clusters]
+            # Ties keep their arrival order in both directions
+            new_order = sorted(range(len(self.clusters)), key=keys.__getitem__, reverse=order == Qt.DescendingOrder)
+        if new_order == self.order:
+            return
+        self.layoutAboutToBeChanged.emit([], QAbstractItemModel.VerticalSortHint)
+        old_order = self.order
+        self.order = new_order
+        self.position = [0] * len(new_order)
+        for display_row, cluster_id in enumerate(new_order):
+            self.position[cluster_id] = display_row
+        # Child indexes hold the stable cluster id, only cluster rows move
+        old_indexes = [index for index in self.persistentIndexList() if index.internalId() == 0]
+        new_indexes = [self.createIndex(self.position[old_order[index.row()]], index.column(), 0) for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit([], QAbstractItemModel.VerticalSortHint)
+
+    def alternates(self, song):
+        """
+        Find the results of other sources that are the same song
+
         Args:
-            other: Another table item to compare with
-            
+            song (dict): Song info of this model
+
         Returns:
-            bool: True if this item is less than the other
-        """
-        if isinstance(other, SortableTableWidgetItem):
-            try:
-                return self.sort_value < other.sort_value
-            except TypeError:
-                return super().__lt__(other)
-        return super().__lt__(other)
+            list: Equivalent song infos from other sources, best candidate first
+        """
+        rows = [
+            song_row for song_row in self.key_rows.get(song.get('dedup_key'), ())
+            if self.songs[song_row]['source'] != song['source']
+            and same_duration(self.songs[song_row].get('duration_s', 0), song.get('duration_s', 0))
+        ]
+        rows.sort(key=self._rank_key, reverse=True)
+        return [self.songs[song_row] for song_row in rows]
+
+    def _find_cluster(self, song, new_clusters):
+        """Return the id of the cluster holding a duplicate of song, or None"""
+        if not self.merge_duplicates:
+            return None
+
+        def leader_of(cluster_id):
+            if cluster_id < len(self.clusters):
+                return self.songs[self.clusters[cluster_id][0]]
+            return self.songs[new_clusters[cluster_id - len(self.clusters)][0]]
+
+        return self.duplicate_index.find(song, leader_of)
+
+    def _rank_key(self, song_row):
+        """Ranking key of a candidate, larger is better"""
+        song = self.songs[song_row]
+        if self.speed_stats is not None:
+            return self.speed_stats.rank_key(song)
+        return (song.get('size_bytes', 0), 0)
+
+    def clear(self):
+        """Remove every result"""
+        self.beginResetModel()
+        self.songs = []
+        self.checked_bits = bytearray()
+        self.clusters = []
+        self.duplicate_index.clear()
+        self.key_rows = {}
+        self.order = []
+        self.position = []
+        self.endResetModel()
+
@@ -0,0 +1,565 @@
+'''
+Function:
+    Qt-free Search and Download Core shared by the MusicdlGUI window and the command line
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import json
+import time
+import uuid
+import threading
+import itertools
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# The path sanitizer musicdl uses, imported directly because importing musicdl loads every source client
+from pathvalidate import sanitize_filepath
+from search_cache import SearchCache
+from ranking import duplicate_key
+from library_index import song_key, file_sha1
+from downloader import FileDownloader, FilenameAllocator, DownloadError, DownloadCancelled, part_file_path, remove_part_files
+from metrics import metrics
+from events import event_log, keyword_hash
+from logger import log_info, log_warning, log_error, log_exception, log_debug
+
+
+# Music sources offered by the application, the first three are searched by default
+MUSIC_SOURCES = ['QQMusicClient', 'KuwoMusicClient', 'MiguMusicClient',
+                 'QianqianMusicClient', 'KugouMusicClient', 'NeteaseMusicClient']
+DEFAULT_SETTINGS = {
+    'work_dir': 'musicdl_outputs',
+    'dir_structure': 'flat',
+    'cookies': {},
+    'quark_cookies': ''
+}
+# Shared by every download so that concurrent downloads never pick the same target name
+_filename_allocator = FilenameAllocator()
+# Seconds before the first failover attempt of a song, doubled for every further attempt
+FAILOVER_BACKOFF = 1.0
+
+
+def load_settings(settings_file):
+    """
+    Load the application settings
+
+    Args:
+        settings_file (str): Path of settings.json
+
+    Returns:
+        dict: Saved settings, or the defaults if the file is missing or unreadable
+    """
+    try:
+        if os.path.exists(settings_file):
+            with open(settings_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception:
+        pass
+    return dict(DEFAULT_SETTINGS, cookies={})
+
+
+def parse_file_size(file_size):
+    """
+    Convert a file size text such as "3.2 MB" into bytes
+
+    Args:
+        file_size (str): File size text reported by the music source
+
+    Returns:
+        int: Size in bytes, 0 if the text cannot be parsed
+    """
+    try:
+        parts = file_size.split()
+        num = float(parts[0])
+        unit = parts[1].upper()
+    except (AttributeError, IndexError, ValueError):
+        return 0
+    return int(num * {'GB': 1024 ** 3, 'MB': 1024 ** 2, 'KB': 1024}.get(unit, 1))
+
+
+def parse_duration(duration):
+    """
+    Convert a duration text such as "03:20" or "1:02:03" into seconds
+
+    Args:
+        duration (str): Duration text reported by the music source
+
+    Returns:
+        int: Duration in seconds, 0 if the text cannot be parsed
+    """
+    try:
+        parts = [int(part) for part in duration.split(':')]
+    except (AttributeError, ValueError):
+        return 0
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return 0
+
+
+def normalize_results(results):
+    """
+    Attach typed sort keys and the duplicate key to search results, so the GUI thread never parses text
+
+    Args:
+        results (list): Song info dicts returned by a music source, updated in place
+
+    Returns:
+        list: The same results, every song carrying size_bytes, duration_s and dedup_key
+    """
+    for song in results:
+        if 'size_bytes' not in song:
+            song['size_bytes'] = parse_file_size(song.get('file_size'))
+        if 'duration_s' not in song:
+            song['duration_s'] = parse_duration(song.get('duration'))
+        if 'dedup_key' not in song:
+            song['dedup_key'] = duplicate_key(song)
+    return results
+
+
+def search_source(source, keyword, settings, client_registry):
+    """
+    Search a single source with its long-lived client
+
+    Args:
+        source (str): Music source name
+        keyword (str): Search keyword
+        settings (dict): Application settings including cookies and work directory
+        client_registry (ClientRegistry): Registry holding one long-lived music client per source
+
+    Returns:
+        tuple: (source, results_list, error_msg), error_msg is None on success
+    """
+    started_at = time.monotonic()
+    try:
+        client = client_registry.get(source, settings)
+        with metrics.span('search.source', source=source) as labels:
+            results = client.search(keyword=keyword)
+            labels['results'] = len(results.get(source) or [])
+        if source not in results:
+            # If the source didn't return any results (even empty list), it might have failed
+            log_error(f'搜索源 {source} 无响应')
+            _emit_search_event(source, keyword, started_at, 'error', error='No response')
+            return source, [], "No response"
+        _emit_search_event(source, keyword, started_at, 'ok', results=len(results[source]))
+        return source, normalize_results(results[source]), None
+    except Exception as e:
+        log_exception(f'搜索源 {source} 执行出错: {str(e)}')
+        _emit_search_event(source, keyword, started_at, 'error', error=str(e))
+        return source, [], str(e)
+
+
+def _emit_search_event(source, keyword, started_at, status, **fields):
+    """Append a search event, latency includes building the client on first use"""
+    event_log.emit('search', source=source, keyword_hash=keyword_hash(keyword),
+                   latency_ms=round((time.monotonic() - started_at) * 1000, 1), status=status, **fields)
+
+
+def search_sources(music_sources, keyword, settings, client_registry, search_cache=None, on_cached=None, on_results=None, on_error=None):
+    """
+    Search several sources in parallel, answering recently searched ones from the cache
+
+    Args:
+        music_sources (list): List of music source names to search
+        keyword (str): Search keyword
+        settings (dict): Application settings including cookies and work directory
+        client_registry (ClientRegistry): Registry holding one long-lived music client per source
+        search_cache (SearchCache): Cache answering recently searched sources without network access
+        on_cached (callable): Called as on_cached(source, results) for sources answered from the cache
+        on_results (callable): Called as on_results(source, results) as soon as a source returns
+        on_error (callable): Called as on_error(source, error_msg) for failed sources
+    """
+    try:
+        network_sources = []
+        for source in music_sources:
+            cached_results = None
+            if search_cache is not None:
+                cached_results = search_cache.get(SearchCache.make_key(source, keyword, settings))
+            if cached_results is not None:
+                log_debug('搜索源 %s 命中搜索缓存, %d 条结果', source, len(cached_results))
+                event_log.emit('search', source=source, keyword_hash=keyword_hash(keyword), latency_ms=0, status='cached', results=len(cached_results))
+                if on_cached is not None:
+                    on_cached(source, normalize_results(cached_results))
+            else:
+                network_sources.append(source)
+        if not network_sources:
+            return
+
+        # Each source is its own task and is reported as soon as it returns
+        with ThreadPoolExecutor(max_workers=len(network_sources)) as executor:
+            futures = [executor.submit(search_source, source, keyword, settings, client_registry) for source in network_sources]
+            for future in as_completed(futures):
+                source, source_results, error = future.result()
+                if error is not None:
+                    if on_error is not None:
+                        on_error(source, error)
+                    continue
+                log_debug('搜索源 %s 返回 %d 条结果', source, len(source_results))
+                if search_cache is not None and source_results:
+                    search_cache.put(SearchCache.make_key(source, keyword, settings), source_results)
+                if on_results is not None:
+                    on_results(source, source_results)
+    finally:
+        if search_cache is not None:
+            search_cache.save()
+
+
+class DownloadTask:
+    """
+    A single song waiting in, or running through, the download manager
+    """
+    _id_counter = itertools.count(1)
+
+    def __init__(self, song_info, download_dir, filename, music_client, segments=1, session=None):
+        """
+        Initialize download task
+
+        Args:
+            song_info (dict): Song information including download URL and metadata
+            download_dir (str): Directory to save the downloaded file
+            filename (str): Filename for the downloaded file
+            music_client: MusicClient instance for accessing download headers, None lets the download thread build it
+            segments (int): Number of concurrent byte ranges for large files, 1 disables segmenting
+            session (requests.Session): Shared keep-alive session of the song's source
+        """
+        self.task_id = next(DownloadTask._id_counter)
+        self.song_info = song_info
+        self.download_dir = download_dir
+        self.filename = filename
+        self.music_client = music_client
+        self.segments = segments
+        self.session = session
+        self.source = song_info['source']
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.status = 'queued'  # queued, running, done, failed
+        self.started_at = 0.0
+        self.file_path = None  # Target path picked by the worker
+        self.file_hash = None  # SHA-1 of the finished file
+        self.attempt = 1
+        self.journal_id = uuid.uuid4().hex  # Identity of the song in the download journal, kept across failover
+        self.batch_id = None
+        self.tried_songs = [song_info]  # Candidates already tried for this song, including failed-over sources
+
+
+def build_download_task(song_info, settings, music_client, session=None):
+    """
+    Create a download task for a song, resolving its target directory and filename from the settings
+
+    Args:
+        song_info (dict): Song info returned by a music source
+        settings (dict): Application settings
+        music_client: MusicClient holding the source of the song, None lets the download thread build it
+        session (requests.Session): Shared keep-alive session of the song's source
+
+    Returns:
+        DownloadTask: Task ready to be downloaded
+    """
+    # Determine download directory based on user settings
+    custom_work_dir = settings.get('work_dir', 'musicdl_outputs')
+    dir_structure = settings.get('dir_structure', 'flat')
+
+    if dir_structure == 'flat':
+        download_dir = custom_work_dir
+    elif dir_structure == 'source':
+        download_dir = os.path.join(custom_work_dir, song_info['source'])
+    else:
+        download_dir = song_info.get('work_dir', os.path.join(custom_work_dir, song_info['source']))
+
+    os.makedirs(sanitize_filepath(download_dir), exist_ok=True)
+
+    # Generate filename
+    if dir_structure == 'flat':
+        safe_singer = sanitize_filepath(song_info['singers']).replace('/', '_').replace('\\', '_')
+        filename = f"{song_info['song_name']} - {safe_singer}.{song_info['ext']}"
+    else:
+        filename = f"{song_info['song_name']}.{song_info['ext']}"
+
+    # Segmented fetching is opt-in per source, some CDNs reject parallel ranges
+    segments = 1
+    if song_info['source'] in settings.get('segmented_download_sources', []):
+        segments = settings.get('download_segments', 4)
+
+    return DownloadTask(song_info, download_dir, filename, music_client, segments=segments, session=session)
+
+
+def download_song(task, progress_callback=None, is_cancelled=None, bandwidth=None, name='Download', on_allocated=None, client_provider=None):
+    """
+    Download a single task into its target directory
+
+    Args:
+        task (DownloadTask): Task holding song info, target directory and filename
+        progress_callback (callable): Called as progress_callback(downloaded_bytes, total_bytes)
+        is_cancelled (callable): Returns True when the download should be aborted
+        bandwidth (BandwidthLimiter): Rate limits and connection caps shared by all downloads
+        name (str): Name of the caller used in log messages
+        on_allocated (callable): Called as on_allocated(file_path) once the target name is reserved, before any data is written
+        client_provider (callable): Called as client_provider(source) -> (music_client, session) for tasks queued without a client
+
+    Returns:
+        tuple: (success, message, file_path), file_path is empty on failure
+    """
+    song_info = task.song_info
+    download_music_file_path = None
+    downloader = None
+    keep_partial = False
+    try:
+        log_debug('%s 开始执行，歌曲: %s', name, song_info.get('song_name', 'Unknown'))
+        if task.music_client is None:
+            # Built on the download thread, building the first client imports musicdl
+            task.music_client, task.session = client_provider(song_info['source'])
+        download_music_file_path = _allocate_file_path(task, song_key(song_info))
+        task.file_path = download_music_file_path
+        if on_allocated is not None:
+            on_allocated(download_music_file_path)
+
+        headers = task.music_client.music_clients[song_info['source']].default_download_headers
+        downloader = FileDownloader(
+            song_info['download_url'], headers, download_music_file_path, song_key=song_key(song_info),
+            progress_callback=progress_callback, is_cancelled=is_cancelled, segments=task.segments,
+            session=task.session, bandwidth=bandwidth, source=song_info['source']
+        )
+        # Usually the allocated path, unless another program took that name while downloading
+        file_path = downloader.run()
+        task.file_path = file_path
+        task.filename = os.path.basename(file_path)
+        _record_download_metrics(downloader, song_info['source'], task.segments)
+        # Hashed here so the library index never reads the file on the GUI thread
+        task.file_hash = file_sha1(file_path)
+
+        log_info(f'{name} 下载完成: {file_path}')
+        _emit_download_event(song_info, downloader, task.segments, 'ok')
+        return True, f"Finished downloading {song_info['song_name']}", file_path
+    except DownloadError as e:
+        keep_partial = _discard_empty_part(download_music_file_path)
+        log_error(f'{name} 下载失败: {str(e)}')
+        _emit_download_event(song_info, downloader, task.segments, 'cancelled' if isinstance(e, DownloadCancelled) else 'error', error=str(e))
+        return False, str(e), ""
+    except Exception as e:
+        keep_partial = _discard_empty_part(download_music_file_path)
+        log_exception(f'{name} 执行出错: {str(e)}')
+        _emit_download_event(song_info, downloader, task.segments, 'error', error=str(e))
+        return False, f"Download error: {str(e)}", ""
+    finally:
+        if download_music_file_path:
+            _filename_allocator.release(download_music_file_path, song_key(song_info), keep_partial)
+
+
+def discard_partial_download(task):
+    """
+    Delete the partial download a failed task left for resuming, e.g. when the song fails over to
+    another source, and give its name back so the next download of the song does not get a " (n)" suffix
+
+    Args:
+        task (DownloadTask): The failed task
+    """
+    if task.file_path:
+        remove_part_files(task.file_path)
+        _filename_allocator.forget(task.file_path, song_key(task.song_info))
+
+
+class CircuitBreaker:
+    """
+    Per-source circuit breaker: after several consecutive failures a source is skipped
+    for a cooldown period, then a single trial download decides whether it is closed again
+    """
+    def __init__(self, failure_threshold=3, cooldown=60):
+        """
+        Initialize circuit breaker
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the breaker of a source
+            cooldown (float): Seconds an open breaker rejects downloads from its source
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = {}  # source -> consecutive failures
+        self.opened_at = {}  # source -> time the breaker opened or the last trial started
+        self.lock = threading.Lock()  # Shared by the download threads of the command line
+
+    def is_open(self, source):
+        """
+        Args:
+            source (str): Music source name
+
+        Returns:
+            bool: True if downloads from this source are currently rejected
+        """
+        opened_at = self.opened_at.get(source)
+        return opened_at is not None and time.time() - opened_at < self.cooldown
+
+    def retry_after(self, source):
+        """
+        Args:
+            source (str): Music source name
+
+        Returns:
+            float: Seconds until the source accepts a trial download, 0 if it is not open
+        """
+        if not self.is_open(source):
+            return 0
+        return self.opened_at[source] + self.cooldown - time.time()
+
+    def acquire(self, source):
+        """
+        Ask to start a download from a source
+
+        Args:
+            source (str): Music source name
+
+        Returns:
+            bool: True if the download may start
+        """
+        with self.lock:
+            if self.is_open(source):
+                return False
+            if source in self.opened_at:
+                # Half-open: let this single trial through and keep rejecting the others until it reports
+                self.opened_at[source] = time.time()
+            return True
+
+    def record(self, source, success):
+        """
+        Report the outcome of a download
+
+        Args:
+            source (str): Music source name
+            success (bool): Whether the download succeeded
+        """
+        with self.lock:
+            if success:
+                if self.opened_at.pop(source, None) is not None:
+                    log_info(f'下载熔断恢复 - {source}')
+                self.failures.pop(source, None)
+                return
+            self.failures[source] = self.failures.get(source, 0) + 1
+            if self.failures[source] >= self.failure_threshold:
+                newly_opened = source not in self.opened_at
+                self.opened_at[source] = time.time()
+                if newly_opened:
+                    log_warning(f'下载熔断 - {source} 连续失败 {self.failures[source]} 次, {self.cooldown} 秒内暂停从该音乐源下载')
+
+
+def failover_delay(attempt):
+    """
+    Args:
+        attempt (int): Number of the attempt about to start, the first one is 1
+
+    Returns:
+        float: Seconds to wait before that attempt
+    """
+    return 0 if attempt <= 1 else FAILOVER_BACKOFF * 2 ** (attempt - 2)
+
+
+def next_failover_candidate(candidates, tried_songs, breaker):
+    """
+    Pick the best equivalent result that has not been tried yet and whose source is not open
+
+    Args:
+        candidates (list): Equivalent song infos from different sources, best first
+        tried_songs (list): Song infos already tried for this song
+        breaker (CircuitBreaker): Breakers of the music sources
+
+    Returns:
+        dict: Song info to try next, None if there is none
+    """
+    for song_info in candidates:
+        if all(song_info is not tried for tried in tried_songs) and not breaker.is_open(song_info['source']):
+            return song_info
+    return None
+
+
+def download_with_failover(candidates, download_candidate, breaker, max_attempts=3, sleep=time.sleep):
+    """
+    Download one song, blocking, moving on to the next candidate source with a growing backoff when
+    a download fails, the blocking counterpart of the failover of the DownloadManager
+
+    Args:
+        candidates (list): Equivalent song infos from different sources, best first
+        download_candidate (callable): Called as download_candidate(song_info) -> (task, success, message, file_path)
+        breaker (CircuitBreaker): Breakers of the music sources, shared by all songs
+        max_attempts (int): Maximum number of sources tried, 1 disables failover
+        sleep (callable): Waits the given number of seconds
+
+    Returns:
+        tuple: (task, success, message, file_path) of the last attempt, task is None if no source accepted a download
+    """
+    # Every source of the song may be open, the first attempt waits for the earliest trial download
+    delays = [breaker.retry_after(song_info['source']) for song_info in candidates]
+    if delays and all(delays):
+        sleep(min(delays))
+    tried_songs, outcome = [], (None, False, 'Every source of the song is paused after repeated failures', '')
+    while len(tried_songs) < max_attempts:
+        song_info = next_failover_candidate(candidates, tried_songs, breaker)
+        if song_info is None or not breaker.acquire(song_info['source']):
+            break
+        tried_songs.append(song_info)
+        outcome = download_candidate(song_info)
+        task, success = outcome[:2]
+        breaker.record(song_info['source'], success)
+        if success:
+            break
+        # The failed source is abandoned for this song, drop its partial file so the next one keeps the name
+        # and a song that fails for good leaves nothing behind
+        if task is not None:
+            discard_partial_download(task)
+        alternate = next_failover_candidate(candidates, tried_songs, breaker)
+        if len(tried_songs) < max_attempts and alternate is not None:
+            delay = failover_delay(len(tried_songs) + 1)
+            log_warning(f'下载失败, {delay:.0f} 秒后切换音乐源重试 - {song_info["song_name"]}: {song_info["source"]} -> {alternate["source"]} (第 {len(tried_songs) + 1} 次尝试)')
+            sleep(delay)
+    return outcome
+
+
+def _record_download_metrics(downloader, source, segments):
+    """Record time-to-first-byte and throughput of a finished download"""
+    elapsed = time.monotonic() - downloader.started_at
+    received = os.path.getsize(downloader.file_path) - downloader.resumed_bytes
+    if downloader.first_byte_at is not None:
+        metrics.record('download.ttfb', (downloader.first_byte_at - downloader.started_at) * 1000, source=source, segments=segments)
+    if elapsed > 0 and received > 0:
+        metrics.record('download.throughput', received / elapsed / 1024, unit='KB/s', source=source, segments=segments)
+
+
+def _emit_download_event(song_info, downloader, segments, status, **fields):
+    """Append a download event, host is the server that actually served the file"""
+    url = song_info.get('download_url', '')
+    if downloader is not None:
+        url = downloader.final_url
+        if downloader.started_at is not None:
+            fields['latency_ms'] = round((time.monotonic() - downloader.started_at) * 1000, 1)
+        if downloader.first_byte_at is not None:
+            fields['ttfb_ms'] = round((downloader.first_byte_at - downloader.started_at) * 1000, 1)
+        if status == 'ok':
+            fields['bytes'] = os.path.getsize(downloader.file_path) - downloader.resumed_bytes
+    event_log.emit('download', source=song_info['source'], host=urlsplit(url).hostname or '', segments=segments, status=status, **fields)
+
+
+def _allocate_file_path(task, song_key):
+    """
+    Pick the target path for a task, reusing a matching unfinished .part file if there is one
+    The name is reserved right away so parallel downloads skip it
+    """
+    sanitized_path = sanitize_filepath(os.path.join(task.download_dir, task.filename))
+    directory, filename = os.path.split(sanitized_path)
+    download_music_file_path = _filename_allocator.allocate(directory, filename, song_key)
+    task.filename = os.path.basename(download_music_file_path)
+    return download_music_file_path
+
+
+def _discard_empty_part(file_path):
+    """
+    Remove the .part sidecar if nothing was written into it, otherwise keep it for resuming
+
+    Returns:
+        bool: True if a non-empty .part file was kept
+    """
+    try:
+        if file_path and os.path.getsize(part_file_path(file_path)) == 0:
+            remove_part_files(file_path)
+            return False
+        return bool(file_path)
+    except OSError:
+        return False
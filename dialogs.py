@@ -7,13 +7,16 @@ WeChat Official Account (微信公众号):
     Charles的皮卡丘
 '''
 import os
+import json
 import subprocess
 import sys
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QGroupBox, 
                              QLabel, QLineEdit, QPushButton, QRadioButton, 
                              QButtonGroup, QTextEdit, QTabWidget, QWidget, 
-                             QFileDialog, QMessageBox)
+                             QFileDialog, QMessageBox, QSpinBox, QGridLayout, QCheckBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+from metrics import metrics
 from logger import get_log_directory, get_log_file_path
 
 
@@ -21,6 +24,15 @@ class SettingsDialog(QDialog):
     """
     Settings dialog for configuring application preferences
     """
+    PLATFORMS = [
+        ('QQMusicClient', 'QQ音乐'),
+        ('NeteaseMusicClient', '网易云'),
+        ('KuwoMusicClient', '酷我'),
+        ('MiguMusicClient', '咪咕'),
+        ('KugouMusicClient', '酷狗'),
+        ('QianqianMusicClient', '千千'),
+    ]
+
     def __init__(self, parent=None, current_settings=None):
         """
         Initialize settings dialog
@@ -42,23 +54,56 @@ class SettingsDialog(QDialog):
         main_layout.setContentsMargins(20, 20, 20, 20)
         main_layout.setSpacing(15)
         
-        # Appearance section
-        self._init_appearance_section(main_layout)
+        # Sections are spread over pages so the dialog, buttons included, fits on a 1080p screen
+        self.settings_tabs = QTabWidget()
+        
+        # General page: appearance, download directory and search
+        general_layout = self._add_page('General - 常规')
+        self._init_appearance_section(general_layout)
+        self._init_directory_section(general_layout)
+        self._init_search_section(general_layout)
+        general_layout.addStretch()
         
-        # Download directory section
-        self._init_directory_section(main_layout)
+        # Download page: concurrency, failover and bandwidth
+        download_layout = self._add_page('Download - 下载')
+        self._init_download_section(download_layout)
+        download_layout.addStretch()
         
-        # Log section
-        self._init_log_section(main_layout)
+        # Diagnostics page: log files and timing metrics
+        diagnostics_layout = self._add_page('Diagnostics - 诊断')
+        self._init_log_section(diagnostics_layout)
+        self._init_diagnostics_section(diagnostics_layout)
+        diagnostics_layout.addStretch()
         
-        # Cookies configuration section
-        self._init_cookies_section(main_layout)
+        # Cookies page
+        cookies_layout = self._add_page('Cookies')
+        self._init_cookies_section(cookies_layout)
+        
+        main_layout.addWidget(self.settings_tabs)
         
         # Buttons
         self._init_buttons(main_layout)
         
         self.setLayout(main_layout)
     
+    def _add_page(self, title):
+        """
+        Add a page to the settings tabs
+        
+        Args:
+            title (str): Tab title
+            
+        Returns:
+            QVBoxLayout: Layout the sections of the page are added to
+        """
+        page = QWidget()
+        page_layout = QVBoxLayout()
+        page_layout.setContentsMargins(10, 15, 10, 10)
+        page_layout.setSpacing(15)
+        page.setLayout(page_layout)
+        self.settings_tabs.addTab(page, title)
+        return page_layout
+    
     def _init_appearance_section(self, main_layout):
         """Initialize appearance settings section"""
         appearance_group = QGroupBox('Appearance - 外观设置')
@@ -130,6 +175,119 @@ class SettingsDialog(QDialog):
         dir_group.setLayout(dir_layout)
         main_layout.addWidget(dir_group)
     
+    def _init_download_section(self, main_layout):
+        """Initialize download concurrency settings section"""
+        download_group = QGroupBox('Download - 下载设置')
+        download_layout = QGridLayout()
+        download_layout.setContentsMargins(15, 20, 15, 15)
+        download_layout.setHorizontalSpacing(15)
+        
+        self.max_concurrent_spin = QSpinBox()
+        self.max_concurrent_spin.setRange(1, 16)
+        self.max_concurrent_spin.setValue(self.current_settings.get('max_concurrent_downloads', 3))
+        download_layout.addWidget(QLabel('Max Concurrent Downloads - 同时下载数:'), 0, 0)
+        download_layout.addWidget(self.max_concurrent_spin, 0, 1)
+        
+        self.per_source_concurrent_spin = QSpinBox()
+        self.per_source_concurrent_spin.setRange(1, 16)
+        self.per_source_concurrent_spin.setValue(self.current_settings.get('per_source_concurrent_downloads', 2))
+        download_layout.addWidget(QLabel('Per Source Limit - 单个音乐源同时下载数:'), 1, 0)
+        download_layout.addWidget(self.per_source_concurrent_spin, 1, 1)
+        
+        # Segmented download for large files, enabled per source
+        self.download_segments_spin = QSpinBox()
+        self.download_segments_spin.setRange(2, 16)
+        self.download_segments_spin.setValue(self.current_settings.get('download_segments', 4))
+        download_layout.addWidget(QLabel('Segments Per File - 大文件分段数:'), 2, 0)
+        download_layout.addWidget(self.download_segments_spin, 2, 1)
+        
+        segmented_layout = QHBoxLayout()
+        segmented_sources = self.current_settings.get('segmented_download_sources', [])
+        self.segmented_source_checks = {}
+        for platform_key, platform_name in self.PLATFORMS:
+            cb = QCheckBox(platform_name)
+            cb.setChecked(platform_key in segmented_sources)
+            self.segmented_source_checks[platform_key] = cb
+            segmented_layout.addWidget(cb)
+        segmented_layout.addStretch()
+        download_layout.addWidget(QLabel('Segmented Download - 启用分段下载的音乐源:'), 3, 0)
+        download_layout.addLayout(segmented_layout, 3, 1, 1, 2)
+        
+        # Retry failed songs against the same song found on other sources
+        self.download_failover_check = QCheckBox('Auto failover - 下载失败时自动切换到其他音乐源的相同歌曲')
+        self.download_failover_check.setChecked(self.current_settings.get('download_failover', True))
+        download_layout.addWidget(self.download_failover_check, 4, 0, 1, 2)
+        
+        self.failover_attempts_spin = QSpinBox()
+        self.failover_attempts_spin.setRange(2, 10)
+        self.failover_attempts_spin.setValue(self.current_settings.get('failover_max_attempts', 3))
+        download_layout.addWidget(QLabel('Max Sources Per Song - 每首歌最多尝试的音乐源数:'), 5, 0)
+        download_layout.addWidget(self.failover_attempts_spin, 5, 1)
+        
+        self.skip_downloaded_check = QCheckBox('Skip downloaded songs - 跳过音乐库中已下载的歌曲')
+        self.skip_downloaded_check.setChecked(self.current_settings.get('skip_downloaded', True))
+        download_layout.addWidget(self.skip_downloaded_check, 6, 0, 1, 2)
+        
+        # Bandwidth limits shared by all downloads, 0 means unlimited
+        self.bandwidth_limit_spin = QSpinBox()
+        self.bandwidth_limit_spin.setRange(0, 1024 * 1024)
+        self.bandwidth_limit_spin.setSingleStep(256)
+        self.bandwidth_limit_spin.setSuffix(' KB/s')
+        self.bandwidth_limit_spin.setValue(self.current_settings.get('bandwidth_limit', 0))
+        download_layout.addWidget(QLabel('Bandwidth Limit - 总下载限速 (0 为不限):'), 7, 0)
+        download_layout.addWidget(self.bandwidth_limit_spin, 7, 1)
+        
+        self.source_bandwidth_limit_spin = QSpinBox()
+        self.source_bandwidth_limit_spin.setRange(0, 1024 * 1024)
+        self.source_bandwidth_limit_spin.setSingleStep(256)
+        self.source_bandwidth_limit_spin.setSuffix(' KB/s')
+        self.source_bandwidth_limit_spin.setValue(self.current_settings.get('source_bandwidth_limit', 0))
+        download_layout.addWidget(QLabel('Per Source Bandwidth - 单个音乐源限速 (0 为不限):'), 8, 0)
+        download_layout.addWidget(self.source_bandwidth_limit_spin, 8, 1)
+        
+        self.host_connection_limit_spin = QSpinBox()
+        self.host_connection_limit_spin.setRange(0, 64)
+        self.host_connection_limit_spin.setValue(self.current_settings.get('host_connection_limit', 0))
+        download_layout.addWidget(QLabel('Connections Per Host - 单个服务器连接数 (0 为不限):'), 9, 0)
+        download_layout.addWidget(self.host_connection_limit_spin, 9, 1)
+        download_layout.setColumnStretch(2, 1)
+        
+        download_group.setLayout(download_layout)
+        main_layout.addWidget(download_group)
+    
+    def _init_search_section(self, main_layout):
+        """Initialize search cache settings section"""
+        search_group = QGroupBox('Search - 搜索设置')
+        search_layout = QGridLayout()
+        search_layout.setContentsMargins(15, 20, 15, 15)
+        search_layout.setHorizontalSpacing(15)
+        
+        self.search_cache_ttl_spin = QSpinBox()
+        self.search_cache_ttl_spin.setRange(0, 24 * 60)
+        self.search_cache_ttl_spin.setSuffix(' min')
+        self.search_cache_ttl_spin.setValue(self.current_settings.get('search_cache_ttl', 10))
+        search_layout.addWidget(QLabel('Search Cache TTL - 搜索缓存有效期 (0 为关闭):'), 0, 0)
+        search_layout.addWidget(self.search_cache_ttl_spin, 0, 1)
+        
+        self.search_cache_persist_check = QCheckBox('Keep cache after restart - 重启后保留搜索缓存')
+        self.search_cache_persist_check.setChecked(self.current_settings.get('search_cache_persist', False))
+        search_layout.addWidget(self.search_cache_persist_check, 1, 0, 1, 2)
+        
+        self.search_deadline_spin = QSpinBox()
+        self.search_deadline_spin.setRange(3, 120)
+        self.search_deadline_spin.setSuffix(' s')
+        self.search_deadline_spin.setValue(self.current_settings.get('search_deadline', 15))
+        search_layout.addWidget(QLabel('Search Deadline - 搜索截止时间:'), 2, 0)
+        search_layout.addWidget(self.search_deadline_spin, 2, 1)
+        
+        self.merge_duplicates_check = QCheckBox('Merge duplicates across sources - 合并不同音乐源的重复结果')
+        self.merge_duplicates_check.setChecked(self.current_settings.get('merge_duplicates', True))
+        search_layout.addWidget(self.merge_duplicates_check, 3, 0, 1, 2)
+        search_layout.setColumnStretch(2, 1)
+        
+        search_group.setLayout(search_layout)
+        main_layout.addWidget(search_group)
+    
     def _init_log_section(self, main_layout):
         """Initialize log settings section"""
         log_group = QGroupBox('Log - 日志')
@@ -202,6 +360,67 @@ class SettingsDialog(QDialog):
         except Exception as e:
             QMessageBox.warning(self, 'Warning - 警告', f'无法打开日志文件: {str(e)}')
     
+    def _init_diagnostics_section(self, main_layout):
+        """Initialize timing metrics section"""
+        diagnostics_group = QGroupBox('Diagnostics - 性能诊断')
+        diagnostics_layout = QVBoxLayout()
+        diagnostics_layout.setContentsMargins(15, 20, 15, 15)
+        diagnostics_layout.setSpacing(10)
+        
+        self.metrics_table = QTableWidget(0, 7)
+        self.metrics_table.setHorizontalHeaderLabels(['Metric', 'Unit', 'Count', 'Mean', 'P50', 'P95', 'Max'])
+        self.metrics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.metrics_table.verticalHeader().setVisible(False)
+        self.metrics_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.metrics_table.setMaximumHeight(160)
+        diagnostics_layout.addWidget(self.metrics_table)
+        
+        btn_layout = QHBoxLayout()
+        btn_layout.setSpacing(10)
+        
+        refresh_metrics_btn = QPushButton('Refresh - 刷新')
+        refresh_metrics_btn.setCursor(Qt.PointingHandCursor)
+        refresh_metrics_btn.clicked.connect(self.refresh_metrics)
+        btn_layout.addWidget(refresh_metrics_btn)
+        
+        export_metrics_btn = QPushButton('Export JSON - 导出')
+        export_metrics_btn.setCursor(Qt.PointingHandCursor)
+        export_metrics_btn.clicked.connect(self.export_metrics)
+        btn_layout.addWidget(export_metrics_btn)
+        
+        btn_layout.addStretch()
+        diagnostics_layout.addLayout(btn_layout)
+        
+        diagnostics_group.setLayout(diagnostics_layout)
+        main_layout.addWidget(diagnostics_group)
+        self.refresh_metrics()
+    
+    def refresh_metrics(self):
+        """Show the summary of the timing metrics recorded in this session"""
+        rows = metrics.summary()
+        self.metrics_table.setRowCount(len(rows))
+        for row, summary in enumerate(rows):
+            values = [summary['name'], summary['unit'], str(summary['count'])]
+            values += [f'{summary[key]:.1f}' for key in ('mean', 'p50', 'p95', 'max')]
+            for column, value in enumerate(values):
+                self.metrics_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def export_metrics(self):
+        """Export the recorded timing metrics to a JSON file"""
+        file_path, _ = QFileDialog.getSaveFileName(self, 'Export Metrics - 导出性能数据', 'musicdlgui_metrics.json', 'JSON (*.json)')
+        if not file_path:
+            return
+        version = None
+        try:
+            with open(os.path.join(os.path.dirname(__file__), 'version.json'), 'r', encoding='utf-8') as f:
+                version = json.load(f).get('version')
+        except (OSError, ValueError):
+            pass
+        try:
+            metrics.export(file_path, version=version)
+        except OSError as e:
+            QMessageBox.warning(self, 'Warning - 警告', f'导出性能数据失败: {str(e)}')
+    
     def _init_cookies_section(self, main_layout):
         """Initialize cookies configuration section"""
         cookies_group = QGroupBox('Cookies Configuration - Cookies配置 (用于VIP音质)')
@@ -213,16 +432,7 @@ class SettingsDialog(QDialog):
         
         # Music platform cookies
         self.platform_cookies = {}
-        platforms = [
-            ('QQMusicClient', 'QQ音乐'),
-            ('NeteaseMusicClient', '网易云'),
-            ('KuwoMusicClient', '酷我'),
-            ('MiguMusicClient', '咪咕'),
-            ('KugouMusicClient', '酷狗'),
-            ('QianqianMusicClient', '千千'),
-        ]
-        
-        for platform_key, platform_name in platforms:
+        for platform_key, platform_name in self.PLATFORMS:
             tab = self._create_platform_tab(platform_key, platform_name)
             self.cookies_tabs.addTab(tab, platform_name)
         
@@ -335,13 +545,29 @@ class SettingsDialog(QDialog):
         else:
             dir_structure = 'date'
         
-        self.settings_result = {
+        # Keep settings that are not edited in this dialog
+        self.settings_result = dict(self.current_settings)
+        self.settings_result.update({
             'work_dir': self.dir_edit.text(),
             'dir_structure': dir_structure,
             'is_dark': self.dark_theme_radio.isChecked(),
+            'max_concurrent_downloads': self.max_concurrent_spin.value(),
+            'per_source_concurrent_downloads': self.per_source_concurrent_spin.value(),
+            'download_segments': self.download_segments_spin.value(),
+            'segmented_download_sources': [key for key, cb in self.segmented_source_checks.items() if cb.isChecked()],
+            'download_failover': self.download_failover_check.isChecked(),
+            'failover_max_attempts': self.failover_attempts_spin.value(),
+            'skip_downloaded': self.skip_downloaded_check.isChecked(),
+            'bandwidth_limit': self.bandwidth_limit_spin.value(),
+            'source_bandwidth_limit': self.source_bandwidth_limit_spin.value(),
+            'host_connection_limit': self.host_connection_limit_spin.value(),
+            'search_cache_ttl': self.search_cache_ttl_spin.value(),
+            'search_cache_persist': self.search_cache_persist_check.isChecked(),
+            'search_deadline': self.search_deadline_spin.value(),
+            'merge_duplicates': self.merge_duplicates_check.isChecked(),
             'cookies': {},
             'quark_cookies': self.quark_cookie_edit.toPlainText().strip()
-        }
+        })
         
         for platform_key, edits in self.platform_cookies.items():
             search_cookie = edits['search'].toPlainText().strip()
@@ -0,0 +1,201 @@
+'''
+Function:
+    Persistent Download Journal for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import json
+import time
+import threading
+from downloader import part_file_path
+from logger import log_info, log_warning
+
+
+class DownloadJournal:
+    """
+    Append-only JSONL log of every queued download and its state changes,
+    so that unfinished batches survive closing the app or a crash
+
+    Each line is one record:
+        {"op": "queued", "id": ..., "batch": ..., "song": {...}, "download_dir": ..., "filename": ..., "segments": ..., "allocated": ...}
+        {"op": "allocated", "id": ..., "filename": ...}
+        {"op": "status", "id": ..., "status": "running" | "done" | "failed" | "cancelled"}
+
+    The queued filename is only the wanted one, "allocated" records the name the
+    download actually writes to once a name collision has been resolved, a task
+    re-queued after its name was allocated, e.g. on resume, is queued as allocated
+    """
+    FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+    def __init__(self, path):
+        """
+        Initialize download journal
+
+        Args:
+            path (str): JSONL file holding the journal
+        """
+        self.path = path
+        self.entries = {}  # journal id -> latest queued record with its status
+        self._lock = threading.Lock()  # Download workers journal allocated names from their own threads
+        self._load()
+
+    def _load(self):
+        """Replay the journal file, a torn last line left by a crash is ignored"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError as e:
+            log_warning(f'读取下载日志失败: {str(e)}')
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('op') == 'queued':
+                self.entries[record['id']] = dict(record, status='queued')
+            elif record.get('op') == 'allocated' and record.get('id') in self.entries:
+                self.entries[record['id']].update(filename=record['filename'], allocated=True)
+            elif record.get('op') == 'status' and record.get('id') in self.entries:
+                self.entries[record['id']]['status'] = record['status']
+
+    def _append(self, records, sync):
+        """
+        Append records to the journal file
+
+        Args:
+            records (list): Records to write, one JSON line each
+            sync (bool): fsync the file so the records survive a crash or power loss
+        """
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            log_warning(f'写入下载日志失败: {str(e)}')
+
+    def record_queued(self, tasks):
+        """
+        Journal newly queued tasks, this is a checkpoint and is synced to disk
+
+        Args:
+            tasks (list): List of DownloadTask, those with a file_path already own that name
+        """
+        records = []
+        for task in tasks:
+            record = {
+                'op': 'queued', 'id': task.journal_id, 'batch': task.batch_id, 'time': time.time(),
+                'song': task.song_info, 'download_dir': task.download_dir,
+                'filename': task.filename, 'segments': task.segments,
+            }
+            if task.file_path:
+                record.update(filename=os.path.basename(task.file_path), allocated=True)
+            self.entries[task.journal_id] = dict(record, status='queued')
+            records.append(record)
+        self._append(records, sync=True)
+
+    def record_allocated(self, task, file_path):
+        """
+        Journal the file a task really writes to, synced to disk before the first byte is downloaded
+
+        Args:
+            task (DownloadTask): The task
+            file_path (str): Path picked by the download core, may differ from the queued filename
+        """
+        filename = os.path.basename(file_path)
+        if task.journal_id in self.entries:
+            self.entries[task.journal_id].update(filename=filename, allocated=True)
+        self._append([{'op': 'allocated', 'id': task.journal_id, 'filename': filename}], sync=True)
+
+    @staticmethod
+    def file_path(entry):
+        """
+        Returns:
+            str: Target path of a journal entry, the allocated one once the download has started
+        """
+        return os.path.join(entry['download_dir'], entry['filename'])
+
+    @staticmethod
+    def is_finished_on_disk(entry):
+        """
+        Check whether a song finished right before the app stopped and only its journal entry is missing
+
+        Args:
+            entry (dict): Journal entry
+
+        Returns:
+            bool: True when the allocated file exists without a partial download next to it,
+                  a file carrying the queued name before allocation may belong to another song
+        """
+        if not entry.get('allocated'):
+            return False
+        file_path = DownloadJournal.file_path(entry)
+        return os.path.exists(file_path) and not os.path.exists(part_file_path(file_path))
+
+    def record_status(self, task, status):
+        """
+        Journal a state change of a task
+
+        Args:
+            task (DownloadTask): The task
+            status (str): running, done, failed or cancelled
+        """
+        self.mark(task.journal_id, status)
+
+    def mark(self, journal_id, status):
+        """
+        Journal a state change of a song, finished states are checkpoints and are synced to disk
+
+        Args:
+            journal_id (str): Journal id of the song
+            status (str): running, done, failed or cancelled
+        """
+        if journal_id in self.entries:
+            self.entries[journal_id]['status'] = status
+        self._append([{'op': 'status', 'id': journal_id, 'status': status}], sync=status in self.FINISHED_STATUSES)
+
+    def unfinished(self):
+        """
+        Returns:
+            list: Queued records of the songs that were queued or running when the app stopped
+        """
+        return [entry for entry in self.entries.values() if entry['status'] not in self.FINISHED_STATUSES]
+
+    def discard_unfinished(self):
+        """Mark every unfinished song as cancelled, e.g. when the user declines to resume"""
+        records = []
+        for entry in self.unfinished():
+            entry['status'] = 'cancelled'
+            records.append({'op': 'status', 'id': entry['id'], 'status': 'cancelled'})
+        if records:
+            self._append(records, sync=True)
+        self.compact()
+
+    def compact(self):
+        """Rewrite the journal keeping only the unfinished songs, the file is removed when nothing is left"""
+        pending = self.unfinished()
+        self.entries = {entry['id']: entry for entry in pending}
+        tmp_path = self.path + '.tmp'
+        try:
+            if not pending:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in pending:
+                    record = {key: value for key, value in entry.items() if key != 'status'}
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            log_info(f'下载日志已压缩, 剩余 {len(pending)} 首未完成')
+        except OSError as e:
+            log_warning(f'压缩下载日志失败: {str(e)}')
@@ -0,0 +1,306 @@
+'''
+Function:
+    Concurrent Download Manager for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import time
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from workers import DownloadWorker
+from core import CircuitBreaker, discard_partial_download, failover_delay, next_failover_candidate
+from bandwidth import BandwidthLimiter
+from logger import log_info, log_debug, log_warning
+
+
+class DownloadManager(QObject):
+    """
+    Schedules download tasks onto a bounded pool of reusable DownloadWorker threads,
+    honouring a global and a per-source concurrency limit
+    """
+    task_started_sig = pyqtSignal(object)  # task
+    task_finished_sig = pyqtSignal(object, bool, str, str)  # task, success, msg, file_path
+    progress_sig = pyqtSignal(int, str)  # overall percentage, detailed_text
+    all_finished_sig = pyqtSignal(int, int)  # success_count, total_count
+    # Minimum interval between two batch progress updates sent to the GUI
+    PROGRESS_INTERVAL_MS = 100
+
+    def __init__(self, max_concurrent=3, per_source_limit=2, journal=None, client_provider=None, parent=None):
+        """
+        Initialize download manager
+
+        Args:
+            max_concurrent (int): Maximum number of songs downloaded at the same time
+            per_source_limit (int): Maximum number of simultaneous downloads from one source
+            journal (DownloadJournal): On-disk log of queued songs and their states, None keeps the plan in memory only
+            client_provider (callable): source -> (music_client, session), called on the worker threads for tasks queued without a client
+            parent: Parent QObject
+        """
+        super().__init__(parent)
+        self.journal = journal
+        self.client_provider = client_provider
+        self.batch_id = None
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.per_source_limit = max(1, int(per_source_limit))
+        self.workers = []
+        self.idle_workers = []
+        self.pending_tasks = []
+        self.running_tasks = {}  # task_id -> (task, worker)
+        self.batch_tasks = []
+        self.batch_success = 0
+        self.progress_pending = False
+        self.breaker = CircuitBreaker()
+        self.breaker_timer_pending = False
+        self.backoff_tasks = []  # Failover tasks waiting for their backoff delay
+        self.alternates_provider = None
+        self.task_factory = None
+        self.max_attempts = 1
+        self.bandwidth = BandwidthLimiter()
+
+    def set_failover(self, alternates_provider, task_factory, max_attempts=3):
+        """
+        Enable retrying failed songs against equivalent results from other sources
+
+        Args:
+            alternates_provider (callable): song_info -> list of equivalent song infos, best first
+            task_factory (callable): song_info -> DownloadTask
+            max_attempts (int): Maximum number of sources tried per song, 1 disables failover
+        """
+        self.alternates_provider = alternates_provider
+        self.task_factory = task_factory
+        self.max_attempts = max(1, int(max_attempts))
+
+    def set_limits(self, max_concurrent, per_source_limit):
+        """
+        Update concurrency limits, takes effect for the next dispatched task
+
+        Args:
+            max_concurrent (int): Maximum number of songs downloaded at the same time
+            per_source_limit (int): Maximum number of simultaneous downloads from one source
+        """
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.per_source_limit = max(1, int(per_source_limit))
+        self._dispatch()
+
+    def set_bandwidth(self, total_kbps, source_kbps, host_connections):
+        """
+        Update bandwidth limits, running downloads follow them immediately
+
+        Args:
+            total_kbps (int): KB/s shared by all downloads, 0 for unlimited
+            source_kbps (int): KB/s of each music source, 0 for unlimited
+            host_connections (int): Maximum concurrent connections to one CDN host, 0 for unlimited
+        """
+        self.bandwidth.configure(int(total_kbps) * 1024, int(source_kbps) * 1024, host_connections)
+
+    def is_busy(self):
+        """
+        Returns:
+            bool: True if any task is queued or running
+        """
+        return bool(self.pending_tasks or self.running_tasks or self.backoff_tasks)
+
+    def submit(self, tasks):
+        """
+        Queue tasks for download, they are appended to the current batch if one is running
+
+        Args:
+            tasks (list): List of DownloadTask
+        """
+        if not self.is_busy():
+            self.batch_tasks = []
+            self.batch_success = 0
+            self.batch_id = time.strftime('%Y%m%d-%H%M%S')
+        for task in tasks:
+            task.batch_id = self.batch_id
+        if self.journal is not None:
+            self.journal.record_queued(tasks)
+        self.batch_tasks.extend(tasks)
+        self.pending_tasks.extend(tasks)
+        log_info(f'下载管理器 - 加入 {len(tasks)} 个任务, 并发上限: {self.max_concurrent}, 单源上限: {self.per_source_limit}')
+        self._dispatch()
+
+    def shutdown(self, timeout_ms=3000):
+        """
+        Drop queued tasks, cancel running downloads and stop all worker threads
+
+        Args:
+            timeout_ms (int): Maximum time to wait for each worker thread
+        """
+        self.pending_tasks = []
+        self.backoff_tasks = []
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.wait(timeout_ms)
+        self.workers = []
+        self.idle_workers = []
+        self.running_tasks = {}
+
+    def _acquire_worker(self):
+        """Return an idle worker, spawning a new one while below the global limit"""
+        if self.idle_workers:
+            return self.idle_workers.pop()
+        if len(self.workers) < self.max_concurrent:
+            worker = DownloadWorker(len(self.workers), self.bandwidth, self.journal, self.client_provider)
+            worker.progress_sig.connect(self._on_task_progress)
+            worker.finished_sig.connect(self._on_task_finished)
+            worker.start()
+            self.workers.append(worker)
+            log_debug('下载管理器 - 创建工作线程 DownloadWorker-%s', worker.worker_id)
+            return worker
+        return None
+
+    def _dispatch(self):
+        """Start as many pending tasks as the concurrency limits allow"""
+        while self.pending_tasks and len(self.running_tasks) < self.max_concurrent:
+            active_per_source = {}
+            for task, _ in self.running_tasks.values():
+                active_per_source[task.source] = active_per_source.get(task.source, 0) + 1
+            next_task = None
+            for task in self.pending_tasks:
+                if active_per_source.get(task.source, 0) < self.per_source_limit and self.breaker.acquire(task.source):
+                    next_task = task
+                    break
+            if next_task is None:
+                self._wait_for_breakers()
+                return
+            worker = self._acquire_worker()
+            if worker is None:
+                return
+            self.pending_tasks.remove(next_task)
+            next_task.status = 'running'
+            next_task.started_at = time.time()
+            if self.journal is not None:
+                self.journal.record_status(next_task, 'running')
+            self.running_tasks[next_task.task_id] = (next_task, worker)
+            self.task_started_sig.emit(next_task)
+            worker.submit(next_task)
+
+    def _wait_for_breakers(self):
+        """Retry dispatching once the earliest open breaker of a pending task lets a trial through"""
+        if self.running_tasks or self.breaker_timer_pending:
+            return
+        delays = [self.breaker.retry_after(task.source) for task in self.pending_tasks]
+        delays = [delay for delay in delays if delay > 0]
+        if not delays:
+            return
+        self.breaker_timer_pending = True
+        QTimer.singleShot(int(min(delays) * 1000) + 50, self._on_breaker_timer)
+
+    def _on_breaker_timer(self):
+        self.breaker_timer_pending = False
+        self._dispatch()
+
+    def _failover(self, task):
+        """
+        Replace a failed task with a download of the best untried equivalent result from another source
+
+        Args:
+            task (DownloadTask): The failed task
+
+        Returns:
+            bool: True if a failover task was scheduled
+        """
+        if self.alternates_provider is None or task.attempt >= self.max_attempts:
+            return False
+        alternate = next_failover_candidate(self.alternates_provider(task.song_info), task.tried_songs, self.breaker)
+        if alternate is None:
+            return False
+        try:
+            new_task = self.task_factory(alternate)
+        except Exception as e:
+            log_warning(f'下载失败后切换音乐源出错 - {task.song_info["song_name"]}: {str(e)}')
+            return False
+        new_task.attempt = task.attempt + 1
+        new_task.tried_songs = task.tried_songs + [alternate]
+        new_task.journal_id = task.journal_id
+        new_task.batch_id = task.batch_id
+        if self.journal is not None:
+            self.journal.record_queued([new_task])
+        # The failed source is abandoned for this song, drop its partial file so the new one keeps the name
+        discard_partial_download(task)
+        self.batch_tasks[self.batch_tasks.index(task)] = new_task
+        self.backoff_tasks.append(new_task)
+        delay_ms = int(failover_delay(new_task.attempt) * 1000)
+        log_warning(f'下载失败, {delay_ms / 1000:.0f} 秒后切换音乐源重试 - {task.song_info["song_name"]}: {task.source} -> {new_task.source} (第 {new_task.attempt} 次尝试)')
+        QTimer.singleShot(delay_ms, lambda: self._on_backoff_elapsed(new_task))
+        return True
+
+    def _on_backoff_elapsed(self, task):
+        """Queue a failover task once its backoff delay is over"""
+        if task not in self.backoff_tasks:
+            return
+        self.backoff_tasks.remove(task)
+        self.pending_tasks.append(task)
+        self._dispatch()
+
+    def _on_task_progress(self, task_id, downloaded_bytes, total_bytes):
+        """Record per-task progress and emit the aggregated batch progress"""
+        entry = self.running_tasks.get(task_id)
+        if entry is None:
+            return
+        task = entry[0]
+        task.downloaded_bytes = downloaded_bytes
+        task.total_bytes = total_bytes
+        # Coalesce updates of concurrent tasks into one repaint per interval
+        if not self.progress_pending:
+            self.progress_pending = True
+            QTimer.singleShot(self.PROGRESS_INTERVAL_MS, self._flush_progress)
+
+    def _flush_progress(self):
+        """Emit the coalesced batch progress"""
+        self.progress_pending = False
+        self._emit_progress()
+
+    def _emit_progress(self):
+        """Aggregate progress of the whole batch into a single percentage"""
+        total = len(self.batch_tasks)
+        if not total or not self.is_busy():
+            return
+        finished = sum(1 for task in self.batch_tasks if task.status in ('done', 'failed'))
+        fraction = float(finished)
+        downloaded_bytes = 0
+        for task, _ in self.running_tasks.values():
+            downloaded_bytes += task.downloaded_bytes
+            if task.total_bytes > 0:
+                fraction += min(task.downloaded_bytes / task.total_bytes, 1.0)
+        percent = int(fraction / total * 100)
+        if total == 1 and self.running_tasks:
+            task = next(iter(self.running_tasks.values()))[0]
+            if task.total_bytes > 0:
+                detail = f"{task.downloaded_bytes/1024/1024:.1f}MB / {task.total_bytes/1024/1024:.1f}MB"
+            else:
+                detail = f"{task.downloaded_bytes/1024/1024:.1f}MB / Unknown"
+        else:
+            detail = f"{finished}/{total} songs, {len(self.running_tasks)} active, {downloaded_bytes/1024/1024:.1f}MB"
+        self.progress_sig.emit(percent, detail)
+
+    def _on_task_finished(self, task_id, success, msg, file_path):
+        """Release the worker, report the task and dispatch the next ones"""
+        entry = self.running_tasks.pop(task_id, None)
+        if entry is None:
+            return
+        task, worker = entry
+        self.idle_workers.append(worker)
+        self.breaker.record(task.source, success)
+        if not success and self._failover(task):
+            task.status = 'failed'
+            self._dispatch()
+            return
+        task.status = 'done' if success else 'failed'
+        if success:
+            self.batch_success += 1
+        else:
+            # Failed for good, nothing will resume the partial download
+            discard_partial_download(task)
+        if self.journal is not None:
+            self.journal.record_status(task, task.status)
+        self.task_finished_sig.emit(task, success, msg, file_path)
+        self._dispatch()
+        self._emit_progress()
+        if not self.is_busy():
+            if self.journal is not None:
+                self.journal.compact()
+            self.all_finished_sig.emit(self.batch_success, len(self.batch_tasks))
@@ -0,0 +1,817 @@
+'''
+Function:
+    Resumable HTTP File Downloader for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import json
+import time
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from logger import log_info, log_warning, log_debug
+
+
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed"""
+
+
+class DownloadCancelled(DownloadError):
+    """Raised when a download is aborted by the caller"""
+
+
+class IncompleteDownload(DownloadError):
+    """Raised when the connection ends before the whole body was received"""
+
+
+class RangeNotSupported(DownloadError):
+    """Raised when the server does not honour byte range requests"""
+
+
+def part_file_path(file_path):
+    """
+    Get the path of the partial file written while downloading
+
+    Args:
+        file_path (str): Final path of the downloaded file
+
+    Returns:
+        str: Path of the .part sidecar
+    """
+    return file_path + PART_SUFFIX
+
+
+def load_part_state(file_path):
+    """
+    Load the resume state record of a partial download
+
+    Args:
+        file_path (str): Final path of the downloaded file
+
+    Returns:
+        dict: State record, or None if missing or unreadable
+    """
+    try:
+        with open(file_path + STATE_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_part_state(file_path, state):
+    """
+    Persist the resume state record of a partial download
+
+    Args:
+        file_path (str): Final path of the downloaded file
+        state (dict): State record (url, etag, last_modified, bytes_written, total_size, encoded, song_key)
+    """
+    tmp_path = file_path + STATE_SUFFIX + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, file_path + STATE_SUFFIX)
+
+
+def remove_orphan_parts(directory, older_than):
+    """
+    Remove leftovers of downloads that can never be resumed: .part files without a state
+    record, state records without a .part file and torn state writes
+
+    Args:
+        directory (str): Root directory of the downloaded songs, searched recursively
+        older_than (float): Only files last modified before this timestamp are removed,
+            so the reservations of downloads started by the current session are kept
+
+    Returns:
+        int: Number of removed files
+    """
+    removed, stack = 0, [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                items = list(it)
+        except OSError:
+            continue
+        names = {item.name for item in items}
+        for item in items:
+            try:
+                if item.is_dir(follow_symlinks=False):
+                    stack.append(item.path)
+                    continue
+                if item.name.endswith(STATE_SUFFIX):
+                    orphan = item.name[:-len(STATE_SUFFIX)] + PART_SUFFIX not in names
+                elif item.name.endswith(PART_SUFFIX):
+                    orphan = item.name[:-len(PART_SUFFIX)] + STATE_SUFFIX not in names
+                else:
+                    orphan = item.name.endswith(STATE_SUFFIX + '.tmp')
+                if orphan and item.stat().st_mtime < older_than:
+                    os.remove(item.path)
+                    removed += 1
+            except OSError:
+                continue
+    if removed:
+        log_info(f'已清理 {removed} 个无法续传的临时下载文件 - {directory}')
+    return removed
+
+
+def remove_part_files(file_path):
+    """
+    Remove the .part sidecar and its state record
+
+    Args:
+        file_path (str): Final path of the downloaded file
+    """
+    for path in (file_path + PART_SUFFIX, file_path + STATE_SUFFIX):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class FilenameAllocator:
+    """
+    Picks unique target filenames without probing the disk for every candidate
+
+    The names of each target directory are listed once with os.scandir and then kept in
+    memory, the next free " (n)" suffix of every title is remembered, and a name is reserved
+    by creating its .part file with O_CREAT | O_EXCL so concurrent downloads never collide.
+    Other processes such as the command line may still create the final name later, so it is
+    checked again once reserved and FileDownloader never renames over an existing file
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}  # normcased directory -> {'names': set, 'partials': dict, 'next_suffix': dict}
+
+    def _view(self, directory):
+        """Get the in-memory view of a directory, listing it on first use, the caller holds the lock"""
+        key = os.path.normcase(os.path.abspath(directory))
+        view = self.views.get(key)
+        if view is not None:
+            return view
+        view = {'names': set(), 'partials': {}, 'next_suffix': {}}
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    view['names'].add(os.path.normcase(item.name))
+                    # Unfinished downloads are found again through the song key kept in their state record
+                    if item.name.endswith(STATE_SUFFIX):
+                        final_name = item.name[:-len(STATE_SUFFIX)]
+                        state = load_part_state(os.path.join(directory, final_name))
+                        if state and state.get('song_key'):
+                            view['partials'][state['song_key']] = final_name
+        except OSError:
+            pass
+        self.views[key] = view
+        return view
+
+    def allocate(self, directory, filename, song_key=''):
+        """
+        Reserve a target path, reusing the unfinished download of the same song if there is one
+
+        Args:
+            directory (str): Target directory
+            filename (str): Preferred filename, " (n)" is appended before the extension when it is taken
+            song_key (str): Stable identity of the song, matched against unfinished downloads
+
+        Returns:
+            str: Reserved final path, its .part file exists when this returns
+        """
+        with self.lock:
+            view = self._view(directory)
+            names = view['names']
+            final_name = view['partials'].pop(song_key, None) if song_key else None
+            if final_name is not None and os.path.exists(os.path.join(directory, final_name + PART_SUFFIX)):
+                return os.path.join(directory, final_name)
+            stem, ext = os.path.splitext(filename)
+            suffix = view['next_suffix'].get((stem, ext), 0)
+            while True:
+                candidate = filename if suffix == 0 else f'{stem} ({suffix}){ext}'
+                suffix += 1
+                if os.path.normcase(candidate) in names or os.path.normcase(candidate + PART_SUFFIX) in names:
+                    continue
+                part_path = os.path.join(directory, candidate + PART_SUFFIX)
+                try:
+                    os.close(os.open(part_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                except FileExistsError:
+                    # Created behind our back, remember it and move on
+                    names.add(os.path.normcase(candidate + PART_SUFFIX))
+                    continue
+                if os.path.exists(os.path.join(directory, candidate)):
+                    # The final name appeared after the directory was listed
+                    os.remove(part_path)
+                    names.add(os.path.normcase(candidate))
+                    continue
+                names.add(os.path.normcase(candidate))
+                names.add(os.path.normcase(candidate + PART_SUFFIX))
+                view['next_suffix'][(stem, ext)] = suffix
+                return os.path.join(directory, candidate)
+
+    def release(self, file_path, song_key='', keep_partial=False):
+        """
+        Release the reservation of a finished or failed download
+
+        Args:
+            file_path (str): Path returned by allocate
+            song_key (str): Stable identity of the song
+            keep_partial (bool): True if an unfinished .part file was left for resuming later
+        """
+        directory, final_name = os.path.split(file_path)
+        with self.lock:
+            view = self._view(directory)
+            if keep_partial:
+                if song_key:
+                    view['partials'][song_key] = final_name
+                return
+            self._free(view, file_path)
+
+    def forget(self, file_path, song_key=''):
+        """
+        Drop a partial download kept by release(keep_partial=True) once its files were deleted,
+        so the next download of the song gets the name back instead of a " (n)" suffix
+
+        Args:
+            file_path (str): Path returned by allocate
+            song_key (str): Stable identity of the song
+        """
+        directory, final_name = os.path.split(file_path)
+        with self.lock:
+            view = self._view(directory)
+            if song_key and view['partials'].get(song_key) == final_name:
+                del view['partials'][song_key]
+            self._free(view, file_path)
+
+    @staticmethod
+    def _free(view, file_path):
+        """Remove the names of a download that left no .part file behind, the caller holds the lock"""
+        final_name = os.path.basename(file_path)
+        view['names'].discard(os.path.normcase(final_name + PART_SUFFIX))
+        if not os.path.exists(file_path):
+            view['names'].discard(os.path.normcase(final_name))
+            # A name was freed, let the next allocation start from the lowest suffix again
+            view['next_suffix'].clear()
+
+
+@lru_cache(maxsize=None)
+def retryable_errors():
+    """
+    Network errors after which a download is resumed from the bytes already written,
+    requests is only imported here so that loading this module stays cheap at startup
+
+    Returns:
+        tuple: Exception classes
+    """
+    import requests
+    from urllib3.exceptions import ProtocolError, ReadTimeoutError
+    return (
+        requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+        ProtocolError, ReadTimeoutError, IncompleteDownload,
+    )
+
+
+class AdaptiveChunkSize:
+    """
+    Read size that grows while reads complete quickly and shrinks when they stall,
+    so each read takes roughly TARGET_INTERVAL seconds at the current throughput
+    """
+    MIN_CHUNK_SIZE = 16 * 1024
+    MAX_CHUNK_SIZE = 1024 * 1024
+    INITIAL_CHUNK_SIZE = 64 * 1024
+    TARGET_INTERVAL = 0.05
+
+    def __init__(self):
+        self.size = self.INITIAL_CHUNK_SIZE
+
+    def update(self, nbytes, requested, elapsed):
+        """
+        Adjust the read size after a read
+
+        Args:
+            nbytes (int): Number of bytes returned by the read
+            requested (int): Number of bytes asked for
+            elapsed (float): Seconds the read took
+        """
+        if nbytes < requested:
+            # A short read happens at the end of the body and says nothing about throughput
+            return
+        if elapsed < self.TARGET_INTERVAL / 2:
+            self.size = min(self.size * 2, self.MAX_CHUNK_SIZE)
+        elif elapsed > self.TARGET_INTERVAL * 2:
+            self.size = max(self.size // 2, self.MIN_CHUNK_SIZE)
+
+
+class ProgressThrottle:
+    """
+    Rate-limits progress callbacks by elapsed time and by percent change,
+    the final update is always delivered
+    """
+    def __init__(self, callback, min_interval=0.1, min_percent_step=1):
+        """
+        Initialize progress throttle
+
+        Args:
+            callback (callable): Called as callback(downloaded_bytes, total_bytes)
+            min_interval (float): Minimum number of seconds between two updates
+            min_percent_step (int): Minimum percent change between two updates when the total size is known
+        """
+        self.callback = callback
+        self.min_interval = min_interval
+        self.min_percent_step = min_percent_step
+        self.last_time = 0.0
+        self.last_percent = -1
+        self.latest = None
+
+    def __call__(self, downloaded_bytes, total_bytes):
+        """Record the latest progress and forward it when the limits allow"""
+        self.latest = (downloaded_bytes, total_bytes)
+        if total_bytes > 0 and downloaded_bytes >= total_bytes:
+            self.flush()
+            return
+        now = time.monotonic()
+        if now - self.last_time < self.min_interval:
+            return
+        if total_bytes > 0:
+            percent = downloaded_bytes * 100 // total_bytes
+            if percent - self.last_percent < self.min_percent_step:
+                return
+            self.last_percent = percent
+        self.last_time = now
+        self.callback(downloaded_bytes, total_bytes)
+        self.latest = None
+
+    def flush(self):
+        """Deliver the latest progress if it has not been forwarded yet"""
+        if self.latest is not None:
+            latest, self.latest = self.latest, None
+            self.last_time = time.monotonic()
+            self.callback(*latest)
+
+
+class FileDownloader:
+    """
+    Downloads a URL into a .part sidecar and resumes it with HTTP Range requests
+    after a dropped connection or an application restart
+    """
+    # Persist bytes_written to the state record every STATE_SAVE_INTERVAL bytes
+    STATE_SAVE_INTERVAL = 1024 * 1024
+    # Files smaller than this are always fetched over a single connection
+    MIN_SEGMENTED_SIZE = 8 * 1024 * 1024
+    WRITE_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, url, headers, file_path, song_key='', progress_callback=None, is_cancelled=None, max_retries=3, timeout=60, segments=1, session=None, bandwidth=None, source=''):
+        """
+        Initialize file downloader
+
+        Args:
+            url (str): Download URL
+            headers (dict): Request headers
+            file_path (str): Final path of the downloaded file
+            song_key (str): Stable identity of the song, used to accept a .part left by a previous session
+            progress_callback (callable): Called as progress_callback(downloaded_bytes, total_bytes), at most every 100 ms
+            is_cancelled (callable): Returns True when the download should be aborted
+            max_retries (int): Number of resume attempts after a dropped connection
+            timeout (int): Request timeout in seconds
+            segments (int): Number of byte ranges fetched concurrently for large files, 1 disables segmenting
+            session (requests.Session): Shared keep-alive session, falls back to module-level requests
+            bandwidth (BandwidthLimiter): Shared rate limits and per-host connection caps, None downloads at full speed
+            source (str): Music source name, selects the per-source rate limit
+        """
+        self.url = url
+        # Range offsets and Content-Length refer to the encoded body, ask for the file as stored
+        self.headers = dict(headers or {})
+        self.headers['Accept-Encoding'] = 'identity'
+        self.file_path = file_path
+        self.part_path = part_file_path(file_path)
+        self.song_key = song_key
+        self.progress_callback = ProgressThrottle(progress_callback) if progress_callback is not None else None
+        self.is_cancelled = is_cancelled
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.segments = max(1, int(segments))
+        if session is None:
+            import requests
+            session = requests
+        self.http = session
+        self.bandwidth = bandwidth
+        self.source = source
+        self.state = None
+        self.state_lock = threading.Lock()
+        self.aborted = False
+        # Monotonic timestamps and the bytes found in a resumed .part, read by the caller for metrics
+        self.started_at = None
+        self.first_byte_at = None
+        self.resumed_bytes = 0
+        # URL that actually served the file after redirects, usually a CDN host
+        self.final_url = url
+
+    def run(self):
+        """
+        Download the file, resuming from an existing .part when possible
+
+        Returns:
+            str: Final path of the downloaded file
+
+        Raises:
+            DownloadError: If the download fails after all retries
+        """
+        self.state = self._init_state()
+        self.started_at = time.monotonic()
+        self.resumed_bytes = self.state['bytes_written']
+        segmented = self.segments > 1 and self._probe_segmented()
+        if not segmented and self.state.get('segments'):
+            # A preallocated segmented .part cannot be resumed over a single connection
+            self.state = self._new_state()
+        if segmented:
+            try:
+                self._fetch_segmented()
+                self._flush_progress()
+                return self._commit()
+            except RangeNotSupported as e:
+                log_warning(f'分段下载被服务器拒绝，改为单连接下载: {str(e)}')
+                self.aborted = False
+                self.state = self._new_state()
+        attempt = 0
+        while True:
+            try:
+                self._fetch()
+                break
+            except retryable_errors() as e:
+                self._save_state()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise DownloadError(f'Connection lost after {self.max_retries} retries: {str(e)}')
+                log_warning(f'下载中断，从 {self.state["bytes_written"]} 字节处续传 (第 {attempt} 次重试): {str(e)}')
+            except DownloadCancelled:
+                self._save_state()
+                raise
+        self._flush_progress()
+        return self._commit()
+
+    def _commit(self):
+        """
+        Move the finished .part file into place, the final path only ever holds complete files
+
+        Returns:
+            str: Path of the downloaded file, the final path or a free " (n)" variant of it
+                 if another program created the final path during the download
+
+        Raises:
+            DownloadError: If the .part file does not match the size announced by the server
+        """
+        size = os.path.getsize(self.part_path)
+        total_size = self.state['total_size']
+        # The announced length of a compressed body is not the length of the decoded file
+        if total_size and size != total_size and not self.state.get('encoded'):
+            if size > total_size:
+                remove_part_files(self.file_path)
+            raise DownloadError(f'Size mismatch: wrote {size} of {total_size} bytes')
+        with open(self.part_path, 'rb+') as fp:
+            os.fsync(fp.fileno())
+        committed_path = self._move_into_place()
+        # Persist the rename itself, only possible on POSIX where directories can be opened
+        if hasattr(os, 'O_DIRECTORY'):
+            try:
+                fd = os.open(os.path.dirname(os.path.abspath(self.file_path)), os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+        remove_part_files(self.file_path)
+        self.file_path = committed_path
+        return committed_path
+
+    def _move_into_place(self):
+        """
+        Rename the .part file to the final path without replacing a file created there in the meantime
+
+        Returns:
+            str: Path the file was moved to
+        """
+        stem, ext = os.path.splitext(self.file_path)
+        target, suffix = self.file_path, 0
+        while True:
+            try:
+                # A hard link fails instead of replacing an existing file
+                os.link(self.part_path, target)
+            except FileExistsError:
+                pass
+            except OSError:
+                # Hard links are not supported by every file system, e.g. FAT
+                if not os.path.exists(target):
+                    os.replace(self.part_path, target)
+                    break
+            else:
+                os.remove(self.part_path)
+                break
+            suffix += 1
+            target = f'{stem} ({suffix}){ext}'
+            while os.path.exists(target + PART_SUFFIX):
+                suffix += 1
+                target = f'{stem} ({suffix}){ext}'
+        if target != self.file_path:
+            log_warning(f'目标文件在下载期间已被其他程序创建，改存为: {target}')
+        return target
+
+    def _init_state(self):
+        """Reuse the state record of a matching .part file or start a new one"""
+        state = load_part_state(self.file_path)
+        if state and os.path.exists(self.part_path):
+            same_resource = state.get('url') == self.url or (
+                self.song_key and state.get('song_key') == self.song_key and (state.get('etag') or state.get('last_modified'))
+            )
+            if same_resource:
+                state['url'] = self.url
+                if state.get('segments'):
+                    state['bytes_written'] = sum(segment[2] for segment in state['segments'])
+                else:
+                    state['bytes_written'] = os.path.getsize(self.part_path)
+                log_info(f'发现未完成的下载，将从 {state["bytes_written"]} 字节处续传: {self.file_path}')
+                return state
+        return self._new_state()
+
+    def _new_state(self):
+        """Create an empty state record for a download starting from byte 0"""
+        return {
+            'url': self.url,
+            'song_key': self.song_key,
+            'etag': None,
+            'last_modified': None,
+            'bytes_written': 0,
+            'total_size': 0,
+            'encoded': False,
+        }
+
+    def _save_state(self):
+        """Persist the current state record, ignoring disk errors"""
+        try:
+            with self.state_lock:
+                save_part_state(self.file_path, self.state)
+        except OSError as e:
+            log_warning(f'保存续传状态失败: {str(e)}')
+
+    def _flush_progress(self):
+        """Make sure the final progress reaches the caller"""
+        if self.progress_callback is not None:
+            self.progress_callback.flush()
+
+    @contextmanager
+    def _get(self, headers):
+        """Issue a streamed GET while holding one of the connection slots of the host"""
+        if self.bandwidth is not None and not self.bandwidth.acquire_connection(self.url, self._cancelled):
+            raise DownloadCancelled('Download cancelled')
+        try:
+            with self.http.get(self.url, headers=headers, stream=True, verify=False, timeout=self.timeout) as resp:
+                self.final_url = resp.url or self.url
+                yield resp
+        finally:
+            if self.bandwidth is not None:
+                self.bandwidth.release_connection(self.url)
+
+    def _cancelled(self):
+        """Check whether the caller or a failed sibling segment asked to stop"""
+        return self.aborted or (self.is_cancelled is not None and self.is_cancelled())
+
+    def _probe_segmented(self):
+        """
+        Probe content-length and range support with a one-byte ranged request
+        and split the file into segments when it is large enough
+
+        Returns:
+            bool: True if the file should be fetched in segments
+        """
+        if self.state['bytes_written'] and not self.state.get('segments'):
+            # A .part left by a single-connection download is resumed as it is instead of being thrown away
+            return False
+        try:
+            headers = dict(self.headers)
+            headers['Range'] = 'bytes=0-0'
+            with self._get(headers) as resp:
+                if resp.status_code != 206 or resp.headers.get('Accept-Ranges', 'bytes').lower() == 'none' or self._is_encoded(resp):
+                    return False
+                try:
+                    total_size = int(resp.headers.get('Content-Range', '').rsplit('/', 1)[1])
+                except (IndexError, ValueError):
+                    return False
+                etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        except retryable_errors() as e:
+            log_debug('分段下载探测失败: %s', e)
+            return False
+        if total_size < self.MIN_SEGMENTED_SIZE:
+            return False
+
+        segments = self.state.get('segments')
+        unchanged = self.state['total_size'] == total_size and (self.state.get('etag'), self.state.get('last_modified')) == (etag, last_modified)
+        if segments and unchanged and os.path.exists(self.part_path) and os.path.getsize(self.part_path) == total_size:
+            return True
+
+        # Preallocate the .part file so every segment can write at its own offset
+        self.state = self._new_state()
+        self.state.update({'etag': etag, 'last_modified': last_modified, 'total_size': total_size})
+        segment_size = -(-total_size // self.segments)
+        self.state['segments'] = [
+            [start, min(start + segment_size, total_size) - 1, 0] for start in range(0, total_size, segment_size)
+        ]
+        with open(self.part_path, 'wb') as fp:
+            fp.truncate(total_size)
+        self._save_state()
+        log_debug('分段下载: %d 字节, %d 段', total_size, len(self.state['segments']))
+        return True
+
+    def _fetch_segmented(self):
+        """Fetch all unfinished segments concurrently and verify the assembled size"""
+        pending = [segment for segment in self.state['segments'] if segment[2] < segment[1] - segment[0] + 1]
+        with ThreadPoolExecutor(max_workers=len(pending) or 1) as executor:
+            futures = [executor.submit(self._fetch_segment, segment) for segment in pending]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    self.aborted = True
+                    errors.append(e)
+        self._save_state()
+        if errors:
+            # Report the root cause rather than the cancellations it triggered in sibling segments
+            errors.sort(key=lambda e: (not isinstance(e, RangeNotSupported), isinstance(e, DownloadCancelled)))
+            raise errors[0]
+
+        written = sum(segment[2] for segment in self.state['segments'])
+        if written != self.state['total_size'] or os.path.getsize(self.part_path) != self.state['total_size']:
+            raise DownloadError(f'Assembled size mismatch: {written} of {self.state["total_size"]} bytes')
+
+    def _fetch_segment(self, segment):
+        """
+        Fetch one byte range into its position of the preallocated .part file
+
+        Args:
+            segment (list): [start, end, bytes_done], bytes_done only counts bytes flushed out of the write
+                buffer, since any segment may save the state record of all of them
+        """
+        start, end = segment[0], segment[1]
+        length = end - start + 1
+        attempt = 0
+        received = [segment[2]]  # Bytes handed to the write buffer, ahead of bytes_done until the next flush
+        unsaved_bytes = [0]
+
+        def on_chunk(nbytes, fp):
+            received[0] += nbytes
+            with self.state_lock:
+                self.state['bytes_written'] += nbytes
+                if self.progress_callback is not None:
+                    self.progress_callback(self.state['bytes_written'], self.state['total_size'])
+            unsaved_bytes[0] += nbytes
+            if unsaved_bytes[0] >= self.STATE_SAVE_INTERVAL:
+                fp.flush()
+                with self.state_lock:
+                    segment[2] = received[0]
+                self._save_state()
+                unsaved_bytes[0] = 0
+
+        while received[0] < length:
+            position = start + received[0]
+            headers = dict(self.headers)
+            headers['Range'] = f'bytes={position}-{end}'
+            validator = self.state.get('etag') or self.state.get('last_modified')
+            if validator:
+                headers['If-Range'] = validator
+            try:
+                with self._get(headers) as resp:
+                    if resp.status_code != 206 or not self._range_starts_at(resp, position):
+                        raise RangeNotSupported(f'Range {position}-{end} answered with status code {resp.status_code}')
+                    with open(self.part_path, 'r+b', buffering=self.WRITE_BUFFER_SIZE) as fp:
+                        fp.seek(position)
+                        self._stream_body(resp, fp, on_chunk, max_bytes=length - received[0])
+                    # Closing the file flushed the rest of the buffer
+                    with self.state_lock:
+                        segment[2] = received[0]
+                if received[0] < length:
+                    raise IncompleteDownload(f'Segment {start}-{end} received {received[0]} of {length} bytes')
+            except retryable_errors() as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise DownloadError(f'Segment {start}-{end} failed after {self.max_retries} retries: {str(e)}')
+                self._save_state()
+                log_warning(f'分段 {start}-{end} 中断，从 {start + received[0]} 字节处续传 (第 {attempt} 次重试): {str(e)}')
+
+    def _fetch(self):
+        """Issue a single (possibly ranged) request and stream the body into the .part file"""
+        offset = self.state['bytes_written']
+        # Decoded bytes on disk cannot be mapped back to offsets of a compressed body, start over
+        if offset and (not os.path.exists(self.part_path) or self.state.get('encoded')):
+            offset = self.state['bytes_written'] = 0
+        headers = dict(self.headers)
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            validator = self.state.get('etag') or self.state.get('last_modified')
+            if validator:
+                headers['If-Range'] = validator
+
+        with self._get(headers) as resp:
+            if offset and resp.status_code == 416 and self.state['total_size'] and offset >= self.state['total_size']:
+                return
+            if resp.status_code not in (200, 206):  # 200 OK or 206 Partial Content
+                raise DownloadError(f'Download failed with status code: {resp.status_code}')
+
+            content_length = int(resp.headers.get('content-length', 0))
+            if offset and (resp.status_code != 206 or not self._range_starts_at(resp, offset)):
+                # The server ignored the range or the resource changed, fetch the whole file again
+                log_info(f'服务器不支持续传，重新下载完整文件: {self.file_path}')
+                offset = 0
+            if offset == 0:
+                self.state['etag'] = resp.headers.get('ETag')
+                self.state['last_modified'] = resp.headers.get('Last-Modified')
+                self.state['encoded'] = self._is_encoded(resp)
+                self.state['total_size'] = content_length
+            elif not self.state['total_size'] and content_length:
+                self.state['total_size'] = offset + content_length
+            self.state['bytes_written'] = offset
+            self._save_state()
+
+            total_size = self.state['total_size']
+            unsaved_bytes = [0]
+
+            def on_chunk(nbytes, fp):
+                self.state['bytes_written'] += nbytes
+                unsaved_bytes[0] += nbytes
+                if unsaved_bytes[0] >= self.STATE_SAVE_INTERVAL:
+                    fp.flush()
+                    self._save_state()
+                    unsaved_bytes[0] = 0
+                if self.progress_callback is not None:
+                    self.progress_callback(self.state['bytes_written'], total_size)
+
+            with open(self.part_path, 'ab' if offset else 'wb', buffering=self.WRITE_BUFFER_SIZE) as fp:
+                self._stream_body(resp, fp, on_chunk)
+            download_size = self.state['bytes_written']
+
+            # Content-Length of a compressed body says nothing about the decoded size
+            if total_size and download_size < total_size and not self.state['encoded']:
+                raise IncompleteDownload(f'Received {download_size} of {total_size} bytes')
+            log_debug('下载数据接收完成: %d 字节', download_size)
+
+    def _stream_body(self, resp, fp, on_chunk, max_bytes=None):
+        """
+        Copy a response body into fp, the read size follows the measured throughput instead
+        of a fixed 16KB chunk. urllib3's readinto still reads each chunk into a new bytes object
+        and copies it into our buffer, reusing the buffer only saves the allocations on our side
+
+        Args:
+            resp (requests.Response): Streamed response
+            fp: File object positioned at the write offset
+            on_chunk (callable): Called as on_chunk(nbytes, fp) after each write
+            max_bytes (int): Stop after this many bytes, None reads until the end of the body
+        """
+        raw = resp.raw
+        raw.decode_content = True
+        chunk_size = AdaptiveChunkSize()
+        # Sliced without copying, fp.write takes the view as it is
+        view = memoryview(bytearray(AdaptiveChunkSize.MAX_CHUNK_SIZE))
+        remaining = max_bytes
+        while remaining is None or remaining > 0:
+            if self._cancelled():
+                raise DownloadCancelled('Download cancelled')
+            size = chunk_size.size if remaining is None else min(chunk_size.size, remaining)
+            if self.bandwidth is not None:
+                size = self.bandwidth.read_size(self.source, size)
+            started = time.monotonic()
+            nbytes = raw.readinto(view[:size])
+            if not nbytes:
+                break
+            if self.first_byte_at is None:
+                self.first_byte_at = time.monotonic()
+            fp.write(view[:nbytes])
+            chunk_size.update(nbytes, size, time.monotonic() - started)
+            if remaining is not None:
+                remaining -= nbytes
+            on_chunk(nbytes, fp)
+            if self.bandwidth is not None:
+                self._pause(self.bandwidth.reserve(self.source, nbytes))
+
+    def _pause(self, delay):
+        """Wait for the delay asked by the bandwidth limiter, waking up early if cancelled"""
+        if not self.bandwidth.pause(delay, self._cancelled):
+            raise DownloadCancelled('Download cancelled')
+
+    @staticmethod
+    def _is_encoded(resp):
+        """Check whether the server compressed the body despite Accept-Encoding: identity"""
+        return resp.headers.get('Content-Encoding', 'identity').lower() not in ('identity', '')
+
+    @staticmethod
+    def _range_starts_at(resp, offset):
+        """Check that a 206 response's Content-Range starts at the requested offset"""
+        content_range = resp.headers.get('Content-Range', '')
+        try:
+            start = int(content_range.split()[1].split('-')[0])
+        except (IndexError, ValueError):
+            return False
+        return start == offset
@@ -0,0 +1,176 @@
+'''
+Function:
+    Structured JSONL Event Log of Searches and Downloads for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from logging.handlers import QueueListener
+from logger import BoundedQueueHandler, get_log_directory
+
+
+EVENT_FILE_PREFIX = 'events_'
+EVENT_FILE_SUFFIX = '.jsonl'
+
+
+def event_file_name(day):
+    """
+    Args:
+        day (date): Local date of the events
+
+    Returns:
+        str: Name of the file holding the events of that day
+    """
+    return f'{EVENT_FILE_PREFIX}{day:%Y-%m-%d}{EVENT_FILE_SUFFIX}'
+
+
+def event_file_day(file_name):
+    """
+    Args:
+        file_name (str): File name inside the events directory
+
+    Returns:
+        date: Day of the file, None if it is not an event file
+    """
+    if not (file_name.startswith(EVENT_FILE_PREFIX) and file_name.endswith(EVENT_FILE_SUFFIX)):
+        return None
+    try:
+        return datetime.strptime(file_name[len(EVENT_FILE_PREFIX):-len(EVENT_FILE_SUFFIX)], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def keyword_hash(keyword):
+    """
+    Args:
+        keyword (str): Search keyword
+
+    Returns:
+        str: Short stable hash, lets repeated searches be grouped without storing what was searched
+    """
+    return hashlib.sha1(keyword.strip().lower().encode('utf-8')).hexdigest()[:12]
+
+
+class DailyJsonlHandler(logging.Handler):
+    """
+    Writes the event dict carried by each record as one JSON line into a file per local day,
+    runs on the queue listener thread only
+    """
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.day = None
+        self.stream = None
+
+    def emit(self, record):
+        try:
+            event = record.msg
+            if not isinstance(event, dict):
+                # Overflow notices of the bounded queue arrive as plain text records
+                event = {'ts': round(record.created, 3), 'event': 'log', 'level': record.levelname, 'message': record.getMessage()}
+            day = datetime.fromtimestamp(event['ts']).date()
+            if day != self.day:
+                self.close_stream()
+                self.stream = open(os.path.join(self.directory, event_file_name(day)), 'a', encoding='utf-8')
+                self.day = day
+            self.stream.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def close(self):
+        self.close_stream()
+        super().close()
+
+
+class EventQueueHandler(BoundedQueueHandler):
+    """Queues event records unformatted, their payload is a plain dict serialised by the writer thread"""
+    def prepare(self, record):
+        return record
+
+
+class EventLog:
+    """
+    Parallel to the text log: every search and download is appended as a JSON object with
+    ts, event, source, status and event specific fields such as latency_ms and bytes.
+    Writing goes through a bounded queue and a background thread like the text log
+    """
+    def __init__(self):
+        self.logger = logging.getLogger('MusicdlGUI.events')
+        self.logger.propagate = False
+        self.listener = None
+        self.directory = None
+
+    def start(self, directory=None, retention_days=90, queue_size=10000):
+        """
+        Start writing events, events emitted before are dropped
+
+        Args:
+            directory (str): Target directory, defaults to logs/events next to the application
+            retention_days (int): Event files older than this many days are deleted, 0 keeps everything
+            queue_size (int): Capacity of the write queue
+        """
+        if self.listener is not None:
+            return
+        self.directory = directory or os.path.join(get_log_directory(), 'events')
+        os.makedirs(self.directory, exist_ok=True)
+        if retention_days:
+            self._remove_expired(retention_days)
+        log_queue = queue.Queue(maxsize=queue_size)
+        self.logger.handlers.clear()
+        self.logger.addHandler(EventQueueHandler(log_queue))
+        self.logger.setLevel(logging.INFO)
+        self.listener = QueueListener(log_queue, DailyJsonlHandler(self.directory))
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write out the queued events and stop the writer thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+            self.logger.handlers.clear()
+
+    def emit(self, event, **fields):
+        """
+        Append an event, a no-op until start() has been called
+
+        Args:
+            event (str): Event type, e.g. search or download
+            fields: JSON serialisable payload
+        """
+        if self.listener is None:
+            return
+        payload = {'ts': round(time.time(), 3), 'event': event}
+        payload.update(fields)
+        self.logger.info(payload)
+
+    def _remove_expired(self, retention_days):
+        oldest = datetime.now().date() - timedelta(days=retention_days)
+        for file_name in os.listdir(self.directory):
+            day = event_file_day(file_name)
+            if day is not None and day < oldest:
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except OSError:
+                    pass
+
+
+# Shared by the window, the command line and the download core
+event_log = EventLog()
@@ -0,0 +1,229 @@
+'''
+Function:
+    Query Tool for the Structured Event Log of MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+Usage:
+    python events_query.py --event search --since 7d --by source --field latency_ms
+    python events_query.py --event download --since 30d --by host
+'''
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from events import event_file_day
+
+
+INDEX_FILE_NAME = 'index.json'
+# Statuses counted as failures, cancelled downloads and cached searches are not
+FAILED_STATUSES = ('error',)
+
+
+def parse_time(value, now=None):
+    """
+    Args:
+        value (str): Relative age such as 30m, 12h or 7d, or a local date YYYY-MM-DD
+        now (float): Reference epoch seconds, defaults to the current time
+
+    Returns:
+        float: Epoch seconds
+    """
+    now = time.time() if now is None else now
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    if value[-1:] in units and value[:-1].replace('.', '', 1).isdigit():
+        return now - float(value[:-1]) * units[value[-1]]
+    return datetime.strptime(value, '%Y-%m-%d').timestamp()
+
+
+class EventIndex:
+    """
+    Per-file summary of the event directory: size, mtime, first and last timestamp and the
+    count of every event type. Files of past days never change, so after the first query
+    only today's file is rescanned and files outside the time range or without the
+    requested event type are never opened
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_FILE_NAME)
+        self.files = {}
+        self.dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    def entry(self, file_name):
+        """
+        Args:
+            file_name (str): Event file inside the directory
+
+        Returns:
+            dict: Summary of the file, rebuilt if the file changed since it was indexed
+        """
+        stat = os.stat(os.path.join(self.directory, file_name))
+        entry = self.files.get(file_name)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            entry = self._scan(file_name)
+            entry.update(size=stat.st_size, mtime=stat.st_mtime)
+            self.files[file_name] = entry
+            self.dirty = True
+        return entry
+
+    def _scan(self, file_name):
+        entry = {'first_ts': None, 'last_ts': None, 'counts': {}}
+        for event in read_events(os.path.join(self.directory, file_name)):
+            ts = event.get('ts', 0)
+            entry['first_ts'] = ts if entry['first_ts'] is None else min(entry['first_ts'], ts)
+            entry['last_ts'] = ts if entry['last_ts'] is None else max(entry['last_ts'], ts)
+            entry['counts'][event.get('event')] = entry['counts'].get(event.get('event'), 0) + 1
+        return entry
+
+    def save(self):
+        """Write the index atomically if it changed, entries of deleted files are dropped"""
+        if not self.dirty:
+            return
+        existing = set(os.listdir(self.directory))
+        files = {name: entry for name, entry in self.files.items() if name in existing}
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'files': files}, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError:
+            pass
+
+
+def read_events(file_path, event_type=None):
+    """
+    Args:
+        file_path (str): JSONL event file
+        event_type (str): Only yield events of this type, lines of other types are skipped without being decoded
+
+    Yields:
+        dict: Events in file order, truncated or corrupt lines are skipped
+    """
+    marker = None if event_type is None else json.dumps({'event': event_type}, ensure_ascii=False)[1:-1]
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if marker is not None and marker not in line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event_type is None or event.get('event') == event_type:
+                yield event
+
+
+def query_events(directory, event_type, since, until):
+    """
+    Args:
+        directory (str): Events directory
+        event_type (str): Event type, e.g. search or download
+        since (float): Epoch seconds, inclusive
+        until (float): Epoch seconds, exclusive
+
+    Yields:
+        dict: Matching events, only files that may contain them are read
+    """
+    index = EventIndex(directory)
+    # Files are named by local day, one day of margin covers events written around midnight
+    first_day = datetime.fromtimestamp(since).date() - timedelta(days=1)
+    last_day = datetime.fromtimestamp(until).date() + timedelta(days=1)
+    try:
+        for file_name in sorted(os.listdir(directory)):
+            day = event_file_day(file_name)
+            if day is None or not first_day <= day <= last_day:
+                continue
+            entry = index.entry(file_name)
+            if not entry['counts'].get(event_type) or entry['last_ts'] < since or entry['first_ts'] >= until:
+                continue
+            for event in read_events(os.path.join(directory, file_name), event_type):
+                if since <= event.get('ts', 0) < until:
+                    yield event
+    finally:
+        index.save()
+
+
+def aggregate(events, group_by, field, filters=None):
+    """
+    Args:
+        events (iterable): Events to aggregate
+        group_by (str): Field the rows are grouped by, e.g. source or host
+        field (str): Numeric field summarised with mean, p50, p95 and max, e.g. latency_ms
+        filters (dict): Field -> required value, compared as strings
+
+    Returns:
+        list: Dicts of group, count, failed, failure_rate, samples, mean, p50, p95 and max, busiest group first
+    """
+    groups = {}
+    for event in events:
+        if filters and any(str(event.get(key)) != value for key, value in filters.items()):
+            continue
+        group = groups.setdefault(str(event.get(group_by, '')), {'count': 0, 'failed': 0, 'values': []})
+        group['count'] += 1
+        if event.get('status') in FAILED_STATUSES:
+            group['failed'] += 1
+        if isinstance(event.get(field), (int, float)):
+            group['values'].append(event[field])
+    rows = []
+    for name, group in groups.items():
+        values = sorted(group['values'])
+        row = {'group': name, 'count': group['count'], 'failed': group['failed'],
+               'failure_rate': group['failed'] / group['count'], 'samples': len(values)}
+        if values:
+            row.update(mean=sum(values) / len(values), p50=values[len(values) // 2],
+                       p95=values[min(len(values) - 1, int(len(values) * 0.95))], max=values[-1])
+        rows.append(row)
+    rows.sort(key=lambda row: row['count'], reverse=True)
+    return rows
+
+
+def format_table(rows, group_by, field):
+    """
+    Returns:
+        str: Rows as an aligned text table
+    """
+    header = [group_by, 'count', 'failed', 'fail%', f'{field} mean', 'p50', 'p95', 'max']
+    lines = [header]
+    for row in rows:
+        stats = [f'{row[key]:.1f}' if key in row else '-' for key in ('mean', 'p50', 'p95', 'max')]
+        lines.append([row['group'] or '-', str(row['count']), str(row['failed']), f'{row["failure_rate"] * 100:.1f}'] + stats)
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(widths[0]) if i == 0 else cell.rjust(widths[i]) for i, cell in enumerate(line)) for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate the MusicdlGUI event log, e.g. p95 search latency per source or failure rate per CDN host')
+    parser.add_argument('--event', default='search', help='event type: search or download')
+    parser.add_argument('--since', default='7d', help='start of the range, relative (30m, 12h, 7d) or YYYY-MM-DD')
+    parser.add_argument('--until', help='end of the range, relative or YYYY-MM-DD, defaults to now')
+    parser.add_argument('--by', default='source', help='field to group by, e.g. source, host, status, keyword_hash')
+    parser.add_argument('--field', default='latency_ms', help='numeric field to summarise, e.g. latency_ms, ttfb_ms, bytes')
+    parser.add_argument('--where', action='append', default=[], metavar='KEY=VALUE', help='only count events whose field equals the value')
+    parser.add_argument('--events-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'events'), help='event log directory')
+    parser.add_argument('--json', action='store_true', help='print the rows as JSON')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.events_dir):
+        sys.exit(f'Event log directory not found: {args.events_dir}')
+    filters = dict(item.split('=', 1) for item in args.where if '=' in item)
+    since = parse_time(args.since)
+    until = parse_time(args.until) if args.until else time.time() + 1
+    rows = aggregate(query_events(args.events_dir, args.event, since, until), args.by, args.field, filters)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    elif rows:
+        print(format_table(rows, args.by, args.field))
+    else:
+        print('No matching events')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+'''
+Function:
+    Local Library Index of Downloaded Songs for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import re
+import json
+import hashlib
+import threading
+from ranking import duplicate_key, same_duration
+from logger import log_info, log_debug, log_warning
+
+
+# File extensions treated as songs when scanning the work directory
+AUDIO_EXTS = {'.mp3', '.flac', '.m4a', '.ogg', '.wav', '.ape', '.aac', '.wma', '.opus'}
+# Suffix appended by the download worker when a filename was already taken, e.g. "Song - Singer (1).mp3"
+DUPLICATE_SUFFIX = re.compile(r' \(\d+\)$')
+
+
+def song_key(song_info):
+    """
+    Build a stable identity for a song of a source, shared by .part files and the library index
+
+    Args:
+        song_info (dict): Song info returned by a music source
+
+    Returns:
+        str: source:identifier, falling back to the song name and singers if the source has no id
+    """
+    identifier = song_info.get('identifier') or f"{song_info.get('song_name', '')}-{song_info.get('singers', '')}"
+    return f"{song_info['source']}:{identifier}"
+
+
+def file_sha1(file_path, chunk_size=1024 * 1024):
+    """
+    Args:
+        file_path (str): File to hash
+        chunk_size (int): Bytes read at a time
+
+    Returns:
+        str: Hex SHA-1 of the file content
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LibraryIndex:
+    """
+    Persistent index of the songs already on disk, looked up by source and song id
+    or by normalized title and singers so that batches skip songs we already own
+    """
+    def __init__(self, persist_path=None):
+        """
+        Initialize library index
+
+        Args:
+            persist_path (str): JSON file used to keep the index across sessions, None keeps it in memory only
+        """
+        self.persist_path = persist_path
+        self.entries = {}  # absolute path -> {'path', 'size', 'mtime', 'sha1', 'song_key', 'dedup_key', 'duration_s'}
+        self.by_song_key = {}
+        self.by_dedup_key = {}  # dedup key -> set of paths
+        self.lock = threading.Lock()
+        self.dirty = False
+        if persist_path:
+            self.load()
+
+    def _put(self, entry):
+        """Insert an entry and its lookup keys, the caller holds the lock"""
+        self._drop(entry['path'])
+        self.entries[entry['path']] = entry
+        if entry.get('song_key'):
+            self.by_song_key[entry['song_key']] = entry['path']
+        if entry.get('dedup_key'):
+            self.by_dedup_key.setdefault(entry['dedup_key'], set()).add(entry['path'])
+        self.dirty = True
+
+    def _drop(self, path):
+        """Remove an entry and its lookup keys, the caller holds the lock"""
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return
+        if entry.get('song_key') and self.by_song_key.get(entry['song_key']) == path:
+            del self.by_song_key[entry['song_key']]
+        paths = self.by_dedup_key.get(entry.get('dedup_key'))
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self.by_dedup_key[entry['dedup_key']]
+        self.dirty = True
+
+    def add(self, song_info, file_path, file_hash=None):
+        """
+        Record a finished download
+
+        Args:
+            song_info (dict): Song info of the download
+            file_path (str): Path of the downloaded file
+            file_hash (str): SHA-1 of the file if the caller already computed it
+        """
+        path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        entry = {
+            'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': file_hash,
+            'song_key': song_key(song_info), 'dedup_key': song_info.get('dedup_key') or duplicate_key(song_info),
+            'duration_s': song_info.get('duration_s', 0),
+        }
+        with self.lock:
+            self._put(entry)
+
+    def find(self, song_info):
+        """
+        Look up a song we already own, matching the same song of any source
+
+        Args:
+            song_info (dict): Song info of a search result
+
+        Returns:
+            dict: Index entry of the file on disk, or None if the song was never downloaded or its file is gone
+        """
+        with self.lock:
+            candidates = []
+            path = self.by_song_key.get(song_key(song_info))
+            if path is not None:
+                candidates.append(path)
+            key = song_info.get('dedup_key') or duplicate_key(song_info)
+            candidates.extend(self.by_dedup_key.get(key, ()))
+            for path in candidates:
+                entry = self.entries.get(path)
+                if entry is None:
+                    continue
+                if entry.get('song_key') != song_key(song_info) and not same_duration(entry.get('duration_s', 0), song_info.get('duration_s', 0)):
+                    continue
+                # A cheap stat is enough to notice files deleted or replaced since they were indexed
+                try:
+                    if os.path.getsize(path) != entry['size']:
+                        raise OSError
+                except OSError:
+                    self._drop(path)
+                    continue
+                return entry
+        return None
+
+    def refresh(self, work_dir):
+        """
+        Bring the index up to date with the files under work_dir, only new or modified files are hashed.
+        Downloads may call add() while the scan runs, their entries are never dropped or overwritten by it
+
+        Args:
+            work_dir (str): Root directory of the downloaded songs
+        """
+        root = os.path.abspath(work_dir)
+        seen, changed = set(), []
+        with self.lock:
+            # Entries as they were when the scan started, anything replaced since is newer than the scan
+            scanned = dict(self.entries)
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for item in it:
+                        if item.is_dir(follow_symlinks=False):
+                            stack.append(item.path)
+                            continue
+                        if os.path.splitext(item.name)[1].lower() not in AUDIO_EXTS:
+                            continue
+                        stat = item.stat()
+                        seen.add(item.path)
+                        with self.lock:
+                            entry = self.entries.get(item.path)
+                        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+                            changed.append((item.path, stat, entry))
+            except OSError as e:
+                log_debug('扫描音乐库目录失败: %s', e)
+        for path, stat, indexed in changed:
+            try:
+                sha1 = file_sha1(path)
+            except OSError:
+                continue
+            entry = indexed
+            if entry is None:
+                # Files not downloaded by this app are matched by the "Songname - Singers" filename only
+                stem = DUPLICATE_SUFFIX.sub('', os.path.splitext(os.path.basename(path))[0])
+                song_name, _, singers = stem.rpartition(' - ') if ' - ' in stem else (stem, '', '')
+                entry = {'song_key': None, 'dedup_key': duplicate_key({'song_name': song_name, 'singers': singers}), 'duration_s': 0}
+            entry = dict(entry, path=path, size=stat.st_size, mtime=stat.st_mtime, sha1=sha1)
+            with self.lock:
+                # Skipped if a download indexed the file while it was being hashed
+                if self.entries.get(path) is indexed:
+                    self._put(entry)
+        with self.lock:
+            removed = [
+                path for path, entry in scanned.items()
+                if path.startswith(root + os.sep) and path not in seen and self.entries.get(path) is entry
+            ]
+            for path in removed:
+                self._drop(path)
+        log_info(f'音乐库索引已更新 - {root}: 共 {len(self.entries)} 首, 新增或变更 {len(changed)} 首, 移除 {len(removed)} 首')
+
+    def refresh_async(self, work_dir):
+        """
+        Refresh the index in a background thread and save it afterwards
+
+        Args:
+            work_dir (str): Root directory of the downloaded songs
+        """
+        def run():
+            self.refresh(work_dir)
+            self.save()
+        threading.Thread(target=run, name='LibraryIndexRefresh', daemon=True).start()
+
+    def load(self):
+        """Load the index from the persist file"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log_warning(f'读取音乐库索引失败: {str(e)}')
+            return
+        with self.lock:
+            for entry in data:
+                self._put(entry)
+            self.dirty = False
+        log_debug('已加载 %d 条音乐库索引', len(self.entries))
+
+    def save(self):
+        """Write the index to the persist file if it changed"""
+        if not self.persist_path:
+            return
+        # Held while writing as well, the background refresh and the GUI thread may both save
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_path = self.persist_path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(list(self.entries.values()), f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+                self.dirty = False
+            except OSError as e:
+                log_warning(f'保存音乐库索引失败: {str(e)}')
@@ -8,14 +8,50 @@ WeChat Official Account (微信公众号):
 '''
 import os
 import sys
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 
 # 全局 logger 实例
 _logger = None
 _log_file_path = None
+# 后台写日志线程
+_listener = None
+# 多个线程首次写日志时只初始化一次
+_setup_lock = threading.Lock()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    写入有界队列的日志处理器，由后台线程负责格式化后的文件写入与轮转
+    
+    队列满时 DEBUG/INFO 日志直接丢弃并计数，不阻塞调用线程；
+    WARNING 及以上级别最多等待 BLOCK_TIMEOUT 秒，仍然放不下才丢弃
+    """
+    BLOCK_TIMEOUT = 1.0
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        # Handler.handle 已持有 self.lock，dropped 计数不需要额外加锁
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.LogRecord(
+                    record.name, logging.WARNING, __file__, 0, '日志队列已满，丢弃了 %d 条日志', (self.dropped,), None
+                ))
+                self.dropped = 0
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.BLOCK_TIMEOUT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 def get_log_directory():
@@ -25,7 +61,11 @@ def get_log_directory():
     Returns:
         str: 日志目录的绝对路径
     """
-    # 使用应用程序所在目录下的 logs 文件夹
+    # 使用应用程序所在目录下的 logs 文件夹，可用环境变量 MUSICDLGUI_LOG_DIR 指定其他目录（如测试时）
+    log_dir = os.environ.get('MUSICDLGUI_LOG_DIR')
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        return log_dir
     if getattr(sys, 'frozen', False):
         # 打包后的可执行文件
         app_dir = os.path.dirname(sys.executable)
@@ -49,30 +89,40 @@ def get_log_file_path():
     return _log_file_path
 
 
-def setup_logger(log_level=logging.INFO, log_to_console=False, max_bytes=5*1024*1024, backup_count=5):
+def setup_logger(log_level=logging.INFO, log_to_console=False, max_bytes=5*1024*1024, backup_count=5, queue_size=10000):
     """
     初始化并配置日志记录器
     
+    调用线程只把日志放入有界队列，文件写入和轮转检查都在后台线程中完成
+    
     Args:
         log_level: 日志级别，默认 INFO
         log_to_console: 是否同时输出到控制台，默认 False
         max_bytes: 单个日志文件最大大小，默认 5MB
         backup_count: 保留的日志文件数量，默认 5
+        queue_size: 日志队列容量，默认 10000 条
     
     Returns:
         logging.Logger: 配置好的日志记录器
     """
-    global _logger, _log_file_path
+    global _logger
     
-    if _logger is not None:
-        return _logger
+    with _setup_lock:
+        if _logger is None:
+            _logger = _create_logger(log_level, log_to_console, max_bytes, backup_count, queue_size)
+    return _logger
+
+
+def _create_logger(log_level, log_to_console, max_bytes, backup_count, queue_size):
+    """创建 logger 并启动后台写日志线程，处理器全部就绪后才返回"""
+    global _log_file_path, _listener
     
     # 创建 logger
-    _logger = logging.getLogger('MusicdlGUI')
-    _logger.setLevel(log_level)
+    logger = logging.getLogger('MusicdlGUI')
+    logger.setLevel(log_level)
     
     # 清除已有的处理器
-    _logger.handlers.clear()
+    logger.handlers.clear()
     
     # 日志格式
     formatter = logging.Formatter(
@@ -93,16 +143,31 @@ def setup_logger(log_level=logging.INFO, log_to_console=False, max_bytes=5*1024*
     )
     file_handler.setLevel(log_level)
     file_handler.setFormatter(formatter)
-    _logger.addHandler(file_handler)
+    handlers = [file_handler]
     
     # 控制台处理器（可选）
     if log_to_console:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(log_level)
         console_handler.setFormatter(formatter)
-        _logger.addHandler(console_handler)
+        handlers.append(console_handler)
     
-    return _logger
+    # 队列处理器 - 由后台线程写入上面的处理器
+    log_queue = queue.Queue(maxsize=queue_size)
+    logger.addHandler(BoundedQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logger)
+    
+    return logger
+
+
+def shutdown_logger():
+    """写完队列中剩余的日志并停止后台写日志线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def get_logger():
@@ -112,36 +177,35 @@ def get_logger():
     Returns:
         logging.Logger: 日志记录器，如果未初始化则自动初始化
     """
-    global _logger
     if _logger is None:
-        _logger = setup_logger()
+        return setup_logger()
     return _logger
 
 
-# 便捷日志函数
-def log_info(message):
+# 便捷日志函数，args 按 % 格式延迟格式化，级别未启用时不会产生格式化开销
+def log_info(message, *args):
     """记录 INFO 级别日志"""
-    get_logger().info(message)
+    get_logger().info(message, *args)
 
 
-def log_debug(message):
-    """记录 DEBUG 级别日志"""
-    get_logger().debug(message)
+def log_debug(message, *args):
+    """记录 DEBUG 级别日志，热点路径请传 args 而不是 f-string"""
+    get_logger().debug(message, *args)
 
 
-def log_warning(message):
+def log_warning(message, *args):
     """记录 WARNING 级别日志"""
-    get_logger().warning(message)
+    get_logger().warning(message, *args)
 
 
-def log_error(message):
+def log_error(message, *args):
     """记录 ERROR 级别日志"""
-    get_logger().error(message)
+    get_logger().error(message, *args)
 
 
-def log_exception(message):
+def log_exception(message, *args):
     """记录异常信息，包含堆栈跟踪"""
-    get_logger().exception(message)
+    get_logger().exception(message, *args)
 
 
 # 特定操作的日志函数
@@ -225,7 +289,7 @@ def log_download_progress(song_name, percent, detail):
         detail: 详情
     """
     if percent in [25, 50, 75, 100]:
-        log_debug(f'下载进度 - "{song_name}": {percent}% ({detail})')
+        log_debug('下载进度 - "%s": %s%% (%s)', song_name, percent, detail)
 
 
 def log_download_success(song_name, file_path):
@@ -0,0 +1,107 @@
+'''
+Function:
+    Lightweight Timing Metrics for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    In-memory ring buffer of timing samples, each sample is
+    {'name', 'value', 'unit', 'time', 'labels'} where time is the wall clock of the sample
+    and durations are measured with the monotonic clock
+    """
+    def __init__(self, capacity=2000):
+        """
+        Initialize metrics
+
+        Args:
+            capacity (int): Number of samples kept, the oldest ones are dropped first
+        """
+        self.samples = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def record(self, name, value, unit='ms', **labels):
+        """
+        Add a sample
+
+        Args:
+            name (str): Metric name, e.g. search.source
+            value (float): Measured value
+            unit (str): Unit of the value, ms for durations
+            labels: Extra dimensions such as source=QQMusicClient
+        """
+        sample = {'name': name, 'value': round(value, 3), 'unit': unit, 'time': time.time(), 'labels': labels}
+        with self.lock:
+            self.samples.append(sample)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Time a block and record its duration in milliseconds, also when the block raises
+
+        Args:
+            name (str): Metric name
+            labels: Extra dimensions, the block may add more to the yielded dict
+        """
+        started = time.monotonic()
+        try:
+            yield labels
+        finally:
+            self.record(name, (time.monotonic() - started) * 1000, **labels)
+
+    def snapshot(self):
+        """
+        Returns:
+            list: Copy of the samples currently in the buffer, oldest first
+        """
+        with self.lock:
+            return list(self.samples)
+
+    def summary(self):
+        """
+        Aggregate the samples of every metric
+
+        Returns:
+            list: Dicts of name, unit, count, mean, p50, p95 and max, sorted by name
+        """
+        values = {}
+        for sample in self.snapshot():
+            values.setdefault((sample['name'], sample['unit']), []).append(sample['value'])
+        rows = []
+        for (name, unit), items in sorted(values.items()):
+            items.sort()
+            rows.append({
+                'name': name, 'unit': unit, 'count': len(items), 'mean': sum(items) / len(items),
+                'p50': items[len(items) // 2], 'p95': items[min(len(items) - 1, int(len(items) * 0.95))], 'max': items[-1],
+            })
+        return rows
+
+    def export(self, file_path, **metadata):
+        """
+        Write the summary and the raw samples to a JSON file
+
+        Args:
+            file_path (str): Target file
+            metadata: Extra top-level fields, e.g. the application version
+        """
+        data = dict(metadata, exported_at=time.time(), summary=self.summary(), samples=self.snapshot())
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def clear(self):
+        """Drop every sample"""
+        with self.lock:
+            self.samples.clear()
+
+
+# Shared by the window, the workers and the download core
+metrics = Metrics()
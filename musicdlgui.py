@@ -9,26 +9,44 @@ WeChat Official Account (微信公众号):
 import os
 import sys
 import json
-import uuid
+import time
+import threading
+from startup_timer import StartupTimer
+
+# Installed before the imports below so that the startup report covers them
+startup_timer = StartupTimer()
+startup_timer.install()
+
 from PyQt5 import QtCore
 from PyQt5.QtGui import QIcon, QCursor
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout,
                              QGroupBox, QLabel, QLineEdit, QPushButton,
-                             QCheckBox, QTableWidget, QTableWidgetItem, QProgressBar, QMenu,
+                             QCheckBox, QTreeView, QProgressBar, QMenu,
                              QMessageBox, QHeaderView, QAbstractItemView,
                              QGridLayout, QDialog)
-from musicdl.modules.utils.misc import touchdir, sanitize_filepath
 
 # Import custom modules
 from styles import get_stylesheet
-from components import SortableTableWidgetItem
-from workers import SearchWorker, DownloadWorker
+from components import SearchResultsModel
+from workers import SearchWorker
+from core import MUSIC_SOURCES, DownloadTask, load_settings, build_download_task
+from download_manager import DownloadManager
+from sessions import SessionPool
+from search_cache import SearchCache
+from ranking import SourceSpeedStats
+from download_journal import DownloadJournal
+from downloader import remove_part_files, remove_orphan_parts
+from library_index import LibraryIndex
+from metrics import metrics
+from events import event_log
+from client_registry import ClientRegistry
 from dialogs import SettingsDialog
 from logger import (setup_logger, log_app_start, log_app_exit, log_search_start,
                    log_search_result, log_search_error, log_search_complete,
                    log_download_start, log_download_success, log_download_error,
-                   log_settings_saved, log_theme_changed, log_info, log_error)
+                   log_settings_saved, log_theme_changed, log_info, log_warning, log_error)
+startup_timer.mark('模块导入')
 
 
 class MusicdlGUI(QWidget):
@@ -39,10 +57,12 @@ class MusicdlGUI(QWidget):
         super(MusicdlGUI, self).__init__()
         # Initialize logger
         setup_logger()
+        event_log.start()
         log_app_start()
         
         # Load settings first
         self.load_settings()
+        startup_timer.mark('读取设置')
         
         # Apply modern style
         self.is_dark = self.settings.get('is_dark', False)
@@ -56,9 +76,25 @@ class MusicdlGUI(QWidget):
         
         self.setMinimumSize(1100, 750)
         self.initialize()
+        startup_timer.mark('初始化')
         
         # UI Elements
         self.init_ui()
+        startup_timer.mark('创建界面')
+        
+        # Build the clients of the default sources while the user types the first keyword,
+        # this is also where musicdl and requests are first imported, off the GUI thread
+        self.client_registry.warm_up(self._checked_sources(), self.settings)
+        
+        # Drop the temporary files of downloads that can no longer be resumed, e.g. after a crash
+        threading.Thread(target=remove_orphan_parts, args=(self.settings.get('work_dir', 'musicdl_outputs'), time.time()),
+                         name='OrphanPartCleanup', daemon=True).start()
+        
+        # Pick up songs added, changed or removed in the work directory since the last session
+        self.library_index.refresh_async(self.settings.get('work_dir', 'musicdl_outputs'))
+        
+        # Offer to resume the downloads left unfinished by the last session once the window is shown
+        QTimer.singleShot(0, self.offer_resume_downloads)
     
     def init_ui(self):
         """Initialize user interface"""
@@ -126,8 +162,7 @@ class MusicdlGUI(QWidget):
         engine_layout = QHBoxLayout()
         engine_layout.setContentsMargins(15, 20, 15, 15)
         
-        self.src_names = ['QQMusicClient', 'KuwoMusicClient', 'MiguMusicClient', 
-                         'QianqianMusicClient', 'KugouMusicClient', 'NeteaseMusicClient']
+        self.src_names = list(MUSIC_SOURCES)
         self.check_boxes = []
         for idx, src in enumerate(self.src_names):
             display_name = src.replace('Client', '')
@@ -192,23 +227,25 @@ class MusicdlGUI(QWidget):
         main_layout.addLayout(table_action_layout)
         
         # Results table
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(7)
-        self.results_table.setHorizontalHeaderLabels(['', 'Singers', 'Songname', 'Filesize', 'Duration', 'Album', 'Source'])
-        
-        header = self.results_table.horizontalHeader()
+        # Duplicates found on several sources are collapsed under their best candidate
+        # The model sorts itself when a header is clicked
+        self.results_model = SearchResultsModel(self.source_stats, self)
+        self.results_table = QTreeView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.setUniformRowHeights(True)
+        
+        header = self.results_table.header()
         header.setSectionResizeMode(QHeaderView.Stretch)
         header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # Checkbox column
         header.setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
         header.setSortIndicatorShown(True)
         header.setSectionsClickable(True)
         header.setStyleSheet("QHeaderView::section { padding-right: 30px; }")
+        header.setSortIndicator(-1, Qt.AscendingOrder)  # Keep the arrival order until a column is clicked
         
         self.results_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.results_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.results_table.setAlternatingRowColors(True)
-        self.results_table.verticalHeader().setVisible(False)
-        self.results_table.setShowGrid(False)
         self.results_table.setSortingEnabled(True)
         main_layout.addWidget(self.results_table)
 
@@ -247,6 +284,15 @@ class MusicdlGUI(QWidget):
         
         main_layout.addLayout(bottom_layout)
 
+    def closeEvent(self, event):
+        """Stop download threads before the window closes"""
+        self.download_manager.shutdown()
+        self.session_pool.close()
+        self.search_cache.save()
+        self.source_stats.save()
+        self.library_index.save()
+        super(MusicdlGUI, self).closeEvent(event)
+
     def toggle_theme(self):
         """Toggle between light and dark theme"""
         self.is_dark = not self.is_dark
@@ -258,24 +304,13 @@ class MusicdlGUI(QWidget):
     def load_settings(self):
         """Load settings from JSON file"""
         self.settings_file = os.path.join(os.path.dirname(__file__), 'settings.json')
-        try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r', encoding='utf-8') as f:
-                    self.settings = json.load(f)
-            else:
-                self.settings = {
-                    'work_dir': 'musicdl_outputs', 
-                    'dir_structure': 'flat',  # Default to flat structure
-                    'cookies': {}, 
-                    'quark_cookies': ''
-                }
-        except:
-            self.settings = {
-                'work_dir': 'musicdl_outputs', 
-                'dir_structure': 'flat',
-                'cookies': {}, 
-                'quark_cookies': ''
-            }
+        self.settings = load_settings(self.settings_file)
+    
+    def _search_cache_path(self):
+        """Get the search cache file, or None when the cache is kept in memory only"""
+        if not self.settings.get('search_cache_persist', False):
+            return None
+        return os.path.join(os.path.dirname(__file__), 'search_cache.json')
     
     def save_settings(self):
         """Save settings to JSON file"""
@@ -293,8 +328,14 @@ class MusicdlGUI(QWidget):
         if dialog.exec_() == QDialog.Accepted:
             new_settings = dialog.get_settings()
             if new_settings:
+                if new_settings.get('work_dir') != self.settings.get('work_dir'):
+                    self.library_index.refresh_async(new_settings.get('work_dir', 'musicdl_outputs'))
                 self.settings = new_settings
                 self.save_settings()
+                self.search_cache.configure(self.settings.get('search_cache_ttl', 10) * 60, self._search_cache_path())
+                self._apply_bandwidth_limits()
+                # Rebuild clients whose cookies or work_dir changed before the next search
+                self.client_registry.warm_up(self._checked_sources(), self.settings)
                 # Update theme if changed
                 self.is_dark = self.settings.get('is_dark', False)
                 self.setStyleSheet(get_stylesheet(self.is_dark))
@@ -311,12 +352,39 @@ class MusicdlGUI(QWidget):
     def initialize(self):
         """Initialize application state"""
         self.search_results = {}
-        self.music_records = {}
-        self.music_client = None
-        self.download_queue = []
-        self.batch_download_total = 0
-        self.batch_download_completed = 0
-        self.batch_download_success = 0
+        self.client_registry = ClientRegistry()
+        self.late_search_workers = []
+        self.search_deadline_passed = False
+        self.search_deadline_timer = QTimer(self)
+        self.search_deadline_timer.setSingleShot(True)
+        self.search_deadline_timer.timeout.connect(self.handle_search_deadline)
+        self.status_hide_timer = QTimer(self)
+        self.status_hide_timer.setSingleShot(True)
+        self.status_hide_timer.timeout.connect(lambda: self.status_group.setVisible(False))
+        self.search_cache = SearchCache(
+            ttl=self.settings.get('search_cache_ttl', 10) * 60,
+            persist_path=self._search_cache_path()
+        )
+        self.source_stats = SourceSpeedStats(persist_path=os.path.join(os.path.dirname(__file__), 'source_stats.json'))
+        self.last_download_result = (False, '', '')
+        self.session_pool = SessionPool(pool_maxsize=max(16, self.settings.get('download_segments', 4) * self.settings.get('per_source_concurrent_downloads', 2)))
+        self.library_index = LibraryIndex(persist_path=os.path.join(os.path.dirname(__file__), 'library_index.json'))
+        self.download_journal = DownloadJournal(os.path.join(os.path.dirname(__file__), 'download_journal.jsonl'))
+        self.download_manager = DownloadManager(
+            max_concurrent=self.settings.get('max_concurrent_downloads', 3),
+            per_source_limit=self.settings.get('per_source_concurrent_downloads', 2),
+            journal=self.download_journal,
+            client_provider=self._build_source_client,
+            parent=self
+        )
+        self.download_manager.task_started_sig.connect(self.handle_task_started)
+        self.download_manager.progress_sig.connect(self.update_download_progress)
+        self.download_manager.task_finished_sig.connect(self.handle_task_finished)
+        self.download_manager.all_finished_sig.connect(self.handle_all_downloads_finished)
+    
+    def _checked_sources(self):
+        """Get the client names of the checked music sources"""
+        return [cb.property('client_name') for cb in self.check_boxes if cb.isChecked()]
     
     def mouseclick(self):
         """Show context menu on right click"""
@@ -325,165 +393,218 @@ class MusicdlGUI(QWidget):
     
     def download(self):
         """Handle download action (right-click single download)"""
-        if hasattr(self, 'download_worker') and self.download_worker.isRunning():
+        if self.download_manager.is_busy():
             QMessageBox.warning(self, 'Warning - 警告', 'A download is already in progress!\n正在下载中，请稍候！')
             return
 
-        selected_items = self.results_table.selectedItems()
-        if not selected_items:
+        selected_rows = self.results_table.selectionModel().selectedRows()
+        if not selected_rows:
             QMessageBox.warning(self, 'Warning - 警告', 'Please select a song to download!\n请先选择要下载的歌曲！')
             return
         
-        # Get record_id from first column of selected row
-        selected_row = selected_items[0].row()
-        checkbox_item = self.results_table.item(selected_row, 0)
-        if not checkbox_item:
-            return
-        record_id = checkbox_item.data(Qt.UserRole)
-        song_info = self.music_records.get(record_id)
+        song_info = self.results_model.song_at(selected_rows[0])
         
-        if not song_info:
-            QMessageBox.warning(self, 'Warning - 警告', 'Song info not found!\n歌曲信息未找到！')
-            return
+        owned = self.library_index.find(song_info) if self.settings.get('skip_downloaded', True) else None
+        if owned is not None:
+            reply = QMessageBox.question(self, 'Already Downloaded - 已下载',
+                f'This song is already in your library:\n该歌曲已下载过：\n\n{owned["path"]}\n\nDownload it again? - 是否重新下载？',
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
         
-        self._start_single_download(song_info)
+        self.label_task_info.setText(f'Downloading: {song_info["song_name"]} - {song_info["singers"]}')
+        self._start_downloads([song_info])
     
-    def _start_single_download(self, song_info):
-        """Start downloading a single song"""
-        # Determine download directory based on user settings
-        custom_work_dir = self.settings.get('work_dir', 'musicdl_outputs')
-        dir_structure = self.settings.get('dir_structure', 'flat')
-        
-        if dir_structure == 'flat':
-            download_dir = custom_work_dir
-        elif dir_structure == 'source':
-            download_dir = os.path.join(custom_work_dir, song_info['source'])
-        else:
-            download_dir = song_info.get('work_dir', os.path.join(custom_work_dir, song_info['source']))
-        
-        touchdir(download_dir)
-        
-        # Generate filename
-        if dir_structure == 'flat':
-            safe_singer = sanitize_filepath(song_info['singers']).replace('/', '_').replace('\\', '_')
-            filename = f"{song_info['song_name']} - {safe_singer}.{song_info['ext']}"
-        else:
-            filename = f"{song_info['song_name']}.{song_info['ext']}"
-        
+    def _build_download_task(self, song_info):
+        """Create a download task for a song, resolving its target directory and filename"""
+        music_client, session = self._source_client(song_info['source'])
+        return build_download_task(song_info, self.settings, music_client, session)
+    
+    def _source_client(self, source):
+        """
+        Get the music client of a source and the shared download session using its headers,
+        never builds a client here since that imports musicdl and would freeze the window
+
+        Returns:
+            tuple: (music_client, session), both None if the client is not built yet, the download worker builds it then
+        """
+        music_client = self.client_registry.peek(source)
+        if music_client is None:
+            return None, None
+        headers = music_client.music_clients[source].default_download_headers
+        return music_client, self.session_pool.get_session(source, headers)
+
+    def _build_source_client(self, source):
+        """Build the music client of a source and its download session, runs on a download worker thread"""
+        music_client = self.client_registry.get(source, self.settings)
+        headers = music_client.music_clients[source].default_download_headers
+        return music_client, self.session_pool.get_session(source, headers)
+    
+    def _start_downloads(self, songs):
+        """Queue songs on the download manager"""
+        self._submit_tasks([self._build_download_task(song_info) for song_info in songs])
+    
+    def _submit_tasks(self, tasks):
+        """Apply the current download settings and hand tasks to the download manager"""
         # UI updates
-        self.label_task_info.setText(f'Downloading: {song_info["song_name"]} - {song_info["singers"]}')
         self.button_keyword.setEnabled(False)
         self.bar_download.setValue(0)
         self.label_progress_detail.setText('Initializing...')
-
-        # Log download start
-        log_download_start(song_info['song_name'], song_info['singers'], song_info['source'])
         
-        # Start background download
-        self.download_worker = DownloadWorker(song_info, download_dir, filename, self.music_client)
-        self.download_worker.progress_sig.connect(self.update_download_progress)
-        self.download_worker.finished_sig.connect(self.download_finished)
-        self.download_worker.start()
+        self.download_manager.set_limits(
+            self.settings.get('max_concurrent_downloads', 3),
+            self.settings.get('per_source_concurrent_downloads', 2)
+        )
+        self._apply_bandwidth_limits()
+        self.download_manager.set_failover(
+            self.results_model.alternates, self._build_download_task,
+            self.settings.get('failover_max_attempts', 3) if self.settings.get('download_failover', True) else 1
+        )
+        self.download_manager.submit(tasks)
+
+    def _apply_bandwidth_limits(self):
+        """Hand the bandwidth settings to the download manager, running downloads follow them at once"""
+        self.download_manager.set_bandwidth(
+            self.settings.get('bandwidth_limit', 0),
+            self.settings.get('source_bandwidth_limit', 0),
+            self.settings.get('host_connection_limit', 0)
+        )
+
+    def offer_resume_downloads(self):
+        """Ask whether to resume the songs that were queued or downloading when the last session ended"""
+        entries = self.download_journal.unfinished()
+        if not entries:
+            return
+        batch_count = len({entry.get('batch') for entry in entries})
+        reply = QMessageBox.question(self, 'Resume Downloads - 恢复下载',
+            f'{len(entries)} songs from {batch_count} unfinished batch(es) were not downloaded last time. Resume them?\n'
+            f'上次有 {len(entries)} 首歌曲未下载完成，是否继续下载？',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply != QMessageBox.Yes:
+            for entry in entries:
+                # Before allocation the queued name may belong to another song's file, nothing of ours is on disk yet
+                if entry.get('allocated'):
+                    remove_part_files(DownloadJournal.file_path(entry))
+            self.download_journal.discard_unfinished()
+            log_info(f'放弃恢复 {len(entries)} 首未完成的下载')
+            return
+        self.download_journal.compact()
+        tasks = []
+        for entry in entries:
+            if DownloadJournal.is_finished_on_disk(entry):
+                # Finished right before the last session ended, only the journal entry was missing
+                self.download_journal.mark(entry['id'], 'done')
+                continue
+            try:
+                song_info = entry['song']
+                os.makedirs(entry['download_dir'], exist_ok=True)
+                music_client, session = self._source_client(song_info['source'])
+                # Same directory and allocated filename as before, so the worker picks up the matching .part file
+                task = DownloadTask(song_info, entry['download_dir'], entry['filename'], music_client,
+                                    segments=entry.get('segments', 1), session=session)
+            except Exception as e:
+                log_error(f'恢复下载失败 - {entry.get("song", {}).get("song_name", "Unknown")}: {str(e)}')
+                self.download_journal.mark(entry['id'], 'failed')
+                continue
+            task.journal_id = entry['id']
+            if entry.get('allocated'):
+                # The name is already ours, re-queuing the task must not forget that
+                task.file_path = DownloadJournal.file_path(entry)
+            tasks.append(task)
+        if not tasks:
+            return
+        log_info(f'恢复 {len(tasks)} 首未完成的下载')
+        self.label_task_info.setText(f'Resuming {len(tasks)} unfinished downloads - 恢复未完成的下载')
+        self._submit_tasks(tasks)
+
+    def handle_task_started(self, task):
+        """Log the start of a single download"""
+        log_download_start(task.song_info['song_name'], task.song_info['singers'], task.song_info['source'])
+        if len(self.download_manager.batch_tasks) > 1:
+            finished = sum(1 for t in self.download_manager.batch_tasks if t.status in ('done', 'failed'))
+            self.label_task_info.setText(f'Batch downloading ({finished}/{len(self.download_manager.batch_tasks)}): {task.song_info["song_name"]}')
 
     def update_download_progress(self, percent, detail):
         """Update download progress bar"""
         self.bar_download.setValue(percent)
         self.label_progress_detail.setText(detail)
 
-    def download_finished(self, success, msg, file_path):
-        """Handle download completion"""
+    def handle_task_finished(self, task, success, msg, file_path):
+        """Handle completion of a single download"""
         if success:
-            log_download_success(msg.replace('Finished downloading ', ''), file_path)
+            log_download_success(task.song_info['song_name'], file_path)
+            self.source_stats.record(task.source, task.downloaded_bytes, time.time() - task.started_at)
+            self.library_index.add(task.song_info, file_path, task.file_hash)
         else:
-            log_download_error('未知歌曲', msg)
+            log_download_error(task.song_info['song_name'], msg)
+        self.last_download_result = (success, msg, file_path)
+
+    def handle_all_downloads_finished(self, success_count, total_count):
+        """Handle completion of the whole download batch"""
+        self.button_keyword.setEnabled(True)
+        self.bar_download.setValue(0)
+        self.label_progress_detail.setText('0.0MB / 0.0MB')
+        self.label_task_info.setText('Ready - 就绪')
+        self.session_pool.log_stats()
+        self.library_index.save()
         
-        # Check if there are more songs in the queue
-        if hasattr(self, 'download_queue') and self.download_queue:
-            self.batch_download_completed += 1
-            if success:
-                self.batch_download_success += 1
-            
-            # Process next song in queue
-            next_song = self.download_queue.pop(0)
-            self.label_task_info.setText(f'Batch downloading ({self.batch_download_completed + 1}/{self.batch_download_total}): {next_song["song_name"]}')
-            self._start_single_download(next_song)
+        if total_count > 1:
+            QMessageBox.information(self, 'Batch Complete - 批量下载完成', 
+                f'Downloaded {success_count}/{total_count} songs successfully.\n'
+                f'成功下载 {success_count}/{total_count} 首歌曲。')
         else:
-            # All downloads complete
-            self.button_keyword.setEnabled(True)
-            self.bar_download.setValue(0)
-            self.label_progress_detail.setText('0.0MB / 0.0MB')
-            
-            if hasattr(self, 'batch_download_total') and self.batch_download_total > 1:
-                self.batch_download_completed += 1
-                if success:
-                    self.batch_download_success += 1
-                self.label_task_info.setText('Ready - 就绪')
-                QMessageBox.information(self, 'Batch Complete - 批量下载完成', 
-                    f'Downloaded {self.batch_download_success}/{self.batch_download_total} songs successfully.\n'
-                    f'成功下载 {self.batch_download_success}/{self.batch_download_total} 首歌曲。')
-                self.batch_download_total = 0
+            success, msg, file_path = self.last_download_result
+            if success:
+                QMessageBox.information(self, 'Success - 成功', f"{msg}\n\nSaved to: {file_path}")
             else:
-                self.label_task_info.setText('Ready - 就绪')
-                if success:
-                    QMessageBox.information(self, 'Success - 成功', f"{msg}\n\nSaved to: {file_path}")
-                else:
-                    QMessageBox.critical(self, 'Error - 错误', msg)
+                QMessageBox.critical(self, 'Error - 错误', msg)
     
     def select_all_rows(self):
         """Select all checkboxes in the table"""
-        for row in range(self.results_table.rowCount()):
-            item = self.results_table.item(row, 0)
-            if item:
-                item.setCheckState(Qt.Checked)
+        self.results_model.set_all_checked(True)
     
     def deselect_all_rows(self):
         """Deselect all checkboxes in the table"""
-        for row in range(self.results_table.rowCount()):
-            item = self.results_table.item(row, 0)
-            if item:
-                item.setCheckState(Qt.Unchecked)
+        self.results_model.set_all_checked(False)
     
     def download_selected(self):
         """Download all checked songs"""
-        if hasattr(self, 'download_worker') and self.download_worker.isRunning():
+        if self.download_manager.is_busy():
             QMessageBox.warning(self, 'Warning - 警告', 'A download is already in progress!\n正在下载中，请稍候！')
             return
         
         # Collect all checked songs
-        songs_to_download = []
-        for row in range(self.results_table.rowCount()):
-            item = self.results_table.item(row, 0)
-            if item and item.checkState() == Qt.Checked:
-                record_id = item.data(Qt.UserRole)
-                song_info = self.music_records.get(record_id)
-                if song_info:
-                    songs_to_download.append(song_info)
+        songs_to_download = self.results_model.checked_songs()
         
         if not songs_to_download:
             QMessageBox.warning(self, 'Warning - 警告', 'Please check at least one song to download!\n请至少勾选一首歌曲！')
             return
         
-        # Initialize batch download
-        self.download_queue = songs_to_download[1:]  # All except first
-        self.batch_download_total = len(songs_to_download)
-        self.batch_download_completed = 0
-        self.batch_download_success = 0
-        
-        # Start first download
-        first_song = songs_to_download[0]
-        self.label_task_info.setText(f'Batch downloading (1/{self.batch_download_total}): {first_song["song_name"]}')
-        self._start_single_download(first_song)
+        # Skip the songs already in the local library
+        if self.settings.get('skip_downloaded', True):
+            owned_count = len(songs_to_download)
+            songs_to_download = [song_info for song_info in songs_to_download if self.library_index.find(song_info) is None]
+            owned_count -= len(songs_to_download)
+            if owned_count:
+                log_info(f'批量下载跳过 {owned_count} 首已下载的歌曲')
+            if not songs_to_download:
+                QMessageBox.information(self, 'Already Downloaded - 已下载',
+                    f'All {owned_count} checked songs are already in your library.\n勾选的 {owned_count} 首歌曲均已下载过。')
+                return
+        
+        self.label_task_info.setText(f'Batch downloading (0/{len(songs_to_download)}): {songs_to_download[0]["song_name"]}')
+        self._start_downloads(songs_to_download)
     
     def search(self):
         """Handle search action"""
         if hasattr(self, 'search_worker') and self.search_worker.isRunning():
-            return
+            if not self.search_deadline_passed:
+                return
+            # Keep the late worker alive until it finishes, its results are no longer merged
+            self.late_search_workers.append(self.search_worker)
 
         # Selected music sources
-        music_sources = []
-        for cb in self.check_boxes:
-            if cb.isChecked():
-                music_sources.append(cb.property('client_name'))
+        music_sources = self._checked_sources()
         
         if not music_sources:
             QMessageBox.warning(self, 'Warning - 警告', 'Please select at least one music source!\n请至少选择一个音乐源！')
@@ -498,11 +619,15 @@ class MusicdlGUI(QWidget):
         # UI Setup for Checklist
         self.label_task_info.setText(f'Searching "{keyword}"...')
         self.button_keyword.setEnabled(False)
-        self.results_table.setRowCount(0)
-        self.music_records = {}
+        self.results_model.merge_duplicates = self.settings.get('merge_duplicates', True)
+        self.results_model.clear()
         self.all_aggregated_results = {}
         self.completed_sources_count = 0
         self.total_sources_to_search = len(music_sources)
+        self.search_keyword = keyword
+        self.answered_sources = set()
+        self.search_deadline_passed = False
+        self.status_hide_timer.stop()
         
         # Reset and show status checklist
         # Clear old status widgets
@@ -530,144 +655,123 @@ class MusicdlGUI(QWidget):
         log_search_start(keyword, music_sources)
         
         # Start search worker
-        self.search_worker = SearchWorker(music_sources, keyword, self.settings)
+        self.search_worker = SearchWorker(music_sources, keyword, self.settings, self.client_registry, self.search_cache)
         self.search_worker.finished_sig.connect(self.handle_source_success)
+        self.search_worker.cached_sig.connect(self.handle_source_cached)
         self.search_worker.error_sig.connect(self.handle_source_error)
-        self.search_worker.client_ready_sig.connect(self.handle_client_ready)
         self.search_worker.finished.connect(self.handle_all_finished)
         self.search_worker.start()
+        self.search_deadline_timer.start(self.settings.get('search_deadline', 15) * 1000)
 
-    def handle_client_ready(self, client):
-        """Handle music client ready signal"""
-        self.music_client = client
+    def handle_search_deadline(self):
+        """Show the results gathered so far and mark the sources still running as late"""
+        self.search_deadline_passed = True
+        late_sources = [source for source in self.source_status_labels if source not in self.answered_sources]
+        for source in late_sources:
+            label = self.source_status_labels[source]
+            label.setText(f"⏰ {source.replace('Client', '')}: Late...")
+            label.setStyleSheet("color: #e67e22;")
+        self.button_keyword.setEnabled(True)
+        self.label_task_info.setText(f'Ready - 就绪 ({len(late_sources)} sources late, results will be merged when they arrive)')
+        log_warning(f'搜索超过截止时间 - 未返回的音乐源: [{", ".join(late_sources)}]')
+
+    def _is_current_search(self):
+        """Check that a search signal comes from the current worker rather than a superseded late one"""
+        return self.sender() is self.search_worker
 
     def handle_source_success(self, source_name, results):
-        """Handle successful search from a source"""
+        """Handle successful search from a source, late results are merged into the table as well"""
+        if not self._is_current_search():
+            return
         self.all_aggregated_results[source_name] = results
         display_name = source_name.replace('Client', '')
         count = len(results)
         label = self.source_status_labels.get(source_name)
         if label:
-            label.setText(f"✅ {display_name}: Found {count}")
+            late_text = ' (late)' if self.search_deadline_passed else ''
+            label.setText(f"✅ {display_name}: Found {count}{late_text}")
             label.setStyleSheet("color: #28a745; font-weight: bold;")
+        self.answered_sources.add(source_name)
         self.completed_sources_count += 1
+        self._update_search_progress()
         log_search_result(source_name, count)
+        
+        # Show this source's results right away instead of waiting for the slowest source
+        self.display_search_results(results)
+
+    def handle_source_cached(self, source_name, results):
+        """Handle a source answered from the search cache"""
+        if not self._is_current_search():
+            return
+        self.handle_source_success(source_name, results)
+        label = self.source_status_labels.get(source_name)
+        if label:
+            label.setText(f"✅ {source_name.replace('Client', '')}: Found {len(results)} (cached)")
 
     def handle_source_error(self, source_name, error_msg):
         """Handle search error from a source"""
+        if not self._is_current_search():
+            return
         display_name = source_name.replace('Client', '')
         label = self.source_status_labels.get(source_name)
         if label:
             label.setText(f"❌ {display_name}: Error")
             label.setToolTip(error_msg)
             label.setStyleSheet("color: #dc3545;")
+        self.answered_sources.add(source_name)
         self.completed_sources_count += 1
+        self._update_search_progress()
         log_search_error(source_name, error_msg)
 
+    def _update_search_progress(self):
+        """Show how many sources have answered so far"""
+        if self.search_deadline_passed:
+            return
+        self.label_task_info.setText(f'Searching "{self.search_keyword}"... ({self.completed_sources_count}/{self.total_sources_to_search} sources)')
+
     def handle_all_finished(self):
         """Handle completion of all searches"""
+        worker = self.sender()
+        if worker in self.late_search_workers:
+            self.late_search_workers.remove(worker)
+            return
+        self.search_deadline_timer.stop()
         self.button_keyword.setEnabled(True)
         self.label_task_info.setText('Ready - 就绪')
-        self.display_search_results(self.all_aggregated_results)
         
         # Log search complete
         total_results = sum(len(results) for results in self.all_aggregated_results.values())
         log_search_complete(total_results)
         
         # Auto-hide status group after 5 seconds
-        QTimer.singleShot(5000, lambda: self.status_group.setVisible(False))
+        self.status_hide_timer.start(5000)
 
-    def display_search_results(self, search_results):
-        """Display search results in table"""
-        self.search_results = search_results
+    def display_search_results(self, results):
+        """Append the results of one source to the table"""
+        self.search_results = self.all_aggregated_results
         
-        # Update status after search
+        # Update status with the results received so far
         total_results = sum(len(results) for results in self.search_results.values())
         dir_structure_text = {
             'flat': 'Flat/扁平',
             'source': 'By Source/按源',
             'date': 'By Date/按日期'
         }.get(self.settings.get('dir_structure', 'flat'), 'Flat/扁平')
-        self.status_label.setText(f'Download directory: {self.settings.get("work_dir", "musicdl_outputs")} [{dir_structure_text}] | Found {total_results} results')
-        self.status_label.setStyleSheet("color: #28a745; font-size: 11px;")
-        
-        # Showing
-        self.results_table.setSortingEnabled(False)
-        self.results_table.horizontalHeader().setSortIndicatorShown(False)
-        count, row = 0, 0
-        for per_source_search_results in self.search_results.values():
-            count += len(per_source_search_results)
-        self.results_table.setRowCount(count)
-        
-        self.music_records = {}  # Clear old records
-        for _, (_, per_source_search_results) in enumerate(self.search_results.items()):
-            for _, per_source_search_result in enumerate(per_source_search_results):
-                # Generate unique ID for this record
-                record_id = str(uuid.uuid4())
-                
-                # Prepare data for sorting
-                fs_str = per_source_search_result['file_size']
-                fs_val = 0
-                try:
-                    parts = fs_str.split()
-                    num = float(parts[0])
-                    unit = parts[1].upper()
-                    if unit == 'GB':
-                        fs_val = num * 1024 * 1024 * 1024
-                    elif unit == 'MB':
-                        fs_val = num * 1024 * 1024
-                    elif unit == 'KB':
-                        fs_val = num * 1024
-                    else:
-                        fs_val = num
-                except:
-                    fs_val = 0
-                
-                dur_str = per_source_search_result['duration']
-                dur_val = 0
-                try:
-                    parts = dur_str.split(':')
-                    if len(parts) == 2:
-                        dur_val = int(parts[0]) * 60 + int(parts[1])
-                    elif len(parts) == 3:
-                        dur_val = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                except:
-                    dur_val = 0
-
-                # First column: checkbox (store record_id in data)
-                checkbox_item = QTableWidgetItem()
-                checkbox_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
-                checkbox_item.setCheckState(Qt.Unchecked)
-                checkbox_item.setData(Qt.UserRole, record_id)  # Store unique ID
-                self.results_table.setItem(row, 0, checkbox_item)
-
-                # Other columns
-                items = [
-                    (per_source_search_result['singers'], per_source_search_result['singers']),
-                    (per_source_search_result['song_name'], per_source_search_result['song_name']),
-                    (fs_str, fs_val),
-                    (dur_str, dur_val),
-                    (per_source_search_result['album'], per_source_search_result['album']),
-                    (per_source_search_result['source'], per_source_search_result['source'])
-                ]
-
-                for column, (text, sort_val) in enumerate(items, start=1):
-                    table_item = SortableTableWidgetItem(text, sort_val)
-                    table_item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-                    self.results_table.setItem(row, column, table_item)
-                
-                self.music_records[record_id] = per_source_search_result
-                row += 1
         
-        self.results_table.setSortingEnabled(True)
-        self.results_table.horizontalHeader().setSortIndicatorShown(True)
-
+        # Showing, duplicates of results from other sources are merged under the best candidate
+        with metrics.span('table.render', rows=len(results)):
+            self.results_model.append_songs(results)
+        self.status_label.setText(f'Download directory: {self.settings.get("work_dir", "musicdl_outputs")} [{dir_structure_text}] | Found {total_results} results ({self.results_model.unique_count()} unique)')
+        self.status_label.setStyleSheet("color: #28a745; font-size: 11px;")
 
 def main():
     """Main entry point"""
     app = QApplication(sys.argv)
+    startup_timer.mark('QApplication')
     gui = MusicdlGUI()
     gui.show()
+    # Fires once the event loop has painted the window
+    QTimer.singleShot(0, startup_timer.finish)
     exit_code = app.exec_()
     log_app_exit()
     sys.exit(exit_code)
@@ -0,0 +1,181 @@
+'''
+Function:
+    Headless Command Line Batch Mode for MusicdlGUI, shares settings, caches and the library with the window
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+Usage:
+    python musicdlgui_cli.py keywords.txt --download 1 --output results.jsonl
+'''
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from core import MUSIC_SOURCES, CircuitBreaker, load_settings, search_sources, build_download_task, download_song, download_with_failover
+from bandwidth import BandwidthLimiter
+from client_registry import ClientRegistry
+from library_index import LibraryIndex
+from ranking import SourceSpeedStats, cluster_duplicates
+from search_cache import SearchCache
+from sessions import SessionPool
+from events import event_log
+from logger import setup_logger, log_info
+
+
+APP_DIR = os.path.dirname(__file__)
+
+
+class JsonlWriter:
+    """Thread-safe writer of one JSON object per line"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def write(self, event, **fields):
+        """
+        Args:
+            event (str): Event type, e.g. result, search_error, download, skipped
+            fields: Event payload
+        """
+        line = json.dumps(dict(event=event, **fields), ensure_ascii=False, default=str)
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+def read_keywords(path):
+    """
+    Args:
+        path (str): Text file with one keyword per line, - reads stdin; blank lines and lines starting with # are skipped
+
+    Returns:
+        list: Keywords in file order
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+def pick_downloads(results_by_source, music_sources, count, speed_stats):
+    """
+    Pick the songs to download for a keyword: results of the same song on several sources
+    are merged and the best candidate of each is tried first, the others are kept for failover
+
+    Args:
+        results_by_source (dict): source -> results in relevance order
+        music_sources (list): Sources in the order given by the user
+        count (int): Number of distinct songs to download
+        speed_stats (SourceSpeedStats): Download speed history used to rank duplicates
+
+    Returns:
+        list: Candidate lists, one per song, best candidate first
+    """
+    songs = (song for source in music_sources for song in results_by_source.get(source, ()))
+    return cluster_duplicates(songs, speed_stats.rank_key)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search and download music without the GUI, printing JSON lines')
+    parser.add_argument('keywords', help='text file with one keyword per line, - for stdin')
+    parser.add_argument('-s', '--sources', nargs='+', default=MUSIC_SOURCES[:3], choices=MUSIC_SOURCES, help='music sources to search')
+    parser.add_argument('-d', '--download', type=int, default=0, help='number of distinct songs to download per keyword, 0 only searches')
+    parser.add_argument('-o', '--output', default='-', help='JSONL output file, - for stdout')
+    parser.add_argument('--settings', default=os.path.join(APP_DIR, 'settings.json'), help='settings file shared with the GUI')
+    parser.add_argument('--work-dir', help='download directory, overrides the settings file')
+    args = parser.parse_args()
+
+    setup_logger()
+    event_log.start()
+    settings = load_settings(args.settings)
+    if args.work_dir:
+        settings['work_dir'] = args.work_dir
+    keywords = read_keywords(args.keywords)
+    log_info(f'命令行模式启动 - {len(keywords)} 个关键词, 音乐源: {", ".join(args.sources)}')
+
+    client_registry = ClientRegistry()
+    search_cache = SearchCache(
+        ttl=settings.get('search_cache_ttl', 10) * 60,
+        persist_path=os.path.join(APP_DIR, 'search_cache.json') if settings.get('search_cache_persist', False) else None
+    )
+    speed_stats = SourceSpeedStats(persist_path=os.path.join(APP_DIR, 'source_stats.json'))
+    library_index = LibraryIndex(persist_path=os.path.join(APP_DIR, 'library_index.json'))
+    session_pool = SessionPool(pool_maxsize=max(16, settings.get('download_segments', 4) * settings.get('per_source_concurrent_downloads', 2)))
+    bandwidth = BandwidthLimiter(
+        settings.get('bandwidth_limit', 0) * 1024, settings.get('source_bandwidth_limit', 0) * 1024, settings.get('host_connection_limit', 0)
+    )
+    source_slots = {source: threading.BoundedSemaphore(settings.get('per_source_concurrent_downloads', 2)) for source in MUSIC_SOURCES}
+    max_attempts = settings.get('failover_max_attempts', 3) if settings.get('download_failover', True) else 1
+    breaker = CircuitBreaker()
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    writer = JsonlWriter(output)
+
+    def download(keyword, candidates):
+        """Download one song, moving on to the next candidate source when a download fails"""
+        owned = library_index.find(candidates[0]) if settings.get('skip_downloaded', True) else None
+        if owned is not None:
+            writer.write('skipped', keyword=keyword, song_name=candidates[0]['song_name'], singers=candidates[0]['singers'],
+                         source=candidates[0]['source'], file_path=owned['path'])
+            return True
+
+        def download_candidate(song_info):
+            source = song_info['source']
+            with source_slots[source]:
+                music_client = client_registry.get(source, settings)
+                session = session_pool.get_session(source, music_client.music_clients[source].default_download_headers)
+                task = build_download_task(song_info, settings, music_client, session)
+                started_at = time.time()
+                success, msg, file_path = download_song(task, bandwidth=bandwidth, name=f'CLI-{source}')
+            writer.write('download', keyword=keyword, song_name=song_info['song_name'], singers=song_info['singers'],
+                         source=source, success=success, message=msg, file_path=file_path)
+            if success:
+                speed_stats.record(source, os.path.getsize(file_path), time.time() - started_at)
+                library_index.add(song_info, file_path, task.file_hash)
+            return task, success, msg, file_path
+
+        task, success, msg, _ = download_with_failover(candidates, download_candidate, breaker, max_attempts)
+        if task is None:
+            writer.write('download', keyword=keyword, song_name=candidates[0]['song_name'], singers=candidates[0]['singers'],
+                         source=candidates[0]['source'], success=False, message=msg, file_path='')
+        return success
+
+    succeeded = True
+    try:
+        with ThreadPoolExecutor(max_workers=settings.get('max_concurrent_downloads', 3)) as executor:
+            futures = []
+            for keyword in keywords:
+                results_by_source = {}
+
+                def on_results(source, results, keyword=keyword, results_by_source=results_by_source):
+                    results_by_source[source] = results
+                    for rank, song in enumerate(results):
+                        writer.write('result', keyword=keyword, source=source, rank=rank, song=song)
+
+                def on_error(source, error, keyword=keyword):
+                    writer.write('search_error', keyword=keyword, source=source, error=error)
+
+                search_sources(args.sources, keyword, settings, client_registry, search_cache,
+                               on_cached=on_results, on_results=on_results, on_error=on_error)
+                if args.download > 0:
+                    # Downloads of this keyword overlap with the searches of the next ones
+                    for candidates in pick_downloads(results_by_source, args.sources, args.download, speed_stats):
+                        futures.append(executor.submit(download, keyword, candidates))
+            succeeded = all(future.result() for future in futures)
+    finally:
+        speed_stats.save()
+        library_index.save()
+        session_pool.close()
+        if output is not sys.stdout:
+            output.close()
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == '__main__':
+    main()
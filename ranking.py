@@ -0,0 +1,212 @@
+'''
+Function:
+    Cross-source Duplicate Detection and Ranking for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import re
+import json
+import unicodedata
+from logger import log_debug, log_warning
+
+
+# Separators used by the music sources between the names of several singers
+SINGER_SEPARATORS = re.compile(r'\s*(?:/|,|，|、|&|;|；|\+)\s*|\s+(?:feat|ft)\.?\s+', re.IGNORECASE)
+# Whitespace and punctuation ignored when comparing titles and singers
+IGNORED_CHARS = re.compile(r'[\W_]+', re.UNICODE)
+# Two results with the same title and singers are duplicates if their durations differ by at most this many seconds
+DURATION_TOLERANCE = 3
+
+
+def normalize_text(text):
+    """
+    Normalize a title or singer name for duplicate detection
+
+    Args:
+        text (str): Raw text reported by the music source
+
+    Returns:
+        str: NFKC-normalized, case-folded text without whitespace and punctuation
+    """
+    return IGNORED_CHARS.sub('', unicodedata.normalize('NFKC', text or '').casefold())
+
+
+def duplicate_key(song):
+    """
+    Build the blocking key of a search result, only results sharing a key are compared
+
+    Args:
+        song (dict): Song info returned by a music source
+
+    Returns:
+        str: Normalized title and sorted singer names, empty if the result has no title
+    """
+    title = normalize_text(song.get('song_name'))
+    if not title:
+        return ''
+    singers = sorted(filter(None, (normalize_text(singer) for singer in SINGER_SEPARATORS.split(song.get('singers') or ''))))
+    return title + '\x1f' + '|'.join(singers)
+
+
+def same_duration(duration_a, duration_b):
+    """
+    Args:
+        duration_a (int): Duration in seconds, 0 if unknown
+        duration_b (int): Duration in seconds, 0 if unknown
+
+    Returns:
+        bool: True if the durations are close enough or one of them is unknown
+    """
+    return not duration_a or not duration_b or abs(duration_a - duration_b) <= DURATION_TOLERANCE
+
+
+class DuplicateIndex:
+    """
+    Finds the cluster of duplicates a search result belongs to, clusters are bucketed by
+    dedup_key so a result is only compared against the few clusters sharing its key
+    """
+    def __init__(self):
+        """Initialize an empty index"""
+        self.clusters_by_key = {}  # dedup key -> ids of the clusters sharing it
+
+    def find(self, song, leader_of):
+        """
+        Look up the cluster of a duplicate of song
+
+        Args:
+            song (dict): Song info carrying dedup_key and duration_s
+            leader_of (callable): Returns the song info currently leading a cluster id
+
+        Returns:
+            int: Cluster id, None if song has no duplicate yet
+        """
+        for cluster_id in self.clusters_by_key.get(song.get('dedup_key'), ()):
+            if same_duration(leader_of(cluster_id).get('duration_s', 0), song.get('duration_s', 0)):
+                return cluster_id
+        return None
+
+    def add(self, song, cluster_id):
+        """
+        Register a new cluster started by song, results without a key never merge
+
+        Args:
+            song (dict): Song info of the first member of the cluster
+            cluster_id (int): Id of the new cluster
+        """
+        if song.get('dedup_key'):
+            self.clusters_by_key.setdefault(song['dedup_key'], []).append(cluster_id)
+
+    def clear(self):
+        """Forget every cluster"""
+        self.clusters_by_key = {}
+
+
+def cluster_duplicates(songs, rank_key):
+    """
+    Group search results of the same song, in linear time
+
+    Args:
+        songs (iterable): Song infos in the order they should be shown or tried
+        rank_key (callable): Ranking key of a candidate, larger is better
+
+    Returns:
+        list: Clusters in order of their first result, each a list of song infos with the best candidate first
+    """
+    clusters, index = [], DuplicateIndex()
+    for song in songs:
+        cluster_id = index.find(song, lambda cluster_id: clusters[cluster_id][0])
+        if cluster_id is None:
+            index.add(song, len(clusters))
+            clusters.append([song])
+        else:
+            clusters[cluster_id].append(song)
+    for cluster in clusters:
+        cluster.sort(key=rank_key, reverse=True)
+    return clusters
+
+
+class SourceSpeedStats:
+    """
+    Moving average of the download speed of every music source,
+    used to prefer historically fast sources among duplicates
+    """
+    def __init__(self, alpha=0.3, persist_path=None):
+        """
+        Initialize source speed statistics
+
+        Args:
+            alpha (float): Weight of the newest download in the moving average
+            persist_path (str): JSON file used to keep the statistics across sessions, None keeps them in memory only
+        """
+        self.alpha = alpha
+        self.persist_path = persist_path
+        self.speeds = {}  # source -> bytes per second
+        self.dirty = False
+        if persist_path:
+            self.load()
+
+    def record(self, source, num_bytes, seconds):
+        """
+        Add a finished download to the statistics
+
+        Args:
+            source (str): Music source name
+            num_bytes (int): Downloaded bytes
+            seconds (float): Time the download took
+        """
+        if num_bytes <= 0 or seconds <= 0:
+            return
+        speed = num_bytes / seconds
+        previous = self.speeds.get(source)
+        self.speeds[source] = speed if previous is None else self.alpha * speed + (1 - self.alpha) * previous
+        self.dirty = True
+
+    def speed(self, source):
+        """
+        Args:
+            source (str): Music source name
+
+        Returns:
+            float: Average download speed in bytes per second, 0 if the source was never used
+        """
+        return self.speeds.get(source, 0)
+
+    def rank_key(self, song):
+        """
+        Ranking key of a candidate among duplicates, larger is better
+
+        Args:
+            song (dict): Song info carrying size_bytes
+
+        Returns:
+            tuple: (file size in bytes, historical speed of its source)
+        """
+        return (song.get('size_bytes', 0), self.speed(song['source']))
+
+    def load(self):
+        """Load statistics from the persist file"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                self.speeds = {source: float(speed) for source, speed in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            log_warning(f'读取音乐源速度统计失败: {str(e)}')
+            return
+        log_debug('已加载 %d 个音乐源的速度统计', len(self.speeds))
+
+    def save(self):
+        """Write the statistics to the persist file if they changed"""
+        if not self.persist_path or not self.dirty:
+            return
+        tmp_path = self.persist_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.speeds, f)
+            os.replace(tmp_path, self.persist_path)
+            self.dirty = False
+        except OSError as e:
+            log_warning(f'保存音乐源速度统计失败: {str(e)}')
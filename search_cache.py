@@ -0,0 +1,178 @@
+'''
+Function:
+    Search Result Cache for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from logger import log_debug, log_warning
+
+
+# Sources whose search goes through the Quark share parser, see SearchWorker
+QUARK_SITES = ['MituMusicClient', 'GequbaoMusicClient', 'YinyuedaoMusicClient', 'BuguyyMusicClient',
+               'JCPOOMusicClient', 'GequhaiMusicClient', 'LivePOOMusicClient', 'KKWSMusicClient', 'FLMP3MusicClient']
+
+
+def normalize_keyword(keyword):
+    """
+    Normalize a search keyword so that trivial variations share one cache entry
+
+    Args:
+        keyword (str): Raw keyword typed by the user
+
+    Returns:
+        str: NFKC-normalized, case-folded keyword with collapsed whitespace
+    """
+    return ' '.join(unicodedata.normalize('NFKC', keyword).casefold().split())
+
+
+class SearchCache:
+    """
+    In-memory LRU cache of per-source search results with a TTL,
+    optionally persisted to a JSON file between sessions
+    """
+    def __init__(self, ttl=600, max_entries=200, persist_path=None):
+        """
+        Initialize search cache
+
+        Args:
+            ttl (int): Seconds a cached result stays valid, 0 disables the cache
+            max_entries (int): Maximum number of (source, keyword) entries kept in memory
+            persist_path (str): JSON file used to keep the cache across sessions, None keeps it in memory only
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.entries = OrderedDict()  # key -> (timestamp, results)
+        self.lock = threading.Lock()
+        self.dirty = False
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def make_key(source, keyword, settings):
+        """
+        Build the cache key of a source search
+
+        Args:
+            source (str): Music source name
+            keyword (str): Search keyword
+            settings (dict): Application settings, the cookies used by this source are part of the key
+
+        Returns:
+            str: Cache key
+        """
+        cookie_data = settings.get('cookies', {}).get(source, {})
+        relevant = {
+            'search_cookies': cookie_data.get('search', '').strip(),
+            'quark_cookies': settings.get('quark_cookies', '').strip() if source in QUARK_SITES else '',
+        }
+        fingerprint = hashlib.sha1(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        return f'{source}|{normalize_keyword(keyword)}|{fingerprint}'
+
+    def configure(self, ttl, persist_path):
+        """
+        Apply new settings
+
+        Args:
+            ttl (int): Seconds a cached result stays valid, 0 disables the cache
+            persist_path (str): JSON file used to keep the cache, None keeps it in memory only
+        """
+        with self.lock:
+            self.ttl = ttl
+            self.persist_path = persist_path
+            self.dirty = True
+
+    def get(self, key):
+        """
+        Look up a fresh cached result
+
+        Args:
+            key (str): Cache key from make_key
+
+        Returns:
+            list: Cached results, or None if missing or stale
+        """
+        if self.ttl <= 0:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.dirty = True
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, results):
+        """
+        Store the results of a source search, evicting the least recently used entries
+
+        Args:
+            key (str): Cache key from make_key
+            results (list): Search results of this source
+        """
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.time(), results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self.lock:
+            self.entries.clear()
+            self.dirty = True
+
+    def load(self):
+        """Load unexpired entries from the persist file"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log_warning(f'读取搜索缓存失败: {str(e)}')
+            return
+        now = time.time()
+        with self.lock:
+            for key, (timestamp, results) in data.items():
+                if now - timestamp <= self.ttl:
+                    self.entries[key] = (timestamp, results)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        log_debug('已加载 %d 条搜索缓存', len(self.entries))
+
+    def save(self):
+        """Write the cache to the persist file if it changed, entries that are not JSON serializable are skipped"""
+        if not self.persist_path or not self.dirty:
+            return
+        with self.lock:
+            data = {}
+            for key, entry in self.entries.items():
+                try:
+                    json.dumps(entry[1], ensure_ascii=False)
+                except (TypeError, ValueError):
+                    continue
+                data[key] = entry
+            self.dirty = False
+        tmp_path = self.persist_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            log_warning(f'保存搜索缓存失败: {str(e)}')
@@ -0,0 +1,79 @@
+'''
+Function:
+    Startup Timing Report for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import sys
+import time
+import builtins
+import threading
+from metrics import metrics
+from logger import log_info
+
+
+class StartupTimer:
+    """
+    Measures the startup phases of the window and, like python -X importtime, the self and
+    cumulative time of every module imported on the main thread until the window is shown
+    """
+    # Number of slowest imports written to the log
+    REPORT_IMPORTS = 15
+
+    def __init__(self):
+        self.started = self.last_mark = time.perf_counter()
+        self.phases = []  # (phase, seconds)
+        self.imports = []  # (module, self seconds, cumulative seconds, nesting depth)
+        self.child_times = []  # Time spent in nested imports of every import in progress
+        self.original_import = None
+
+    def install(self):
+        """Start timing imports"""
+        if self.original_import is None:
+            self.original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """Stop timing imports"""
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Relative, already loaded and background thread imports are passed straight through
+        if level or name in sys.modules or threading.current_thread() is not threading.main_thread():
+            return self.original_import(name, globals, locals, fromlist, level)
+        self.child_times.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self.child_times.pop()
+            if self.child_times:
+                self.child_times[-1] += elapsed
+            self.imports.append((name, elapsed - children, elapsed, len(self.child_times)))
+
+    def mark(self, phase):
+        """
+        End a startup phase
+
+        Args:
+            phase (str): Name of the phase that just finished
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_mark))
+        self.last_mark = now
+
+    def finish(self):
+        """Stop timing and write the report to the log, called once the window has been shown"""
+        self.mark('首次绘制')
+        self.uninstall()
+        total = self.last_mark - self.started
+        metrics.record('startup.window_ready', total * 1000)
+        log_info(f'启动耗时 {total * 1000:.0f} ms: ' + ', '.join(f'{phase} {seconds * 1000:.0f} ms' for phase, seconds in self.phases))
+        slowest = sorted(self.imports, key=lambda item: item[2], reverse=True)[:self.REPORT_IMPORTS]
+        lines = [f'{self_time * 1000:8.1f} | {cumulative * 1000:8.1f} | {"  " * depth}{name}' for name, self_time, cumulative, depth in slowest]
+        log_info(f'导入耗时最长的 {len(slowest)} 个模块 (共导入 {len(self.imports)} 个, 单位 ms)\n    self | cumulative | module\n' + '\n'.join(lines))
@@ -126,7 +126,7 @@ def get_stylesheet(is_dark=False):
     }}
 
     /* Table */
-    QTableWidget {{
+    QTableView, QTreeView {{
         border: 1px solid {border_color};
         border-radius: 10px;
         gridline-color: {border_color};
@@ -135,7 +135,7 @@ def get_stylesheet(is_dark=False):
         outline: none;
         alternate-background-color: {secondary_bg};
     }}
-    QTableWidget::item {{
+    QTableView::item, QTreeView::item {{
         padding: 12px;
         border-bottom: 1px solid {border_color};
     }}
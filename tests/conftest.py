@@ -0,0 +1,131 @@
+'''
+Function:
+    Shared Test Fixtures for MusicdlGUI
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import re
+import sys
+import time
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# Qt aborts the interpreter on the first QApplication when there is no display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeMusicClient:
+    """Only what the download core needs from a musicdl MusicClient"""
+    class Source:
+        default_download_headers = {}
+
+    music_clients = dict.fromkeys(('QQMusicClient', 'KuwoMusicClient', 'MiguMusicClient'), Source())
+
+
+@pytest.fixture(scope='session', autouse=True)
+def log_directory(tmp_path_factory):
+    """Keep the logs and event files written by the code under test out of the repository"""
+    directory = str(tmp_path_factory.mktemp('logs'))
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('MUSICDLGUI_LOG_DIR', directory)
+        yield directory
+
+
+@pytest.fixture
+def serve():
+    """Start a local HTTP server for a BaseHTTPRequestHandler class and return its base URL"""
+    servers = []
+
+    def start(handler_class):
+        server = _ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def serve_payload(serve):
+    """
+    Serve bytes with byte range support and return the base URL
+
+    Called as serve_payload(payload, requests_seen=None, chunk_size=0, chunk_delay=0, hold=0):
+    requests_seen collects the headers of every request, a chunk_size sends the body in pieces
+    with chunk_delay seconds between them, chunk_delay may also be a function of the first byte
+    of the requested range, hold delays the body so concurrent requests overlap
+    """
+    def start(payload, requests_seen=None, chunk_size=0, chunk_delay=0, hold=0):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if requests_seen is not None:
+                    requests_seen.append(dict(self.headers))
+                match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else len(payload) - 1
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(payload)}')
+                else:
+                    start, end = 0, len(payload) - 1
+                    self.send_response(200)
+                body = payload[start:end + 1]
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                time.sleep(hold)
+                delay = chunk_delay(start) if callable(chunk_delay) else chunk_delay
+                try:
+                    step = chunk_size or len(body) or 1
+                    for offset in range(0, len(body), step):
+                        self.wfile.write(body[offset:offset + step])
+                        time.sleep(delay)
+                except OSError:
+                    # The client went away, e.g. a cancelled or killed download
+                    pass
+
+        return serve(Handler)
+
+    return start
+
+
+@pytest.fixture
+def fake_music_client():
+    return FakeMusicClient()
+
+
+@pytest.fixture
+def make_song():
+    """
+    Build song infos shaped like the results of a music source, called as make_song(index=0, **fields),
+    file_size follows size_bytes unless given
+    """
+    def make(index=0, **fields):
+        song = {
+            'source': 'QQMusicClient', 'song_name': f'Song {index}', 'singers': 'Singer', 'album': 'Album',
+            'duration': '03:00', 'size_bytes': 1, 'duration_s': 180, 'ext': 'mp3',
+            'download_url': f'http://127.0.0.1/{index}.mp3', 'dedup_key': f'key-{index}',
+        }
+        song.update(fields)
+        song.setdefault('file_size', f'{song["size_bytes"]} B')
+        return song
+
+    return make
@@ -0,0 +1,117 @@
+'''
+Function:
+    Tests of the Bandwidth Limiter, driven by a fake clock so no test really waits
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import time
+import threading
+from bandwidth import BandwidthLimiter
+from downloader import FileDownloader
+
+
+PAYLOAD = os.urandom(200000)
+
+
+class FakeClock:
+    """Monotonic clock that only moves when somebody sleeps on it"""
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+def fake_limiter(total_rate=0, source_rate=0, host_connections=0):
+    clock = FakeClock()
+    return BandwidthLimiter(total_rate, source_rate, host_connections, clock=clock, sleep=clock.sleep), clock
+
+
+def transfer(limiter, chunks):
+    """Account for (source, nbytes) reads the way FileDownloader does"""
+    for source, nbytes in chunks:
+        assert limiter.pause(limiter.reserve(source, nbytes))
+
+
+class PeakLimiter(BandwidthLimiter):
+    """Remembers the most connections ever open to one host"""
+    peak = 0
+
+    def acquire_connection(self, url, is_cancelled=None):
+        acquired = super().acquire_connection(url, is_cancelled)
+        with self.condition:
+            self.peak = max([self.peak] + list(self.host_active.values()))
+        return acquired
+
+
+def test_global_cap_paces_all_sources_together():
+    limiter, clock = fake_limiter(total_rate=100000)
+    transfer(limiter, [('QQMusicClient', 10000), ('KuwoMusicClient', 10000)] * 50)
+    # 1 MB at 100 KB/s, minus the 0.1 s burst the bucket starts with at most
+    assert 9.8 <= clock() <= 10.1
+
+
+def test_source_cap_limits_each_source_separately():
+    limiter, clock = fake_limiter(source_rate=100000)
+    transfer(limiter, [('QQMusicClient', 10000), ('KuwoMusicClient', 10000)] * 50)
+    # Each source moves 500 KB at its own 100 KB/s
+    assert 4.8 <= clock() <= 5.1
+    limiter.configure(100000, 100000, 0)
+    started = clock()
+    transfer(limiter, [('QQMusicClient', 10000), ('KuwoMusicClient', 10000)] * 50)
+    # The global cap is now the tighter one
+    assert 9.8 <= clock() - started <= 10.1
+
+
+def test_pause_returns_early_when_cancelled():
+    limiter, clock = fake_limiter(total_rate=1000)
+    polls = []
+    assert not limiter.pause(5.0, lambda: polls.append(None) or len(polls) > 2)
+    assert clock() < 5.0
+
+
+def test_host_connection_cap():
+    limiter, _ = fake_limiter(host_connections=2)
+    assert limiter.acquire_connection('http://a.example/1')
+    assert limiter.acquire_connection('http://a.example/2')
+    # Full host, another host is not affected
+    assert not limiter.acquire_connection('http://a.example/3', lambda: True)
+    assert limiter.acquire_connection('http://b.example/1', lambda: True)
+    limiter.release_connection('http://a.example/1')
+    assert limiter.acquire_connection('http://a.example/3', lambda: True)
+
+
+def test_rate_limited_download_from_local_server(serve_payload, tmp_path):
+    url = serve_payload(PAYLOAD)
+    limiter, clock = fake_limiter(total_rate=100000)
+    file_path = str(tmp_path / 'song.mp3')
+    started = time.monotonic()
+    FileDownloader(f'{url}/song.mp3', {}, file_path, bandwidth=limiter, source='QQMusicClient').run()
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    # 200 KB at 100 KB/s on the limiter's clock, while the test itself never sleeps for it
+    assert 1.8 <= clock() <= 2.1
+    assert time.monotonic() - started < 1.5
+
+
+def test_segmented_download_respects_host_connection_cap(serve_payload, tmp_path):
+    # Hold every response a little so that segments overlap
+    url = serve_payload(PAYLOAD, hold=0.05)
+    limiter = PeakLimiter(host_connections=2)
+    file_path = str(tmp_path / 'song.mp3')
+    downloader = FileDownloader(f'{url}/song.mp3', {}, file_path, segments=4, bandwidth=limiter, source='QQMusicClient')
+    downloader.MIN_SEGMENTED_SIZE = 0
+    downloader.run()
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert len(downloader.state['segments']) == 4
+    assert limiter.peak == 2
+    assert not limiter.host_active
@@ -0,0 +1,66 @@
+'''
+Function:
+    Tests of the Search Results Model
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import pytest
+
+QtCore = pytest.importorskip('PyQt5.QtCore')
+from PyQt5.QtCore import Qt, QPersistentModelIndex
+from components import SearchResultsModel
+
+
+def column_values(model, column):
+    return [model.index(row, column).data(SearchResultsModel.SORT_ROLE) for row in range(model.rowCount())]
+
+
+def test_sort_orders_rows_and_restores_arrival_order(make_song):
+    model = SearchResultsModel()
+    model.append_songs([make_song(index, size_bytes=size) for index, size in enumerate([30, 10, 20])])
+    model.sort(3, Qt.DescendingOrder)
+    assert column_values(model, 3) == [30, 20, 10]
+    model.sort(3, Qt.AscendingOrder)
+    assert column_values(model, 3) == [10, 20, 30]
+    model.sort(-1)
+    assert column_values(model, 3) == [30, 10, 20]
+
+
+def test_sort_does_not_call_data_per_comparison(make_song):
+    class CountingModel(SearchResultsModel):
+        calls = 0
+
+        def data(self, index, role=Qt.DisplayRole):
+            CountingModel.calls += 1
+            return super().data(index, role)
+
+    model = CountingModel()
+    model.append_songs([make_song(index, size_bytes=(index * 7919) % 1000) for index in range(2000)])
+    model.sort(3, Qt.DescendingOrder)
+    assert CountingModel.calls == 0
+
+
+def test_sort_remaps_persistent_indexes_of_clusters_and_children(make_song):
+    model = SearchResultsModel()
+    model.append_songs([make_song(0, size_bytes=10), make_song(1, size_bytes=30), make_song(2, size_bytes=5, dedup_key='key-1', source='KuwoMusicClient')])
+    cluster = QPersistentModelIndex(model.index(1, 0))
+    child = QPersistentModelIndex(model.index(0, 0, model.index(1, 0)))
+    model.sort(3, Qt.DescendingOrder)
+    assert cluster.row() == 0
+    assert model.song_at(model.index(cluster.row(), 0))['song_name'] == 'Song 1'
+    assert child.parent().row() == 0
+    assert model.song_at(model.index(child.row(), 0, child.parent()))['song_name'] == 'Song 2'
+
+
+def test_rows_appended_after_sort_keep_the_sort_order(make_song):
+    model = SearchResultsModel()
+    model.append_songs([make_song(0, size_bytes=10), make_song(1, size_bytes=30)])
+    model.sort(3, Qt.DescendingOrder)
+    model.append_songs([make_song(2, size_bytes=20), make_song(3, size_bytes=40)])
+    assert column_values(model, 3) == [40, 30, 20, 10]
+    # The duplicate lookup keeps working on the stable cluster ids
+    model.append_songs([make_song(4, size_bytes=50, dedup_key='key-0', source='KuwoMusicClient')])
+    assert model.unique_count() == 4
+    assert column_values(model, 3) == [50, 40, 30, 20]
@@ -0,0 +1,126 @@
+'''
+Function:
+    Tests of the Qt-free Search and Download Core
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import sys
+import subprocess
+from core import DEFAULT_SETTINGS, CircuitBreaker, build_download_task, download_song, discard_partial_download, download_with_failover
+from downloader import part_file_path
+
+
+PAYLOAD = os.urandom(100000)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_building_a_task_does_not_import_musicdl(tmp_path):
+    # Tasks are built on the GUI thread, importing musicdl there would freeze the window
+    code = (
+        'import sys\n'
+        'from core import DEFAULT_SETTINGS, build_download_task\n'
+        f'settings = dict(DEFAULT_SETTINGS, work_dir={str(tmp_path)!r})\n'
+        'song = {"source": "QQMusicClient", "song_name": "Song", "singers": "A/B", "ext": "mp3"}\n'
+        'task = build_download_task(song, settings, None)\n'
+        'assert task.filename == "Song - A_B.mp3", task.filename\n'
+        'assert not [name for name in sys.modules if name.startswith("musicdl")]\n'
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, check=True)
+
+
+def test_download_thread_builds_the_missing_client(serve_payload, make_song, fake_music_client, tmp_path):
+    url = serve_payload(PAYLOAD)
+    song_info = make_song(singers='A/B', download_url=f'{url}/song.mp3')
+    task = build_download_task(song_info, dict(DEFAULT_SETTINGS, work_dir=str(tmp_path)), None)
+    built = []
+
+    def client_provider(source):
+        built.append(source)
+        return fake_music_client, None
+
+    success, _, file_path = download_song(task, client_provider=client_provider)
+    assert success
+    assert built == ['QQMusicClient']
+    assert task.music_client is fake_music_client
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def test_failover_download_keeps_the_name_of_the_abandoned_partial(serve_payload, make_song, fake_music_client, tmp_path):
+    url = serve_payload(PAYLOAD, chunk_size=10000, chunk_delay=0.05)
+    settings = dict(DEFAULT_SETTINGS, work_dir=str(tmp_path))
+    task = build_download_task(make_song(song_name='Song', singers='A', download_url=f'{url}/a.mp3'), settings, fake_music_client)
+    progress = []
+    success, _, _ = download_song(task, progress_callback=lambda done, total: progress.append(done), is_cancelled=lambda: any(progress))
+    assert not success
+    assert os.path.getsize(part_file_path(task.file_path)) > 0
+
+    # The song fails over to another source, which has to write to the same name
+    discard_partial_download(task)
+    alternate = make_song(source='KuwoMusicClient', song_name='Song', singers='A', download_url=f'{url}/b.mp3', dedup_key='other')
+    success, _, file_path = download_song(build_download_task(alternate, settings, fake_music_client))
+    assert success
+    assert os.listdir(tmp_path) == ['Song - A.mp3']
+
+
+def test_file_created_during_the_download_is_not_overwritten(serve_payload, make_song, fake_music_client, tmp_path):
+    url = serve_payload(PAYLOAD)
+    task = build_download_task(make_song(song_name='Song', singers='A', download_url=f'{url}/a.mp3'), dict(DEFAULT_SETTINGS, work_dir=str(tmp_path)), fake_music_client)
+
+    def on_allocated(file_path):
+        # E.g. the command line saving the same song meanwhile
+        with open(file_path, 'wb') as f:
+            f.write(b'another download')
+
+    success, _, file_path = download_song(task, on_allocated=on_allocated)
+    assert success
+    assert os.path.basename(file_path) == 'Song - A (1).mp3'
+    assert (tmp_path / 'Song - A.mp3').read_bytes() == b'another download'
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def test_failover_loop_backs_off_and_reuses_the_name(serve_payload, make_song, fake_music_client, tmp_path):
+    url = serve_payload(PAYLOAD, chunk_size=10000, chunk_delay=0.05)
+    settings = dict(DEFAULT_SETTINGS, work_dir=str(tmp_path))
+    candidates = [
+        make_song(source=source, song_name='Song', singers='A', download_url=f'{url}/{source}.mp3', dedup_key='key')
+        for source in ('QQMusicClient', 'KuwoMusicClient', 'MiguMusicClient')
+    ]
+    tried, sleeps = [], []
+
+    def download_candidate(song_info):
+        tried.append(song_info['source'])
+        task = build_download_task(song_info, settings, fake_music_client)
+        progress = []
+        # The first source drops the connection halfway
+        broken = song_info['source'] == 'QQMusicClient'
+        success, msg, file_path = download_song(task, progress_callback=lambda done, total: progress.append(done), is_cancelled=lambda: broken and any(progress))
+        return task, success, msg, file_path
+
+    breaker = CircuitBreaker()
+    task, success, _, file_path = download_with_failover(candidates, download_candidate, breaker, max_attempts=3, sleep=sleeps.append)
+    assert success
+    assert tried == ['QQMusicClient', 'KuwoMusicClient']
+    assert sleeps == [1.0]
+    assert breaker.failures == {'QQMusicClient': 1}
+    assert os.listdir(tmp_path) == ['Song - A.mp3']
+
+
+def test_failover_loop_skips_open_sources(make_song):
+    candidates = [make_song(source=source, dedup_key='key') for source in ('QQMusicClient', 'KuwoMusicClient')]
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record('QQMusicClient', False)
+    tried = []
+    outcome = download_with_failover(candidates, lambda song_info: tried.append(song_info['source']) or (None, False, 'error', ''), breaker, sleep=lambda seconds: None)
+    # The second source fails too and opens, nothing is left to try
+    assert tried == ['KuwoMusicClient']
+    assert not outcome[1]
+    sleeps = []
+    outcome = download_with_failover(candidates, tried.append, breaker, sleep=sleeps.append)
+    # Every source is open: wait for the earliest trial once, then give up since the fake clock did not move
+    assert outcome[0] is None and not outcome[1]
+    assert len(sleeps) == 1 and 59 < sleeps[0] <= 60
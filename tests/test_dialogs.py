@@ -0,0 +1,26 @@
+'''
+Function:
+    Tests of the Dialogs
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import pytest
+
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+from PyQt5.QtWidgets import QApplication
+from core import DEFAULT_SETTINGS
+from dialogs import SettingsDialog
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def test_settings_dialog_fits_on_a_1080p_screen(app):
+    dialog = SettingsDialog(None, dict(DEFAULT_SETTINGS))
+    # Leave room for the title bar and a taskbar so OK/Cancel stay visible
+    assert dialog.minimumSizeHint().height() <= 1000
+    assert dialog.settings_tabs.count() == 4
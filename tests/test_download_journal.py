@@ -0,0 +1,96 @@
+'''
+Function:
+    Tests of the Persistent Download Journal
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import pytest
+from core import DownloadTask, download_song
+from download_journal import DownloadJournal
+from downloader import part_file_path, remove_part_files
+
+
+PAYLOAD = os.urandom(1024 * 1024)
+
+
+@pytest.fixture
+def make_task(make_song, fake_music_client):
+    def make(url, download_dir, filename):
+        task = DownloadTask(make_song(song_name='X', download_url=f'{url}/x.mp3'), str(download_dir), filename, fake_music_client)
+        task.batch_id = 'batch'
+        return task
+
+    return make
+
+
+def test_journal_records_the_allocated_name_when_the_target_collides(serve_payload, make_task, tmp_path):
+    # Another song already owns the queued name, the download goes to "X (1).mp3"
+    (tmp_path / 'X.mp3').write_bytes(b'another song')
+    journal_path = str(tmp_path / 'download_journal.jsonl')
+    journal = DownloadJournal(journal_path)
+    task = make_task(serve_payload(PAYLOAD), tmp_path, 'X.mp3')
+    journal.record_queued([task])
+    polls = []
+
+    def is_cancelled():
+        polls.append(None)
+        return len(polls) > 3
+
+    success, _, _ = download_song(task, is_cancelled=is_cancelled, on_allocated=lambda file_path: journal.record_allocated(task, file_path))
+    assert not success
+
+    # What the next session sees after a crash
+    entry = DownloadJournal(journal_path).unfinished()[0]
+    assert entry['filename'] == 'X (1).mp3'
+    assert entry['allocated']
+    file_path = DownloadJournal.file_path(entry)
+    assert os.path.exists(part_file_path(file_path))
+    assert not DownloadJournal.is_finished_on_disk(entry)
+
+    # Declining the resume cleans up our partial download and leaves the other song alone
+    remove_part_files(file_path)
+    assert sorted(os.listdir(tmp_path)) == ['X.mp3', 'download_journal.jsonl']
+    assert (tmp_path / 'X.mp3').read_bytes() == b'another song'
+
+
+def test_unallocated_entry_is_not_finished_even_if_its_name_exists(serve_payload, make_task, tmp_path):
+    (tmp_path / 'X.mp3').write_bytes(b'another song')
+    journal_path = str(tmp_path / 'download_journal.jsonl')
+    DownloadJournal(journal_path).record_queued([make_task(serve_payload(PAYLOAD), tmp_path, 'X.mp3')])
+    entry = DownloadJournal(journal_path).unfinished()[0]
+    assert not entry.get('allocated')
+    assert not DownloadJournal.is_finished_on_disk(entry)
+
+
+def test_allocated_name_survives_compaction(serve_payload, make_task, tmp_path):
+    journal_path = str(tmp_path / 'download_journal.jsonl')
+    journal = DownloadJournal(journal_path)
+    task = make_task(serve_payload(PAYLOAD), tmp_path, 'X.mp3')
+    journal.record_queued([task])
+    journal.record_allocated(task, str(tmp_path / 'X (1).mp3'))
+    journal.compact()
+    entry = DownloadJournal(journal_path).unfinished()[0]
+    assert entry['filename'] == 'X (1).mp3' and entry['allocated']
+
+
+def test_resumed_task_is_requeued_as_allocated(serve_payload, make_task, tmp_path):
+    journal_path = str(tmp_path / 'download_journal.jsonl')
+    journal = DownloadJournal(journal_path)
+    task = make_task(serve_payload(PAYLOAD), tmp_path, 'X.mp3')
+    journal.record_queued([task])
+    journal.record_allocated(task, str(tmp_path / 'X (1).mp3'))
+
+    # The next session resumes the entry the way the window does and queues it again
+    journal = DownloadJournal(journal_path)
+    entry = journal.unfinished()[0]
+    resumed = make_task(serve_payload(PAYLOAD), tmp_path, entry['filename'])
+    resumed.journal_id = entry['id']
+    resumed.file_path = DownloadJournal.file_path(entry)
+    journal.compact()
+    journal.record_queued([resumed])
+
+    entry = DownloadJournal(journal_path).unfinished()[0]
+    assert entry['filename'] == 'X (1).mp3' and entry['allocated']
@@ -0,0 +1,63 @@
+'''
+Function:
+    Tests of the Concurrent Download Manager
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import re
+import pytest
+from http.server import BaseHTTPRequestHandler
+
+QtCore = pytest.importorskip('PyQt5.QtCore')
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from core import DownloadTask
+from download_manager import DownloadManager
+
+
+class TruncatingHandler(BaseHTTPRequestHandler):
+    """Serves 1 MB with byte ranges but drops every connection halfway through the requested range"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        start = int(match.group(1)) if match else 0
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header('Content-Range', f'bytes {start}-999999/1000000')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(1000000 - start))
+        self.end_headers()
+        self.wfile.write(os.urandom((1000000 - start) // 2))
+        self.close_connection = True
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def run_batch(manager, tasks):
+    """Submit tasks and spin the event loop until the batch is over"""
+    loop = QEventLoop()
+    manager.all_finished_sig.connect(lambda success_count, total_count: loop.quit())
+    QTimer.singleShot(20000, loop.quit)
+    manager.submit(tasks)
+    loop.exec_()
+
+
+def test_song_that_fails_for_good_leaves_no_partial_download(app, serve, make_song, fake_music_client, tmp_path):
+    url = serve(TruncatingHandler)
+    task = DownloadTask(make_song(song_name='Song', download_url=f'{url}/song.mp3'), str(tmp_path), 'Song.mp3', fake_music_client)
+    manager = DownloadManager()
+    try:
+        run_batch(manager, [task])
+    finally:
+        manager.shutdown()
+    assert task.status == 'failed'
+    assert os.listdir(tmp_path) == []
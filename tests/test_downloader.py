@@ -0,0 +1,137 @@
+'''
+Function:
+    Tests of the Resumable File Downloader
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import os
+import sys
+import gzip
+import time
+import subprocess
+from http.server import BaseHTTPRequestHandler
+from downloader import FileDownloader, part_file_path, load_part_state, save_part_state
+
+
+# Random bytes do not compress, so the gzip body is longer than the decoded file
+PAYLOAD = os.urandom(300000)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def gzip_handler(payload, requests_seen, drop_first=False):
+    """Handler that always answers gzip-encoded, ignoring Accept-Encoding and Range like some CDNs do"""
+    body = gzip.compress(payload)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(dict(self.headers))
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if drop_first and len(requests_seen) == 1:
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    return Handler
+
+
+def test_gzip_encoded_body_is_not_compared_with_content_length(serve, tmp_path):
+    requests_seen = []
+    url = serve(gzip_handler(PAYLOAD, requests_seen))
+    file_path = str(tmp_path / 'song.mp3')
+    FileDownloader(f'{url}/song.mp3', {'Accept-Encoding': 'gzip, deflate'}, file_path).run()
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert not os.path.exists(part_file_path(file_path))
+    assert requests_seen[0]['Accept-Encoding'] == 'identity'
+
+
+def test_dropped_gzip_body_restarts_without_range(serve, tmp_path):
+    requests_seen = []
+    url = serve(gzip_handler(PAYLOAD, requests_seen, drop_first=True))
+    file_path = str(tmp_path / 'song.mp3')
+    FileDownloader(f'{url}/song.mp3', {}, file_path).run()
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert len(requests_seen) == 2
+    assert 'Range' not in requests_seen[1]
+
+
+def test_gzip_body_is_not_segmented(serve, tmp_path):
+    requests_seen = []
+    url = serve(gzip_handler(PAYLOAD, requests_seen))
+    file_path = str(tmp_path / 'song.mp3')
+    downloader = FileDownloader(f'{url}/song.mp3', {}, file_path, segments=4)
+    downloader.MIN_SEGMENTED_SIZE = 0
+    downloader.run()
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert 'segments' not in downloader.state
+
+
+def test_killed_segmented_download_resumes_without_holes(serve_payload, tmp_path):
+    payload = os.urandom(2 * 1024 * 1024)
+    # Slow enough to kill the download half way, every segment is smaller than the write buffer
+    # and each one is served at its own pace, so the state is saved while other segments hold unflushed bytes
+    segment_size = len(payload) // 4
+    url = serve_payload(payload, chunk_size=10000, chunk_delay=lambda start: 0.003 * (start // segment_size + 1))
+    file_path = str(tmp_path / 'song.mp3')
+    code = (
+        'from downloader import FileDownloader\n'
+        f'downloader = FileDownloader({url + "/song.mp3"!r}, {{}}, {file_path!r}, segments=4)\n'
+        'downloader.MIN_SEGMENTED_SIZE = 0\n'
+        'downloader.STATE_SAVE_INTERVAL = 256 * 1024\n'
+        'downloader.run()\n'
+    )
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=REPO_DIR)
+    try:
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            state = load_part_state(file_path)
+            if state and state.get('segments') and sum(segment[2] for segment in state['segments']) >= len(payload) // 4:
+                break
+            time.sleep(0.01)
+        process.kill()
+    finally:
+        process.wait()
+    assert not os.path.exists(file_path)
+
+    state = load_part_state(file_path)
+    with open(part_file_path(file_path), 'rb') as f:
+        data = f.read()
+    # Whatever the state record claims is really on disk
+    for start, end, done in state['segments']:
+        assert data[start:start + done] == payload[start:start + done]
+
+    downloader = FileDownloader(f'{url}/song.mp3', {}, file_path, segments=4)
+    downloader.MIN_SEGMENTED_SIZE = 0
+    downloader.run()
+    assert downloader.resumed_bytes > 0
+    with open(file_path, 'rb') as f:
+        assert f.read() == payload
+
+
+def test_single_connection_part_is_resumed_by_a_segmented_download(serve_payload, tmp_path):
+    requests_seen = []
+    url = serve_payload(PAYLOAD, requests_seen)
+    file_path = str(tmp_path / 'song.mp3')
+    with open(part_file_path(file_path), 'wb') as f:
+        f.write(PAYLOAD[:100000])
+    save_part_state(file_path, {'url': f'{url}/song.mp3', 'song_key': '', 'etag': None, 'last_modified': None,
+                                'bytes_written': 100000, 'total_size': len(PAYLOAD), 'encoded': False})
+    downloader = FileDownloader(f'{url}/song.mp3', {}, file_path, segments=4)
+    downloader.MIN_SEGMENTED_SIZE = 0
+    downloader.run()
+    with open(file_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert [request.get('Range') for request in requests_seen] == ['bytes=100000-']
@@ -0,0 +1,35 @@
+'''
+Function:
+    Tests of the Local Library Index
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+import library_index
+from library_index import LibraryIndex, song_key
+
+
+def test_refresh_keeps_downloads_added_while_it_runs(make_song, tmp_path, monkeypatch):
+    index = LibraryIndex()
+    (tmp_path / 'Old - A.mp3').write_bytes(b'old')
+    (tmp_path / 'Gone - C.mp3').write_bytes(b'gone')
+    index.refresh(str(tmp_path))
+    (tmp_path / 'Gone - C.mp3').unlink()
+    (tmp_path / 'Old - A.mp3').write_bytes(b'old, retagged')
+    old_song = make_song(1, song_name='Old', singers='A')
+    new_song = make_song(2, song_name='New', singers='B')
+    file_sha1 = library_index.file_sha1
+
+    def hash_while_downloads_finish(path):
+        # Both downloads finish after the directory was scanned, one of them rewrote a scanned file
+        (tmp_path / 'New - B.mp3').write_bytes(b'new')
+        index.add(new_song, str(tmp_path / 'New - B.mp3'))
+        index.add(old_song, str(tmp_path / 'Old - A.mp3'))
+        return file_sha1(path)
+
+    monkeypatch.setattr(library_index, 'file_sha1', hash_while_downloads_finish)
+    index.refresh(str(tmp_path))
+    assert index.find(new_song)['path'] == str(tmp_path / 'New - B.mp3')
+    assert index.find(old_song)['song_key'] == song_key(old_song)
+    assert sorted(index.entries) == [str(tmp_path / 'New - B.mp3'), str(tmp_path / 'Old - A.mp3')]
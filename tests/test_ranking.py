@@ -0,0 +1,53 @@
+'''
+Function:
+    Tests of Cross-source Duplicate Detection and Ranking
+Author:
+    Zhenchao Jin
+WeChat Official Account (微信公众号):
+    Charles的皮卡丘
+'''
+from ranking import DuplicateIndex, SourceSpeedStats, cluster_duplicates, duplicate_key
+from musicdlgui_cli import pick_downloads
+
+
+def make_song(source, song_name, singers, duration_s, size_bytes):
+    song = {'source': source, 'song_name': song_name, 'singers': singers, 'duration_s': duration_s, 'size_bytes': size_bytes}
+    song['dedup_key'] = duplicate_key(song)
+    return song
+
+
+def test_cluster_duplicates_merges_same_key_and_duration():
+    songs = [
+        make_song('QQMusicClient', 'Song', 'A / B', 200, 3),
+        make_song('KuwoMusicClient', 'song', 'B,A', 201, 5),
+        make_song('MiguMusicClient', 'Song', 'A / B', 260, 9),  # live version, other duration
+        make_song('KugouMusicClient', '', 'A', 200, 1),  # no title, never merged
+        make_song('NeteaseMusicClient', '', 'A', 200, 1),
+    ]
+    clusters = cluster_duplicates(songs, SourceSpeedStats().rank_key)
+    assert [[song['source'] for song in cluster] for cluster in clusters] == [
+        ['KuwoMusicClient', 'QQMusicClient'], ['MiguMusicClient'], ['KugouMusicClient'], ['NeteaseMusicClient'],
+    ]
+
+
+def test_cluster_duplicates_only_compares_within_a_key():
+    leader_lookups = []
+    index, clusters = DuplicateIndex(), []
+    for number in range(5000):
+        song = make_song('QQMusicClient', f'Song {number}', 'A', 200, 1)
+        if index.find(song, lambda cluster_id: leader_lookups.append(cluster_id) or clusters[cluster_id]) is None:
+            index.add(song, len(clusters))
+            clusters.append(song)
+    assert len(clusters) == 5000
+    assert not leader_lookups
+
+
+def test_pick_downloads_follows_source_order_and_count():
+    results = {
+        'QQMusicClient': [make_song('QQMusicClient', 'One', 'A', 200, 3), make_song('QQMusicClient', 'Two', 'A', 180, 3)],
+        'KuwoMusicClient': [make_song('KuwoMusicClient', 'Two', 'A', 181, 7), make_song('KuwoMusicClient', 'Three', 'A', 150, 3)],
+    }
+    picked = pick_downloads(results, ['KuwoMusicClient', 'QQMusicClient'], 2, SourceSpeedStats())
+    assert [[song['song_name'] + '/' + song['source'] for song in cluster] for cluster in picked] == [
+        ['Two/KuwoMusicClient', 'Two/QQMusicClient'], ['Three/KuwoMusicClient'],
+    ]